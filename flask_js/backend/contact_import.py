@@ -0,0 +1,222 @@
+import codecs
+import csv
+import json
+import os
+from collections import deque
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+# Bulk import configuration
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))  # Rows inserted, embedded and upserted together
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))  # Vectors per vector store upsert request
+
+CONTACT_FIELDS = ("firstName", "lastName", "email")
+FIELD_LENGTHS = {"firstName": 80, "lastName": 80, "email": 120}
+
+
+async def iter_lines(request):
+    """Yield decoded lines from a streamed request body.
+
+    The decoder is incremental, so a multi-byte character split across two
+    network chunks is decoded once both halves have arrived.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+class PendingLines:
+    """Iterator over lines queued for a csv.reader; empty until more are added."""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def iter_csv_rows(request):
+    """Yield parsed CSV rows from a streamed request body.
+
+    One csv.reader parses the whole stream. Physical lines are queued until
+    their quotes balance, so a quoted field containing newlines reaches the
+    reader as a complete record.
+    """
+    pending = PendingLines()
+    reader = csv.reader(pending)
+    in_quotes = False
+    async for line in iter_lines(request):
+        if not in_quotes and not line.strip():
+            continue
+        pending.lines.append(line + "\n")
+        in_quotes ^= line.count('"') % 2 == 1
+        if not in_quotes:
+            yield next(reader)
+    if pending.lines:
+        # Unterminated quote at the end of the body; parse what there is
+        yield next(reader)
+
+
+async def iter_records(request):
+    """Yield (row_number, record, error) for every contact in the request body.
+
+    NDJSON and CSV bodies are parsed as they stream in; anything else is read
+    as a JSON array of contact objects (or {"contacts": [...]}).
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        row = 0
+        async for line in iter_lines(request):
+            if not line.strip():
+                continue
+            row += 1
+            try:
+                yield row, json.loads(line), None
+            except ValueError as e:
+                yield row, None, f"Invalid JSON: {e}"
+
+    elif content_type in ("text/csv", "application/csv"):
+        header = None
+        row = 0
+        async for values in iter_csv_rows(request):
+            if header is None:
+                header = [value.strip() for value in values]
+                continue
+            row += 1
+            yield row, dict(zip(header, values)), None
+
+    else:
+        try:
+            data = json.loads(await request.body())
+        except ValueError as e:
+            yield 0, None, f"Invalid JSON: {e}"
+            return
+        if isinstance(data, dict):
+            data = data.get("contacts")
+        if not isinstance(data, list):
+            yield 0, None, "Expected a JSON array of contacts."
+            return
+        for row, record in enumerate(data, start=1):
+            yield row, record, None
+
+
+def validate_record(record):
+    """Return (values, error) for one raw contact record."""
+    if not isinstance(record, dict):
+        return None, "Expected an object with firstName, lastName and email."
+    values = {}
+    for field in CONTACT_FIELDS:
+        value = record.get(field)
+        if not isinstance(value, str) or not value.strip():
+            return None, f"Missing {field}."
+        value = value.strip()
+        if len(value) > FIELD_LENGTHS[field]:
+            return None, f"{field} is longer than {FIELD_LENGTHS[field]} characters."
+        values[field] = value
+    if "@" not in values["email"]:
+        return None, "Invalid email."
+    return values, None
+
+
+def insert_contacts(session_factory, model, batch):
+    """Insert a batch of (row, values) with one bulk INSERT.
+
+    Returns the inserted contacts as (row, contact dict) pairs and per-row
+    failures as (row, email, error). Duplicate emails, within the batch or
+    already stored, are reported instead of aborting the batch.
+    """
+    failures = []
+    unique = []
+    seen = set()
+    for row, values in batch:
+        if values["email"] in seen:
+            failures.append((row, values["email"], "Duplicate email in this import."))
+        else:
+            seen.add(values["email"])
+            unique.append((row, values))
+
+    db = session_factory()
+    try:
+        existing = set(db.scalars(select(model.email).where(model.email.in_(seen))).all()) if seen else set()
+        pending = []
+        for row, values in unique:
+            if values["email"] in existing:
+                failures.append((row, values["email"], "A contact with this email already exists."))
+            else:
+                pending.append((row, values))
+        if not pending:
+            return [], failures
+
+        statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+        try:
+            ids = db.scalars(statement, [values for _, values in pending]).all()
+            db.commit()
+            inserted = [(row, dict(values, id=contact_id)) for (row, values), contact_id in zip(pending, ids)]
+        except IntegrityError:
+            # Another writer inserted a conflicting row since the check; isolate it row by row
+            db.rollback()
+            inserted = []
+            for row, values in pending:
+                try:
+                    with db.begin_nested():
+                        contact_id = db.scalars(statement, [values]).one()
+                    inserted.append((row, dict(values, id=contact_id)))
+                except IntegrityError as e:
+                    failures.append((row, values["email"], str(e.orig)))
+            db.commit()
+        return inserted, failures
+    finally:
+        db.close()
+
+
+async def import_contacts(request, session_factory, model, index_contacts=None, batch_size=BULK_BATCH_SIZE):
+    """Stream contacts from the request into the database batch by batch.
+
+    index_contacts, if given, is called in a worker thread with each batch of
+    inserted contact dicts and returns (contact, error) pairs for contacts that
+    could not be indexed. Returns a summary with per-row failures.
+    """
+    summary = {"received": 0, "inserted": 0, "failed": [], "index_failed": []}
+
+    async def flush(batch):
+        inserted, failures = await run_in_threadpool(insert_contacts, session_factory, model, batch)
+        summary["inserted"] += len(inserted)
+        summary["failed"].extend({"row": row, "email": email, "error": error} for row, email, error in failures)
+        if inserted and index_contacts is not None:
+            contacts = [contact for _, contact in inserted]
+            index_failures = await run_in_threadpool(index_contacts, contacts)
+            summary["index_failed"].extend({"id": contact["id"], "email": contact["email"], "error": error}
+                                           for contact, error in index_failures)
+
+    batch = []
+    async for row, record, error in iter_records(request):
+        if row:
+            summary["received"] += 1
+        values, error = (None, error) if error else validate_record(record)
+        if error:
+            email = record.get("email") if isinstance(record, dict) else None
+            summary["failed"].append({"row": row, "email": email, "error": error})
+            continue
+        batch.append((row, values))
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+
+    summary["failed"].sort(key=lambda failure: failure["row"])
+    return summary
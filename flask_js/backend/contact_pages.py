@@ -0,0 +1,70 @@
+import json
+import os
+
+# Contact listing configuration
+CONTACTS_PAGE_SIZE = int(os.getenv("CONTACTS_PAGE_SIZE", "100"))  # Default page size
+CONTACTS_MAX_PAGE_SIZE = int(os.getenv("CONTACTS_MAX_PAGE_SIZE", "1000"))
+CONTACTS_STREAM_BATCH = 1000  # Rows fetched per query while streaming NDJSON
+
+CONTACT_FIELDS = ("id", "firstName", "lastName", "email")
+
+
+def parse_fields(fields):
+    """Parse a comma-separated field list; id is always included because it is the cursor."""
+    if not fields:
+        return list(CONTACT_FIELDS)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in CONTACT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(CONTACT_FIELDS)}.")
+    return ["id"] + [field for field in CONTACT_FIELDS[1:] if field in requested]
+
+
+def page_size(limit):
+    """Clamp a requested page size to [1, CONTACTS_MAX_PAGE_SIZE]."""
+    return max(1, min(limit or CONTACTS_PAGE_SIZE, CONTACTS_MAX_PAGE_SIZE))
+
+
+def fetch_contacts(session, columns, fields, after=None, limit=CONTACTS_PAGE_SIZE):
+    """Return up to limit contacts with id greater than after, ordered by id.
+
+    columns maps API field names to the model's columns; only the requested
+    fields are selected, and the primary key index serves the range scan.
+    """
+    query = session.query(*(columns[field] for field in fields))
+    if after is not None:
+        query = query.filter(columns["id"] > after)
+    rows = query.order_by(columns["id"]).limit(limit).all()
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def contact_page(session, columns, fields, after=None, limit=None):
+    """One page of contacts plus the cursor for the next page (None on the last page)."""
+    limit = page_size(limit)
+    contacts = fetch_contacts(session, columns, fields, after, limit)
+    next_cursor = contacts[-1]["id"] if len(contacts) == limit else None
+    return {"contacts": contacts, "next_cursor": next_cursor}
+
+
+def iter_contacts_ndjson(session_factory, columns, fields, after=None, limit=None):
+    """Yield contacts as NDJSON lines, fetching CONTACTS_STREAM_BATCH rows per query.
+
+    Memory stays flat however large the table is; limit=None streams every
+    remaining contact.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        batch_size = CONTACTS_STREAM_BATCH if remaining is None else min(CONTACTS_STREAM_BATCH, remaining)
+        session = session_factory()
+        try:
+            contacts = fetch_contacts(session, columns, fields, after, batch_size)
+        finally:
+            session.close()
+        if not contacts:
+            return
+        yield "".join(json.dumps(contact) + "\n" for contact in contacts)
+        after = contacts[-1]["id"]
+        if remaining is not None:
+            remaining -= len(contacts)
+        if len(contacts) < batch_size:
+            return
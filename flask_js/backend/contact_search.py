@@ -0,0 +1,86 @@
+import os
+import re
+from sqlalchemy import text
+
+# Contact search configuration
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "20"))  # Default number of matches returned
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "200"))
+SEARCH_WEIGHTS = (10.0, 10.0, 1.0)  # bm25 weights for first name, last name and email
+
+# API field name -> column name in the contact table
+CONTACT_COLUMNS = {"firstName": "firstName", "lastName": "lastName", "email": "email"}
+
+
+# Full-text index over contact names and emails. contact_fts is an external
+# content FTS5 table: it stores only the index and reads the text back from
+# contact, and triggers keep it in step with every insert, update and delete.
+def init_contact_search(engine, columns=CONTACT_COLUMNS):
+    names = ", ".join(f'"{column}"' for column in columns.values())
+    new_values = ", ".join(f'NEW."{column}"' for column in columns.values())
+    old_values = ", ".join(f'OLD."{column}"' for column in columns.values())
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'contact_fts'")).first()
+        conn.execute(text(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS contact_fts USING fts5(
+                {names},
+                content = 'contact', content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+            )
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS contact_fts_insert AFTER INSERT ON contact
+            BEGIN
+                INSERT INTO contact_fts (rowid, {names}) VALUES (NEW.id, {new_values});
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS contact_fts_delete AFTER DELETE ON contact
+            BEGIN
+                INSERT INTO contact_fts (contact_fts, rowid, {names}) VALUES ('delete', OLD.id, {old_values});
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS contact_fts_update AFTER UPDATE ON contact
+            BEGIN
+                INSERT INTO contact_fts (contact_fts, rowid, {names}) VALUES ('delete', OLD.id, {old_values});
+                INSERT INTO contact_fts (rowid, {names}) VALUES (NEW.id, {new_values});
+            END
+        """))
+        if not exists:
+            # Index the contacts that were there before the search table
+            conn.execute(text("INSERT INTO contact_fts (contact_fts) VALUES ('rebuild')"))
+
+
+def match_expression(query, prefix=True):
+    """Turn free text into an FTS5 query that requires every term, as a prefix unless prefix is False.
+
+    Terms are quoted, so FTS5 operators and punctuation in the input are
+    never interpreted; an email address becomes its name and domain terms.
+    """
+    terms = re.findall(r"\w+", query)
+    return " ".join(f'"{term}"*' if prefix else f'"{term}"' for term in terms)
+
+
+def search_contacts(session, query, limit=None, prefix=True, columns=CONTACT_COLUMNS):
+    """Return contacts matching query, best first.
+
+    An exact email match always ranks first; the rest are ordered by bm25,
+    with name matches weighted above email matches.
+    """
+    expression = match_expression(query, prefix)
+    if not expression:
+        return []
+    limit = max(1, min(limit or SEARCH_LIMIT, SEARCH_MAX_LIMIT))
+    selected = ", ".join(f'c."{column}"' for column in columns.values())
+    weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+    rows = session.execute(
+        text(f"""
+            SELECT c.id, {selected}
+            FROM contact_fts JOIN contact c ON c.id = contact_fts.rowid
+            WHERE contact_fts MATCH :expression
+            ORDER BY lower(c."{columns['email']}") = lower(:query) DESC, bm25(contact_fts, {weights})
+            LIMIT :limit
+        """),
+        {"expression": expression, "query": query.strip(), "limit": limit},
+    ).all()
+    return [dict(zip(["id", *columns], row)) for row in rows]
@@ -1,16 +1,29 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import create_engine, Column, Integer, String, text
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import os
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone
-from transformers import pipeline
+import sys
+import hashlib
+import threading
+import time
 import uvicorn
 import logging
 
+# Make the repo-level shared package importable when run from this directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from shared.embedding_cache import get_embedding_cache
+from shared.batch_embedder import BatchEmbedder
+from shared.sentence_encoder import load_sentence_encoder, encoder_cache_name
+from shared.email_generation import EmailGenerator
+from shared.vector_store import get_vector_store
+from contact_import import import_contacts, UPSERT_BATCH_SIZE
+from contact_pages import contact_page, iter_contacts_ndjson, parse_fields
+from contact_search import init_contact_search, search_contacts
+
 # Set up logging to capture logs in the backend
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("fastapi_ai")
@@ -42,13 +55,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Pinecone and Model Initialization
-api_key = os.getenv("PINECONE_API_KEY")
-if not api_key:
-    raise ValueError("Pinecone API key is not set. Please set the PINECONE_API_KEY environment variable.")
-
-pc = Pinecone(api_key=api_key)
-index = pc.Index("mini-index")
+# Vector Store and Model Initialization
+index = get_vector_store("mini-index")
 
 
 
@@ -56,14 +64,64 @@ index = pc.Index("mini-index")
 # exit()
 
 
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-email_generator = pipeline(
-    "text-generation", 
-    model="distilgpt2", 
-    tokenizer="distilgpt2", 
-    truncation=False, 
-    pad_token_id=50256
-)
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+# Load weights at import so a pre-forking server shares them copy-on-write, e.g.
+# PRELOAD_MODELS=true gunicorn fastapi_ai:app -k uvicorn.workers.UvicornWorker -w 4 --preload
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "false").lower() == "true"
+
+
+class LazyModel:
+    """Load a model on first use, exactly once, and remember its state for health checks."""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = "unloaded"  # unloaded, loading, ready or failed
+        self.error = None
+        self.load_seconds = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self.state = "loading"
+                    started = time.perf_counter()
+                    try:
+                        self._model = self.loader()
+                    except Exception as e:
+                        self.state = "failed"
+                        self.error = str(e)
+                        raise
+                    self.load_seconds = time.perf_counter() - started
+                    self.state = "ready"
+                    self.error = None
+                    logger.info(f"Loaded {self.name} in {self.load_seconds:.1f}s")
+        return self._model
+
+    def status(self):
+        return {"state": self.state, "error": self.error, "load_seconds": self.load_seconds}
+
+
+# EMBEDDING_BACKEND=onnx runs the int8 ONNX export
+encoder_model = LazyModel(MODEL_NAME, lambda: load_sentence_encoder(MODEL_NAME))
+generator_model = LazyModel("distilgpt2", lambda: EmailGenerator("distilgpt2"))
+warmup_state = {"state": "pending" if WARMUP_ON_STARTUP else "skipped", "error": None}
+
+if PRELOAD_MODELS:
+    encoder_model.get()
+    generator_model.get()
+
+
+# Texts from concurrent requests are encoded together in micro-batches
+embedder = BatchEmbedder(lambda texts: encoder_model.get().encode(texts, convert_to_tensor=False).tolist())
+
+
+def encode_texts(texts):
+    """Encode texts with the sentence transformer, reusing cached vectors for text seen before."""
+    return get_embedding_cache().get_or_compute(encoder_cache_name(MODEL_NAME), texts, embedder.embed)
 
 # Models
 
@@ -97,6 +155,42 @@ class ContactCreate(BaseModel):
 
 Base.metadata.create_all(bind=engine)
 
+
+# Change log of contacts that still need to be synced to the vector index.
+# Triggers bump a contact's version on every insert, update or delete, whichever
+# service made the change; indexed_version and content_hash record what the
+# index holds, so syncing only touches contacts whose version moved.
+def init_change_log():
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS contact_index (
+                contact_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 1,
+                indexed_version INTEGER NOT NULL DEFAULT 0,
+                content_hash TEXT
+            )
+        """))
+        for name, event, row in (
+            ("contact_index_insert", "INSERT", "NEW"),
+            ("contact_index_update", 'UPDATE OF "firstName", "lastName", email', "NEW"),
+            ("contact_index_delete", "DELETE", "OLD"),
+        ):
+            conn.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON contact
+                BEGIN
+                    INSERT INTO contact_index (contact_id) VALUES ({row}.id)
+                    ON CONFLICT (contact_id) DO UPDATE SET version = version + 1;
+                END
+            """))
+        # Contacts created before the change log existed
+        conn.execute(text("""
+            INSERT INTO contact_index (contact_id)
+            SELECT id FROM contact WHERE id NOT IN (SELECT contact_id FROM contact_index)
+        """))
+
+init_change_log()
+init_contact_search(engine)
+
 # Database Dependency
 def get_db():
     db = SessionLocal()
@@ -111,20 +205,38 @@ def get_db():
 
 
 # Endpoints
-@app.get("/contacts", response_model=dict)
-def get_contacts(db: Session = Depends(get_db)):
-    """Retrieve all contacts."""
+def contact_columns():
+    return {"id": Contact.id, "firstName": Contact.firstName, "lastName": Contact.lastName, "email": Contact.email}
+
+@app.get("/contacts")
+def get_contacts(
+    after: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    fields: Optional[str] = None,
+    format: str = "json",
+    db: Session = Depends(get_db),
+):
+    """List contacts by id, one page at a time (after=next_cursor), or stream them with format=ndjson."""
     try:
-        contacts = db.query(Contact).all()
-        vectorize_and_upsert_to_pinecone()
-        return {"contacts": [contact.to_dict() for contact in contacts]}
-       
+        selected = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        if format == "ndjson":
+            return StreamingResponse(iter_contacts_ndjson(SessionLocal, contact_columns(), selected, after, limit),
+                                     media_type="application/x-ndjson")
+        return contact_page(db, contact_columns(), selected, after, limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/contacts/search")
+def find_contacts(q: str, limit: Optional[int] = Query(None, ge=1), prefix: bool = True, db: Session = Depends(get_db)):
+    """Full-text search over contact names and emails, best matches first."""
+    return {"contacts": search_contacts(db, q, limit, prefix)}
+
 
 @app.post("/create_contact", response_model=dict)
-def create_contact(contact: ContactCreate, db: Session = Depends(get_db)):
+def create_contact(contact: ContactCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Create a new contact."""
     try:
         new_contact = Contact(
@@ -135,15 +247,29 @@ def create_contact(contact: ContactCreate, db: Session = Depends(get_db)):
         db.add(new_contact)
         db.commit()
         db.refresh(new_contact)
-        vectorize_and_upsert_to_pinecone()
+        background_tasks.add_task(sync_contact_index)
         return {"message": "User created!", "contact": new_contact.to_dict()}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.post("/contacts/bulk", response_model=dict)
+async def bulk_create_contacts(request: Request, background_tasks: BackgroundTasks):
+    """Create many contacts from a JSON array, NDJSON or CSV body.
+
+    Rows are bulk inserted batch by batch; the change log then embeds and
+    upserts them in batches in the background.
+    """
+    summary = await import_contacts(request, SessionLocal, Contact)
+    if summary["inserted"]:
+        background_tasks.add_task(sync_contact_index)
+    log_to_frontend(f"Bulk import: {summary['inserted']} of {summary['received']} contacts created.")
+    return summary
+
+
 @app.patch("/update_contact/{user_id}", response_model=dict)
-def update_contact(user_id: int, contact: ContactCreate, db: Session = Depends(get_db)):
+def update_contact(user_id: int, contact: ContactCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Update an existing contact."""
     try:
         existing_contact = db.query(Contact).filter(Contact.id == user_id).first()
@@ -156,7 +282,7 @@ def update_contact(user_id: int, contact: ContactCreate, db: Session = Depends(g
 
         db.commit()
         db.refresh(existing_contact)
-        vectorize_and_upsert_to_pinecone()
+        background_tasks.add_task(sync_contact_index)
         return {"message": "User updated", "contact": existing_contact.to_dict()}
     except Exception as e:
         db.rollback()
@@ -164,7 +290,7 @@ def update_contact(user_id: int, contact: ContactCreate, db: Session = Depends(g
 
 
 @app.delete("/delete_contact/{user_id}", response_model=dict)
-def delete_contact(user_id: int, db: Session = Depends(get_db)):
+def delete_contact(user_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Delete a contact."""
     try:
         contact = db.query(Contact).filter(Contact.id == user_id).first()
@@ -173,7 +299,7 @@ def delete_contact(user_id: int, db: Session = Depends(get_db)):
 
         db.delete(contact)
         db.commit()
-        vectorize_and_upsert_to_pinecone()
+        background_tasks.add_task(sync_contact_index)
         return {"message": "User deleted successfully"}
     except Exception as e:
         db.rollback()
@@ -193,8 +319,8 @@ def generate_email(email_request: EmailRequest, db: Session = Depends(get_db)):
         log_to_frontend(f"Generating email for: {query} about: {purpose}")
 
         # Perform semantic search
-        query_vector = model.encode(query, convert_to_tensor=False)
-        results = index.query(vector=query_vector.tolist(), top_k=2, include_metadata=False)
+        query_vector = encode_texts([query])[0]
+        results = index.query(vector=query_vector, top_k=2, include_metadata=False)
 
         if not results["matches"]:
             log_to_frontend("No matching contacts found.")
@@ -208,12 +334,13 @@ def generate_email(email_request: EmailRequest, db: Session = Depends(get_db)):
             log_to_frontend(f"Contact with ID {contact_id} not found.")
             raise HTTPException(status_code=404, detail="Contact not found")
 
-        # Generate email
-        prompt = (f"Subject: {purpose} Email\n\n"
-                  f"Dear {contact.firstName} {contact.lastName},\n\n"
+        # Generate email; the subject line is a prefix shared by every email with this purpose
+        prefix = f"Subject: {purpose} Email\n\nDear"
+        suffix = (f" {contact.firstName} {contact.lastName},\n\n"
                   f"I want to {purpose}. Please let me know how we can proceed.\n\n")
-                 
-        email_content = email_generator(prompt, max_length=150, num_return_sequences=1)[0]["generated_text"]
+        cache_key = (contact.id, contact.firstName, contact.lastName, purpose)
+
+        email_content = generator_model.get().generate([suffix], prefix=prefix, cache_keys=[cache_key])[0]
 
         log_to_frontend(f"Generated email for {contact.firstName} {contact.lastName}")
         return {
@@ -226,85 +353,122 @@ def generate_email(email_request: EmailRequest, db: Session = Depends(get_db)):
 
 
 
-def vectorize_and_upsert_to_pinecone():
-    logger.info("Starting vectorization and upsert to Pinecone...")
-    db = SessionLocal()
-    contacts = db.query(Contact).all()
+def contact_text(first_name, last_name, email):
+    """Text embedded for a contact."""
+    return f"{first_name} {last_name} {email}"
 
-    if not contacts:
-        logger.warning("Database is empty. Skipping upsert to Pinecone.")
-        log_to_frontend("Database is empty. Skipping upsert to Pinecone.")
-        return
 
-    try:
-        # Fetch all existing vector IDs from Pinecone
-        logger.info("Fetching existing vector IDs from Pinecone...")
-        existing_ids = set()
-        response = index.describe_index_stats()
-        vector_count = response.get("total_vector_count", 0)
-
-        if vector_count > 0:
-            logger.info(f"Index contains {vector_count} vectors.")
-            # If there are existing vectors, fetch them in batches
-            for i in range(0, vector_count, 100):  # Fetch 100 IDs at a time
-                fetch_response = index.fetch(ids=[str(x) for x in range(i, i + 100)])
-                if "vectors" in fetch_response:
-                    existing_ids.update(fetch_response["vectors"].keys())
-
-        # Log fetched IDs
-        logger.info(f"Fetched {len(existing_ids)} existing IDs from Pinecone.")
-
-        # Collect new vectors for upsertion
-        vectors_to_upsert = []
-        for contact in contacts:
-            contact_id = str(contact.id)
-            if contact_id not in existing_ids:
-                contact_text = f"{contact.firstName} {contact.lastName} {contact.email}"
-                vector = model.encode(contact_text, convert_to_tensor=False)
-                vectors_to_upsert.append((contact_id, vector.tolist()))
-
-        # Upsert only new vectors
-        if vectors_to_upsert:
-            index.upsert(vectors=vectors_to_upsert)
-            logger.info(f"{len(vectors_to_upsert)} new vectors upserted to Pinecone.")
-            log_to_frontend(f"{len(vectors_to_upsert)} new vectors upserted to Pinecone.")
-        else:
-            logger.info("No new vectors to upsert. Pinecone is already up-to-date.")
-            log_to_frontend("No new vectors to upsert. Pinecone is already up-to-date.")
+def content_hash(text_value):
+    return hashlib.sha256(text_value.encode("utf-8")).hexdigest()
 
-    except Exception as e:
-        logger.error(f"Error during vectorization/upsert: {str(e)}")
-        log_to_frontend(f"Error during vectorization/upsert: {str(e)}")
-    finally:
-        db.close()
 
+sync_lock = threading.Lock()
 
 
+def sync_contact_index():
+    """Re-embed and upsert changed contacts and delete removed ones from the vector index.
 
+    Only contacts whose version moved since they were last indexed are read,
+    and edits that leave the embedded text unchanged are not re-embedded.
+    """
+    with sync_lock:
+        try:
+            with engine.connect() as conn:
+                pending = conn.execute(text("""
+                    SELECT ci.contact_id, ci.version, ci.content_hash, c.id, c."firstName", c."lastName", c.email
+                    FROM contact_index ci LEFT JOIN contact c ON c.id = ci.contact_id
+                    WHERE ci.version != ci.indexed_version
+                """)).fetchall()
+            if not pending:
+                logger.info("Vector index is already up-to-date.")
+                return
+
+            deleted = [row for row in pending if row.id is None]
+            present = [(row, contact_text(row.firstName, row.lastName, row.email)) for row in pending if row.id is not None]
+            changed = [(row, text_value) for row, text_value in present if content_hash(text_value) != row.content_hash]
+
+            if changed:
+                vectors = encode_texts([text_value for _, text_value in changed])
+                upserts = [(str(row.contact_id), vector) for (row, _), vector in zip(changed, vectors)]
+                for start in range(0, len(upserts), UPSERT_BATCH_SIZE):
+                    index.upsert(vectors=upserts[start:start + UPSERT_BATCH_SIZE])
+            if deleted:
+                deleted_ids = [str(row.contact_id) for row in deleted]
+                for start in range(0, len(deleted_ids), UPSERT_BATCH_SIZE):
+                    index.delete(ids=deleted_ids[start:start + UPSERT_BATCH_SIZE])
+
+            with engine.begin() as conn:
+                # The version guard leaves contacts edited during this sync pending for the next one
+                for row, text_value in present:
+                    conn.execute(
+                        text("UPDATE contact_index SET indexed_version = :version, content_hash = :hash "
+                             "WHERE contact_id = :contact_id AND version = :version"),
+                        {"version": row.version, "hash": content_hash(text_value), "contact_id": row.contact_id},
+                    )
+                for row in deleted:
+                    conn.execute(
+                        text("DELETE FROM contact_index WHERE contact_id = :contact_id AND version = :version"),
+                        {"contact_id": row.contact_id, "version": row.version},
+                    )
+
+            log_to_frontend(f"Vector index synced: {len(changed)} contacts upserted, {len(deleted)} deleted.")
+        except Exception as e:
+            logger.error(f"Error during vector index sync: {str(e)}")
+            log_to_frontend(f"Error during vector index sync: {str(e)}")
 
 
+def upsert_vectors_on_run():
+    try:
+        logger.info("Syncing changed contacts to the vector index...")
+        sync_contact_index()
+    except Exception as e:
+        logger.error(f"Error during vector index sync: {str(e)}")
 
 
-# Check if the database has been vectorized and upserted on first run
-def check_and_upsert_on_first_run():
+def warm_up():
+    """Load both models and run one inference through each."""
+    warmup_state["state"] = "running"
     try:
-        logger.info("Checking if the database has been vectorized and upserted to Pinecone...")
-        if index.describe_index_stats()["vectors"]["count"] == 0:
-            logger.info("No vectors found in Pinecone. Starting vectorization and upsert...")
-            vectorize_and_upsert_to_pinecone()
-        else:
-            logger.info("Pinecone index already populated with vectors.")
+        encoder_model.get().encode(["warm up"], convert_to_tensor=False)
+        generator_model.get().generate(["warm up"], max_length=8)
+        warmup_state["state"] = "done"
     except Exception as e:
-        logger.error(f"Error during Pinecone check/upsert: {str(e)}")
+        warmup_state.update({"state": "failed", "error": str(e)})
+        logger.error(f"Warm-up failed: {str(e)}")
 
 
+def run_startup_tasks():
+    if WARMUP_ON_STARTUP:
+        warm_up()
+    upsert_vectors_on_run()
 
-def upsert_vectors_on_run():
-    try:
-        logger.info("Starting vectorization and upsert to Pinecone...")
-        vectorize_and_upsert_to_pinecone()
-    except Exception as e:
-        logger.error(f"Error during Pinecone upsert: {str(e)}")
+
+@app.on_event("startup")
+def start_background_startup():
+    # Runs in a thread so the server starts accepting connections immediately
+    threading.Thread(target=run_startup_tasks, name="startup-tasks", daemon=True).start()
+
+
+@app.get("/health/live")
+def liveness():
+    """The process is up and serving requests."""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+def readiness():
+    """Ready once both models are loaded; 503 while loading or after a failed load.
+
+    With WARMUP_ON_STARTUP=false the models load on the first request that
+    needs them, which a readiness-gated load balancer would never send, so
+    the service reports ready straight away.
+    """
+    models = {model.name: model.status() for model in (encoder_model, generator_model)}
+    ready = not WARMUP_ON_STARTUP or all(status["state"] == "ready" for status in models.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not ready", "models": models, "warmup": warmup_state},
+    )
 
 
 
@@ -318,8 +482,7 @@ def get_logs():
 
 # Main Entry
 if __name__ == "__main__":
-    log_to_frontend("Starting application and vectorization process...")
-    upsert_vectors_on_run()  # Always run the vectorization and upsert process
+    log_to_frontend("Starting application...")
 
-    # Run the FastAPI app
+    # Run the FastAPI app; models load and the vector index syncs once it is listening
     uvicorn.run("fastapi_ai:app", host="0.0.0.0", port=5000)
\ No newline at end of file
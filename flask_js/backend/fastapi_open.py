@@ -1,14 +1,23 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import create_engine, Column, Integer, String
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import os
+import sys
 import uvicorn
 import logging
 import openai
-from pinecone import Pinecone
+
+# Make the repo-level shared package importable when run from this directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from shared.embedding_cache import get_embedding_cache
+from shared.vector_store import get_vector_store
+from contact_import import import_contacts, UPSERT_BATCH_SIZE
+from contact_pages import contact_page, iter_contacts_ndjson, parse_fields
+from contact_search import init_contact_search, search_contacts
 
 # Set up logging to capture logs in the backend
 logging.basicConfig(level=logging.INFO)
@@ -40,18 +49,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Pinecone and OpenAI Initialization
-api_key = os.getenv("PINECONE_API_KEY")
-if not api_key:
-    raise ValueError("Pinecone API key is not set. Please set the PINECONE_API_KEY environment variable.")
-
-pc = Pinecone(api_key=api_key)
-index = pc.Index("ada-index")
+# Vector Store and OpenAI Initialization
+index = get_vector_store("ada-index")
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
 if not openai.api_key:
     raise ValueError("OpenAI API key is not set. Please set the OPENAI_API_KEY environment variable.")
 
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+
+def embed_texts(texts):
+    """Embed texts with OpenAI, reusing cached vectors for text seen before."""
+    def compute(missing):
+        response = openai.Embedding.create(input=missing, model=EMBEDDING_MODEL)
+        data = sorted(response["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    return get_embedding_cache().get_or_compute(EMBEDDING_MODEL, texts, compute)
+
 # Models
 class EmailRequest(BaseModel):
     query: str
@@ -79,6 +95,7 @@ class ContactCreate(BaseModel):
     email: str
 
 Base.metadata.create_all(bind=engine)
+init_contact_search(engine)
 
 # Database Dependency
 def get_db():
@@ -89,15 +106,35 @@ def get_db():
         db.close()
 
 # Endpoints
-@app.get("/contacts", response_model=dict)
-def get_contacts(db: Session = Depends(get_db)):
-    """Retrieve all contacts."""
+def contact_columns():
+    return {"id": Contact.id, "firstName": Contact.firstName, "lastName": Contact.lastName, "email": Contact.email}
+
+@app.get("/contacts")
+def get_contacts(
+    after: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    fields: Optional[str] = None,
+    format: str = "json",
+    db: Session = Depends(get_db),
+):
+    """List contacts by id, one page at a time (after=next_cursor), or stream them with format=ndjson."""
+    try:
+        selected = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     try:
-        contacts = db.query(Contact).all()
-        return {"contacts": [contact.to_dict() for contact in contacts]}
+        if format == "ndjson":
+            return StreamingResponse(iter_contacts_ndjson(SessionLocal, contact_columns(), selected, after, limit),
+                                     media_type="application/x-ndjson")
+        return contact_page(db, contact_columns(), selected, after, limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/contacts/search")
+def find_contacts(q: str, limit: Optional[int] = Query(None, ge=1), prefix: bool = True, db: Session = Depends(get_db)):
+    """Full-text search over contact names and emails, best matches first."""
+    return {"contacts": search_contacts(db, q, limit, prefix)}
+
 @app.post("/create_contact", response_model=dict)
 def create_contact(contact: ContactCreate, db: Session = Depends(get_db)):
     """Create a new contact."""
@@ -116,6 +153,13 @@ def create_contact(contact: ContactCreate, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/contacts/bulk", response_model=dict)
+async def bulk_create_contacts(request: Request):
+    """Create many contacts from a JSON array, NDJSON or CSV body, embedding and upserting them in batches."""
+    summary = await import_contacts(request, SessionLocal, Contact, index_contacts=index_contacts)
+    log_to_frontend(f"Bulk import: {summary['inserted']} of {summary['received']} contacts created.")
+    return summary
+
 @app.post("/generate_email")
 def generate_email(email_request: EmailRequest, db: Session = Depends(get_db)):
     """Generate a professional email for a contact using OpenAI's ChatCompletion."""
@@ -125,10 +169,7 @@ def generate_email(email_request: EmailRequest, db: Session = Depends(get_db)):
         log_to_frontend(f"Generating email for: {query} about: {purpose}")
 
         # Perform semantic search
-        query_vector = openai.Embedding.create(
-            input=query,
-            model="text-embedding-ada-002"
-        )['data'][0]['embedding']
+        query_vector = embed_texts([query])[0]
 
         results = index.query(vector=query_vector, top_k=2, include_metadata=False)
 
@@ -179,17 +220,32 @@ def vectorize_and_upsert_contact(contact):
     """Vectorize and upsert a single contact."""
     try:
         contact_text = f"{contact.firstName} {contact.lastName} {contact.email}"
-        response = openai.Embedding.create(
-            input=contact_text,
-            model="text-embedding-ada-002"
-        )
-        vector = response['data'][0]['embedding']
+        vector = embed_texts([contact_text])[0]
         index.upsert(vectors=[(str(contact.id), vector)])
         log_to_frontend(f"Upserted vector for contact ID {contact.id}")
     except Exception as e:
         logger.error(f"Error vectorizing contact ID {contact.id}: {str(e)}")
         log_to_frontend(f"Error vectorizing contact ID {contact.id}: {str(e)}")
 
+def index_contacts(contacts):
+    """Embed a batch of contacts and upsert their vectors; returns (contact, error) for failures."""
+    try:
+        vectors = embed_texts([f"{contact['firstName']} {contact['lastName']} {contact['email']}" for contact in contacts])
+    except Exception as e:
+        log_to_frontend(f"Error embedding {len(contacts)} contacts: {str(e)}")
+        return [(contact, str(e)) for contact in contacts]
+
+    failures = []
+    for start in range(0, len(contacts), UPSERT_BATCH_SIZE):
+        batch = contacts[start:start + UPSERT_BATCH_SIZE]
+        try:
+            index.upsert(vectors=[(str(contact["id"]), vector) for contact, vector in zip(batch, vectors[start:start + UPSERT_BATCH_SIZE])])
+        except Exception as e:
+            log_to_frontend(f"Error upserting {len(batch)} vectors: {str(e)}")
+            failures.extend((contact, str(e)) for contact in batch)
+    log_to_frontend(f"Upserted vectors for {len(contacts) - len(failures)} contacts")
+    return failures
+
 @app.get("/logs")
 def get_logs():
     """Fetch the latest logs."""
@@ -1,10 +1,13 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import create_engine, Column, Integer, String, inspect
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import uvicorn
+from contact_pages import contact_page, iter_contacts_ndjson, parse_fields
+from contact_search import init_contact_search, search_contacts
 
 DATABASE_URL = "sqlite:///./instance/mydatabase.db"
 
@@ -47,6 +50,7 @@ class ContactCreate(BaseModel):
     email: str
 
 Base.metadata.create_all(bind=engine)
+init_contact_search(engine)
 
 def get_db():
     db = SessionLocal()
@@ -55,10 +59,31 @@ def get_db():
     finally:
         db.close()
 
+def contact_columns():
+    return {"id": Contact.id, "firstName": Contact.firstName, "lastName": Contact.lastName, "email": Contact.email}
+
 @app.get("/contacts")
-def get_contacts(db: Session = Depends(get_db)):
-    contacts = db.query(Contact).all()
-    return {"contacts": [contact.to_dict() for contact in contacts]}
+def get_contacts(
+    after: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    fields: Optional[str] = None,
+    format: str = "json",
+    db: Session = Depends(get_db),
+):
+    """List contacts by id, one page at a time (after=next_cursor), or stream them with format=ndjson."""
+    try:
+        selected = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format == "ndjson":
+        return StreamingResponse(iter_contacts_ndjson(SessionLocal, contact_columns(), selected, after, limit),
+                                 media_type="application/x-ndjson")
+    return contact_page(db, contact_columns(), selected, after, limit)
+
+@app.get("/contacts/search")
+def find_contacts(q: str, limit: Optional[int] = Query(None, ge=1), prefix: bool = True, db: Session = Depends(get_db)):
+    """Full-text search over contact names and emails, best matches first."""
+    return {"contacts": search_contacts(db, q, limit, prefix)}
 
 @app.post("/create_contact")
 def create_contact(contact: ContactCreate, db: Session = Depends(get_db)):
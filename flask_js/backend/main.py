@@ -1,14 +1,42 @@
-from flask import request, jsonify
+from flask import request, jsonify, Response, stream_with_context
 from config import app, db
 from models import Contact
+from contact_pages import contact_page, iter_contacts_ndjson, parse_fields
+from contact_search import init_contact_search, search_contacts
 
 
 
+def contact_columns():
+    return {"id": Contact.id, "firstName": Contact.first_name, "lastName": Contact.last_name, "email": Contact.email}
+
+
+# Table column names behind the API fields for contact search
+SEARCH_COLUMNS = {"firstName": "first_name", "lastName": "last_name", "email": "email"}
+
+
 @app.route("/contacts", methods=['GET'])
 def get_contacts():
-    contacts = Contact.query.all()
-    json_contacts = list(map(lambda x: x.to_json(), contacts))
-    return jsonify({"contacts": json_contacts})
+    after = request.args.get("after", type=int)
+    limit = request.args.get("limit", type=int)
+    try:
+        fields = parse_fields(request.args.get("fields"))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    if request.args.get("format") == "ndjson":
+        contacts = iter_contacts_ndjson(lambda: db.session, contact_columns(), fields, after, limit)
+        return Response(stream_with_context(contacts), mimetype="application/x-ndjson")
+    return jsonify(contact_page(db.session, contact_columns(), fields, after, limit))
+
+
+@app.route("/contacts/search", methods=['GET'])
+def find_contacts():
+    query = request.args.get("q")
+    if not query:
+        return jsonify({"message": "q is required"}), 400
+    limit = request.args.get("limit", type=int)
+    prefix = request.args.get("prefix", "true").lower() != "false"
+    return jsonify({"contacts": search_contacts(db.session, query, limit, prefix, SEARCH_COLUMNS)})
 
 
 @app.route("/create_contact", methods=["POST"])
@@ -71,6 +99,7 @@ def delete_contact(user_id):
 if __name__ == "__main__":
     with app.app_context():
         db.create_all()
+        init_contact_search(db.engine, SEARCH_COLUMNS)
     
     app.run(host="0.0.0.0", port=5000)
 
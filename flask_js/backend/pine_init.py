@@ -1,27 +1,23 @@
 import sqlite3
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone
-from transformers import pipeline
 import os
+import sys
 
-# Initialize Pinecone and SentenceTransformer
-api_key = os.getenv("PINECONE_API_KEY")
+# Make the repo-level shared package importable when run from this directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from shared.embedding_cache import get_embedding_cache
+from shared.batch_embedder import BatchEmbedder
+from shared.sentence_encoder import load_sentence_encoder, encoder_cache_name
+from shared.email_generation import EmailGenerator
+from shared.vector_store import get_vector_store
 
-if not api_key:
-    raise ValueError("Pinecone API key is not set. Please set the PINECONE_API_KEY environment variable.")
+# Initialize the vector store and SentenceTransformer
+index = get_vector_store("mini-index")
+print("Vector store connected")
 
-pc = Pinecone(api_key=api_key)
-print("API connected")
-index = pc.Index("mini-index")
-
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-email_generator = pipeline(
-    "text-generation", 
-    model="distilgpt2", 
-    tokenizer="distilgpt2", 
-    truncation=False, 
-    pad_token_id=50256
-)
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+model = load_sentence_encoder(MODEL_NAME)  # EMBEDDING_BACKEND=onnx runs the int8 ONNX export
+embedder = BatchEmbedder(lambda texts: model.encode(texts, convert_to_tensor=False).tolist())
+email_generator = EmailGenerator("distilgpt2")
 
 db_path = "instance/mydatabase.db"
 conn = sqlite3.connect(db_path)
@@ -34,22 +30,22 @@ def get_contact_by_id(contact_id):
 
 def semantic_search(query, top_k=1):
     """Perform semantic search using Pinecone."""
-    query_vector = model.encode(query, convert_to_tensor=False)
-    results = index.query(vector=query_vector.tolist(), top_k=top_k, include_metadata=False)
+    query_vector = get_embedding_cache().get_or_compute(encoder_cache_name(MODEL_NAME), [query], embedder.embed)[0]
+    results = index.query(vector=query_vector, top_k=top_k, include_metadata=False)
     return results
 
 def generate_email(contact, purpose):
     """Generate a personalized email draft for a contact."""
-    first_name, last_name, email = contact[1], contact[2], contact[3]
-    prompt = (f"Subject: {purpose} Email\n\n"
-              f"Dear {first_name} {last_name},\n\n"
-              f"I want to {purpose}")
-            
+    return generate_emails([contact], purpose)[0]
 
-    email_content = email_generator(prompt, max_length=150, num_return_sequences=1)[0]["generated_text"]
+def generate_emails(contacts, purpose):
+    """Generate personalized email drafts for several contacts in batches."""
+    prefix = f"Subject: {purpose} Email\n\nDear"
+    suffixes = [f" {contact[1]} {contact[2]},\n\nI want to {purpose}" for contact in contacts]
+    cache_keys = [(contact[0], contact[1], contact[2], purpose) for contact in contacts]
 
-    email_content = email_content.split("\n")[:8]  
-    return "\n".join(email_content)
+    drafts = email_generator.generate(suffixes, prefix=prefix, cache_keys=cache_keys)
+    return ["\n".join(email_content.split("\n")[:8]) for email_content in drafts]
 
 def main():
     print("Welcome to the Smart Contact Recommendation and Messaging System!")
@@ -79,8 +75,7 @@ def main():
         print("\nGenerating email drafts...\n")
         
         drafts = []
-        for contact in contacts:
-            email_content = generate_email(contact, purpose)
+        for contact, email_content in zip(contacts, generate_emails(contacts, purpose)):
             print(f"--- Email for {contact[1]} {contact[2]} ({contact[3]}) ---")
             print(email_content)
             print("\n")
@@ -1,9 +1,9 @@
+import json
 import requests
-import random
 import faker
 
 # Configuration
-API_URL = "http://localhost:5000/create_contact"  # Adjust URL if deployed
+API_URL = "http://localhost:5000/contacts/bulk"  # Adjust URL if deployed
 BATCH_SIZE = 1000  # Number of contacts to create
 faker_instance = faker.Faker()
 
@@ -15,16 +15,28 @@ def generate_contact():
         "email": faker_instance.email(),
     }
 
+def iter_ndjson(batch_size):
+    """Yield synthetic contacts as NDJSON lines so the request body is streamed."""
+    for _ in range(batch_size):
+        yield (json.dumps(generate_contact()) + "\n").encode("utf-8")
+
 def populate_database(batch_size):
-    """Send PUT requests to create synthetic contacts."""
-    for i in range(batch_size):
-        contact_data = generate_contact()
-        response = requests.post(API_URL, json=contact_data)
-        
-        if response.status_code == 200:
-            print(f"Contact {i + 1}/{batch_size} created successfully.")
-        else:
-            print(f"Failed to create contact {i + 1}/{batch_size}: {response.text}")
+    """Send all synthetic contacts to the bulk import endpoint in one streamed request."""
+    response = requests.post(
+        API_URL,
+        data=iter_ndjson(batch_size),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    if response.status_code == 200:
+        summary = response.json()
+        print(f"{summary['inserted']}/{summary['received']} contacts created successfully.")
+        for failure in summary["failed"]:
+            print(f"Failed to create contact {failure['row']}/{batch_size}: {failure['error']}")
+        for failure in summary.get("index_failed", []):
+            print(f"Contact {failure['id']} was created but not indexed: {failure['error']}")
+    else:
+        print(f"Bulk import failed: {response.text}")
 
 if __name__ == "__main__":
     print(f"Starting to populate the database with {BATCH_SIZE} synthetic contacts...")
@@ -0,0 +1,56 @@
+"""Readiness of fastapi_ai with and without warm-up on startup."""
+import importlib
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def fastapi_ai(tmp_path_factory):
+    # Import from an empty working directory so the module's SQLite setup and
+    # local vector store never touch the real instance database
+    workdir = tmp_path_factory.mktemp("fastapi_ai")
+    (workdir / "instance").mkdir()
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(workdir)
+        patch.setenv("VECTOR_STORE", "local")
+        patch.setenv("VECTOR_STORE_DIR", str(workdir / "vector_store"))
+        module = importlib.import_module("fastapi_ai")
+    return module
+
+
+@pytest.fixture
+def models(fastapi_ai, monkeypatch):
+    """Swap in stub loaders so nothing is downloaded, and start from unloaded models."""
+    for model in (fastapi_ai.encoder_model, fastapi_ai.generator_model):
+        monkeypatch.setattr(model, "loader", object)
+        monkeypatch.setattr(model, "_model", None)
+        monkeypatch.setattr(model, "state", "unloaded")
+    return fastapi_ai.encoder_model, fastapi_ai.generator_model
+
+
+def readiness(fastapi_ai):
+    response = fastapi_ai.readiness()
+    return response.status_code, json.loads(response.body)
+
+
+def test_ready_only_once_warm_up_loaded_the_models(fastapi_ai, models, monkeypatch):
+    monkeypatch.setattr(fastapi_ai, "WARMUP_ON_STARTUP", True)
+    status, body = readiness(fastapi_ai)
+    assert status == 503 and body["status"] == "not ready"
+
+    for model in models:
+        model.get()
+    status, body = readiness(fastapi_ai)
+    assert status == 200 and body["status"] == "ready"
+
+
+def test_ready_before_lazy_models_load_without_warm_up(fastapi_ai, models, monkeypatch):
+    monkeypatch.setattr(fastapi_ai, "WARMUP_ON_STARTUP", False)
+    status, body = readiness(fastapi_ai)
+    assert status == 200 and body["status"] == "ready"
+    assert all(model["state"] == "unloaded" for model in body["models"].values())
@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import './App.css';
+import ContactList, { CONTACT_FIELDS } from './ContactList.jsx';
 
 const ContactForm = ({ existingContact = {}, updateCallback }) => {
   const [firstName, setFirstName] = useState(existingContact.firstName || '');
@@ -72,55 +73,6 @@ const ContactForm = ({ existingContact = {}, updateCallback }) => {
   );
 };
 
-const ContactList = ({ contacts, updateContact, updateCallback }) => {
-  const onDelete = async (id) => {
-    try {
-      const options = { method: 'DELETE' };
-      const response = await fetch(
-        `http://127.0.0.1:5000/delete_contact/${id}`,
-        options
-      );
-
-      if (response.status === 200) {
-        updateCallback();
-      } else {
-        console.error('Failed to delete contact.');
-      }
-    } catch (error) {
-      alert(`Error occurred: ${error.message}`);
-    }
-  };
-
-  return (
-    <div>
-      <h2>Contacts</h2>
-      <table>
-        <thead>
-          <tr>
-            <th>First Name</th>
-            <th>Last Name</th>
-            <th>Email</th>
-            <th>Actions</th>
-          </tr>
-        </thead>
-        <tbody>
-          {contacts.map((contact) => (
-            <tr key={contact.id}>
-              <td>{contact.firstName}</td>
-              <td>{contact.lastName}</td>
-              <td>{contact.email}</td>
-              <td>
-                <button onClick={() => updateContact(contact)}>Update</button>
-                <button onClick={() => onDelete(contact.id)}>Delete</button>
-              </td>
-            </tr>
-          ))}
-        </tbody>
-      </table>
-    </div>
-  );
-};
-
 function App() {
   const [contacts, setContacts] = useState([]);
   const [isModalOpen, setIsModalOpen] = useState(false);
@@ -129,6 +81,9 @@ function App() {
   const [logs, setLogs] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
 
+  // pageCursors[i] is the `after` cursor that loads page i + 1
+  const [pageCursors, setPageCursors] = useState([null]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [currentPage, setCurrentPage] = useState(1);
   const recordsPerPage = 10;
 
@@ -140,11 +95,18 @@ function App() {
     return () => clearInterval(logInterval);
   }, []);
 
-  const fetchContacts = async () => {
+  const fetchContacts = async (after = pageCursors[currentPage - 1]) => {
     try {
-      const response = await fetch('http://127.0.0.1:5000/contacts');
+      const params = new URLSearchParams({
+        limit: recordsPerPage,
+        fields: CONTACT_FIELDS.join(','),
+      });
+      if (after !== null) params.set('after', after);
+
+      const response = await fetch(`http://127.0.0.1:5000/contacts?${params}`);
       const data = await response.json();
       setContacts(data.contacts);
+      setNextCursor(data.next_cursor);
       setIsLoading(false);
     } catch (error) {
       console.error('Failed to fetch contacts:', error);
@@ -208,17 +170,17 @@ function App() {
     }
   };
 
-  const indexOfLastRecord = currentPage * recordsPerPage;
-  const indexOfFirstRecord = indexOfLastRecord - recordsPerPage;
-  const currentRecords = contacts.slice(indexOfFirstRecord, indexOfLastRecord);
-  const totalPages = Math.ceil(contacts.length / recordsPerPage);
-
   const handleNextPage = () => {
-    if (currentPage < totalPages) setCurrentPage(currentPage + 1);
+    if (nextCursor === null) return;
+    setPageCursors([...pageCursors.slice(0, currentPage), nextCursor]);
+    setCurrentPage(currentPage + 1);
+    fetchContacts(nextCursor);
   };
 
   const handlePrevPage = () => {
-    if (currentPage > 1) setCurrentPage(currentPage - 1);
+    if (currentPage === 1) return;
+    setCurrentPage(currentPage - 1);
+    fetchContacts(pageCursors[currentPage - 2]);
   };
 
   return (
@@ -240,12 +202,10 @@ function App() {
             >
               Previous
             </button>
-            <span>
-              Page {currentPage} of {totalPages}
-            </span>
+            <span>Page {currentPage}</span>
             <button
               onClick={handleNextPage}
-              disabled={currentPage === totalPages}
+              disabled={nextCursor === null}
               className="pagination-btn"
             >
               Next
@@ -253,7 +213,7 @@ function App() {
           </div>
 
           <ContactList
-            contacts={currentRecords}
+            contacts={contacts}
             updateContact={openEditModal}
             updateCallback={onUpdate}
           />
@@ -1,5 +1,7 @@
 import React from "react"
 
+// Columns the table renders; the list request asks the API for only these
+export const CONTACT_FIELDS = ["id", "firstName", "lastName", "email"]
 
 
 const ContactList = ({ contacts, updateContact, updateCallback }) => {
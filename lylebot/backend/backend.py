@@ -1,19 +1,40 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from dotenv import load_dotenv
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.logger import logger
 import boto3
 import os
+import sys
 import uuid
+import time
+import json
 import openai
-from pinecone import Pinecone
-import io
 from typing import List
 import uvicorn
-import PyPDF2
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import sqlite3
+import asyncio
+import shutil
+from embeddings import embed_texts
+from executors import run_blocking, shutdown_pools
+from ingest_jobs import IngestQueue, IngestWorkerPool
+from pdf_extract import aiter_pdf_pages, shutdown_process_pool
+from enrichment import ENRICH_REUSE_SECTIONS, SectionPrefetcher, enrich_document, init_section_cache
+from chunker import iter_chunks
+from response_cache import SemanticResponseCache
+from sqlite_pool import close_pools, get_pool
+from s3_transfer import delete_keys, iter_keys, upload_fileobj
+from chat_log import ChatLogSink
+from mapping_cache import MappingCache, init_mapping_version, mapping_version
+from hybrid_search import (
+    HYBRID_LEXICAL_CANDIDATES, HYBRID_LEXICAL_WEIGHT, HYBRID_TOP_K, HYBRID_VECTOR_CANDIDATES,
+    HYBRID_VECTOR_WEIGHT, backfill_chunk_text, init_chunk_text, lexical_search, reciprocal_rank_fusion,
+    save_chunk_text,
+)
+
+# Make the repo-level shared package importable when run from this directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from shared.vector_store import get_vector_store
 #openai 0.28.0
 
 
@@ -25,34 +46,65 @@ class ChatRequest(BaseModel):
 
 
 DB_FILE = "file_mappings.db"
+db_pool = get_pool(DB_FILE)
+
+# Answers to near-identical questions are served from memory until documents change
+response_cache = SemanticResponseCache(db_pool)
 
 def init_db():
     """Initialize SQLite database and create mappings and chunks tables."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    # Table to map documents to their S3 keys
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS file_mappings (
-            doc_id TEXT PRIMARY KEY,
-            filename TEXT NOT NULL,
-            s3_key TEXT NOT NULL
-        )
-    """)
-
-    # Table to track chunks for each document
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS chunk_mappings (
-            chunk_id TEXT PRIMARY KEY,
-            doc_id TEXT NOT NULL,
-            FOREIGN KEY(doc_id) REFERENCES file_mappings(doc_id)
-        )
-    """)
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+
+        # Table to map documents to their S3 keys
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS file_mappings (
+                doc_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                s3_key TEXT NOT NULL
+            )
+        """)
+
+        # Table to track chunks for each document
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_mappings (
+                chunk_id TEXT PRIMARY KEY,
+                doc_id TEXT NOT NULL,
+                FOREIGN KEY(doc_id) REFERENCES file_mappings(doc_id)
+            )
+        """)
+
+        # Table to record how long text extraction took for each document
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS extraction_metrics (
+                doc_id TEXT PRIMARY KEY,
+                pages INTEGER NOT NULL,
+                seconds REAL NOT NULL,
+                recorded_at REAL NOT NULL
+            )
+        """)
+
+        # Version counter bumped on every file_mappings change, for the in-memory mapping cache
+        init_mapping_version(cursor)
+
+        # Version counter of the indexed documents, shared by the response caches of every worker
+        response_cache.init(cursor)
 
-    conn.commit()
-    conn.close()
 
 init_db()
+init_section_cache(DB_FILE)
+init_chunk_text(DB_FILE)
+
+# file_mappings is small and read on every chat, so it is served from memory
+mapping_cache = MappingCache(db_pool)
+mapping_cache.load()
+
+# Uploaded files are spooled here until their ingestion job finishes
+INGEST_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR", "ingest_spool")
+INGEST_STAGES = ["upload", "extract", "enrich", "index"]
+
+ingest_queue = IngestQueue(db_pool, INGEST_STAGES)
+ingest_queue.init()
 
 
 
@@ -81,9 +133,8 @@ s3_client = boto3.client(
     aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
 )
 
-# Initialize Pinecone
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index = pc.Index(PINECONE_INDEX_NAME)
+# Initialize the vector store (Pinecone unless VECTOR_STORE=local)
+index = get_vector_store(PINECONE_INDEX_NAME)
 
 
 def clear_pinecone():
@@ -97,18 +148,12 @@ def clear_pinecone():
 def clear_s3():
     """Delete all files in the S3 bucket."""
     try:
-        # List all objects in the bucket
-        response = s3_client.list_objects_v2(Bucket=BUCKET_NAME)
-        if "Contents" in response:
-            # Extract object keys
-            object_keys = [{"Key": obj["Key"]} for obj in response["Contents"]]
-            
-            # Delete all objects in the bucket
-            s3_client.delete_objects(
-                Bucket=BUCKET_NAME,
-                Delete={"Objects": object_keys}
-            )
-            print(f"All files have been deleted from the S3 bucket '{BUCKET_NAME}'.")
+        # Delete every page of keys in 1000-key batches
+        deleted, errors = delete_keys(s3_client, BUCKET_NAME, iter_keys(s3_client, BUCKET_NAME))
+        if errors:
+            print(f"Deleted {deleted} files from the S3 bucket '{BUCKET_NAME}'; {len(errors)} could not be deleted.")
+        elif deleted:
+            print(f"All {deleted} files have been deleted from the S3 bucket '{BUCKET_NAME}'.")
         else:
             print(f"No files found in the S3 bucket '{BUCKET_NAME}'.")
     except Exception as e:
@@ -117,16 +162,15 @@ def clear_s3():
 def clear_sqlite():
     """Delete all entries in the SQLite database."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
         
-        # Clear file_mappings table
-        cursor.execute("DELETE FROM file_mappings")
-        # Clear chunk_mappings table
-        cursor.execute("DELETE FROM chunk_mappings")
+            # Clear file_mappings table
+            cursor.execute("DELETE FROM file_mappings")
+            # Clear chunk_mappings table
+            cursor.execute("DELETE FROM chunk_mappings")
         
-        conn.commit()
-        conn.close()
+        mapping_cache.load()
         print("All entries have been deleted from SQLite database.")
     except Exception as e:
         print(f"Error clearing SQLite database: {e}")
@@ -140,28 +184,59 @@ def clear_sqlite():
 
 
 def save_mapping(doc_id, filename, s3_key):
-    """Save a new mapping in the SQLite database."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT OR REPLACE INTO file_mappings (doc_id, filename, s3_key)
-        VALUES (?, ?, ?)
-    """, (doc_id, filename, s3_key))
-    conn.commit()
-    conn.close()
+    """Save a new mapping in the SQLite database and the mapping cache."""
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT OR REPLACE INTO file_mappings (doc_id, filename, s3_key)
+            VALUES (?, ?, ?)
+        """, (doc_id, filename, s3_key))
+        version = mapping_version(cursor)
+    mapping_cache.put(doc_id, {"filename": filename, "s3_key": s3_key}, version)
 
 def get_mapping(doc_id):
     """Retrieve a mapping for the given doc_id."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT filename, s3_key FROM file_mappings WHERE doc_id = ?
-    """, (doc_id,))
-    result = cursor.fetchone()
-    conn.close()
-    if result:
-        return {"filename": result[0], "s3_key": result[1]}
-    return None
+    return mapping_cache.get(doc_id)
+
+def get_mappings(doc_ids):
+    """Retrieve {doc_id: mapping} for every doc_id that exists."""
+    return mapping_cache.get_many(doc_ids)
+
+def save_extraction_metrics(doc_id, pages, seconds):
+    """Record the page count and extraction time of a document."""
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT OR REPLACE INTO extraction_metrics (doc_id, pages, seconds, recorded_at)
+            VALUES (?, ?, ?, ?)
+        """, (doc_id, pages, seconds, time.time()))
+
+def get_chunk_ids(doc_id):
+    """Retrieve the chunk IDs stored for the given doc_id."""
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT chunk_id FROM chunk_mappings WHERE doc_id = ?", (doc_id,))
+        chunk_ids = [row[0] for row in cursor.fetchall()]
+    return chunk_ids
+
+def delete_chunk_ids(doc_id):
+    """Delete the chunk mappings for the given doc_id."""
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM chunk_mappings WHERE doc_id = ?", (doc_id,))
+
+def delete_mappings(doc_id):
+    """Delete the file and chunk mappings for the given doc_id."""
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM chunk_mappings WHERE doc_id = ?", (doc_id,))
+        cursor.execute("DELETE FROM file_mappings WHERE doc_id = ?", (doc_id,))
+        version = mapping_version(cursor)
+    mapping_cache.remove(doc_id, version)
+
+def list_mappings():
+    """Retrieve every stored file mapping."""
+    return mapping_cache.list()
 
 
 
@@ -172,46 +247,192 @@ def log_message(message):
     print(message)
 
 
+# Chat interactions are spooled locally and uploaded to S3 in compressed batches
+chat_log_sink = ChatLogSink(s3_client, BUCKET_NAME, log_error=log_message)
+
 
 
 
-@app.post("/upload/")
+
+@app.post("/upload/", status_code=202)
 async def upload_file(file: UploadFile = File(...)):
-    """Upload a file to S3 and process it."""
+    """Spool an uploaded file and queue it for background processing."""
     log_message(f"Uploading file: {file.filename}")
 
     doc_id = str(uuid.uuid4())  # Generate unique document ID
     filename = file.filename
 
+    if not filename.endswith((".pdf", ".txt")):
+        raise HTTPException(status_code=400, detail="Unsupported file type for conversion.")
+
     try:
-        # Read file content into memory
-        file_content = await file.read()
+        # Copy the upload to local disk for the ingestion workers
+        await run_blocking("disk", spool_upload, file.file, spool_path(doc_id, "source"))
 
-        # Upload the PDF file to S3
-        pdf_key = f"{doc_id}/{filename}"
-        s3_client.upload_fileobj(io.BytesIO(file_content), BUCKET_NAME, pdf_key)
-        log_message(f"Uploaded {filename} to S3 as {pdf_key}.")
+        await run_blocking("sqlite", ingest_queue.enqueue, doc_id, filename)
+        ingest_workers.notify()
+        log_message(f"Queued {filename} for ingestion as document {doc_id}.")
 
-        # Save the mapping in SQLite
-        save_mapping(doc_id, filename, pdf_key)
+        return {"message": "File queued for processing.", "doc_id": doc_id}
+    except Exception as e:
+        log_message(f"Error uploading file: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Convert file content to text and upload the text file
-        text_content = await convert_to_text(filename, file_content)
-        text_key = f"{doc_id}/{doc_id}.txt"
-        s3_client.put_object(Bucket=BUCKET_NAME, Key=text_key, Body=text_content)
-        log_message(f"Uploaded text version to S3 as {text_key}.")
 
-        # Chunk the text and process with Pinecone
-        chunks = chunk_text(text_content)
-        log_message(f"Chunked text into {len(chunks)} chunks.")
-        vectors = await vectorize_chunks(chunks, doc_id, filename)
-        index.upsert(vectors)
-        log_message(f"Uploaded vectors to Pinecone for document {doc_id}.")
+@app.get("/status/{doc_id}")
+async def ingestion_status(doc_id: str):
+    """Report the ingestion status of an uploaded document, stage by stage."""
+    status = await run_blocking("sqlite", ingest_queue.status, doc_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Document ID not found.")
+    return status
+
+
+def spool_path(doc_id, name):
+    """Return the path of a spooled ingestion file."""
+    return os.path.join(INGEST_SPOOL_DIR, doc_id, name)
+
+def spool_upload(fileobj, path):
+    """Copy an uploaded file object to the spool."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as spooled:
+        shutil.copyfileobj(fileobj, spooled)
+
+def read_spool(doc_id, name):
+    """Read a spooled ingestion file."""
+    with open(spool_path(doc_id, name), "rb") as spooled:
+        return spooled.read()
+
+def write_spool(doc_id, name, data):
+    """Write a spooled ingestion file."""
+    with open(spool_path(doc_id, name), "wb") as spooled:
+        spooled.write(data)
+
+def upload_spool(doc_id, name, key):
+    """Stream a spooled ingestion file to S3, in parallel parts when it is large."""
+    with open(spool_path(doc_id, name), "rb") as spooled:
+        upload_fileobj(s3_client, spooled, BUCKET_NAME, key)
+
+def remove_spool(doc_id):
+    """Remove every spooled file of a document."""
+    shutil.rmtree(os.path.join(INGEST_SPOOL_DIR, doc_id), ignore_errors=True)
+
+
+async def upload_stage(job):
+    """Upload the original file to S3 and save its mapping."""
+    doc_id, filename = job["doc_id"], job["filename"]
+    pdf_key = f"{doc_id}/{filename}"
+    await run_blocking("s3", upload_spool, doc_id, "source", pdf_key)
+    log_message(f"Uploaded {filename} to S3 as {pdf_key}.")
+
+    # Save the mapping in SQLite
+    await run_blocking("sqlite", save_mapping, doc_id, filename, pdf_key)
+
+async def extract_stage(job):
+    """Extract the raw text of the original file and start enriching it as pages arrive.
+
+    Pages are written to the spool in order, and every section they complete
+    is enriched while later pages are still being parsed. The results go to
+    the section cache, so the enrich stage only reassembles them. Each stage
+    still spools its whole output, so an interrupted job resumes at the
+    stage it was in, with the sections enriched so far already cached.
+    """
+    doc_id = job["doc_id"]
+    metrics = {}
+    prefetch = SectionPrefetcher(DB_FILE) if ENRICH_REUSE_SECTIONS else None
+    try:
+        with open(spool_path(doc_id, "raw.txt"), "wb") as raw_file:
+            async for page in iter_raw_pages(job["filename"], spool_path(doc_id, "source"), metrics):
+                text = page + "\n"
+                await run_blocking("disk", raw_file.write, text.encode("utf-8"))
+                if prefetch is not None:
+                    await prefetch.feed(text)
+        await run_blocking("sqlite", save_extraction_metrics, doc_id, metrics["pages"], metrics["seconds"])
+        log_message(f"Extracted {metrics['pages']} pages from {job['filename']} in {metrics['seconds']:.2f}s.")
+
+        if prefetch is not None:
+            section_count, enriched = await prefetch.finish()
+            log_message(f"Enriched {enriched} of {section_count} sections during extraction.")
+    finally:
+        if prefetch is not None:
+            prefetch.cancel()
+
+async def enrich_stage(job):
+    """Enrich the raw text and upload the text version to S3."""
+    doc_id = job["doc_id"]
+    raw_text = (await run_blocking("disk", read_spool, doc_id, "raw.txt")).decode("utf-8")
+
+    # Enrich token-budgeted sections concurrently, reusing sections enriched before
+    log_message("Enriching text using OpenAI GPT model.")
+    text_content, section_count, reused = await enrich_document(raw_text, DB_FILE)
+    log_message(f"Text enrichment completed: {section_count} sections, {reused} reused.")
+    await run_blocking("disk", write_spool, doc_id, "text.txt", text_content.encode("utf-8"))
+
+    text_key = f"{doc_id}/{doc_id}.txt"
+    await run_blocking("s3", s3_client.put_object, Bucket=BUCKET_NAME, Key=text_key, Body=text_content)
+    log_message(f"Uploaded text version to S3 as {text_key}.")
+
+async def index_stage(job):
+    """Chunk and embed the enriched text and upsert the vectors to Pinecone."""
+    doc_id = job["doc_id"]
+
+    # Drop vectors left behind by an earlier failed attempt
+    stale_chunk_ids = await run_blocking("sqlite", get_chunk_ids, doc_id)
+    if stale_chunk_ids:
+        await run_blocking("pinecone", index.delete, ids=stale_chunk_ids)
+        await run_blocking("sqlite", delete_chunk_ids, doc_id)
+
+    chunks = await run_blocking("disk", chunk_file, spool_path(doc_id, "text.txt"))
+    log_message(f"Chunked text into {len(chunks)} chunks.")
+    vectors = await vectorize_chunks(chunks, doc_id, job["filename"])
+    await run_blocking("pinecone", index.upsert, vectors)
+    await run_blocking("sqlite", response_cache.invalidate)
+    log_message(f"Uploaded vectors to Pinecone for document {doc_id}.")
+
+async def finish_ingestion(job):
+    """Clean up the spool once a document is fully processed."""
+    await run_blocking("disk", remove_spool, job["doc_id"])
+    log_message(f"Finished processing document {job['doc_id']}.")
+
+
+ingest_workers = IngestWorkerPool(
+    ingest_queue,
+    {
+        "upload": upload_stage,
+        "extract": extract_stage,
+        "enrich": enrich_stage,
+        "index": index_stage,
+    },
+    on_complete=finish_ingestion,
+)
+
 
-        return {"message": "File uploaded and processed successfully.", "doc_id": doc_id}
+@app.on_event("startup")
+async def start_ingest_workers():
+    """Start processing queued uploads, including jobs interrupted by a restart."""
+    ingest_workers.start()
+    chat_log_sink.start()
+    asyncio.create_task(backfill_lexical_index())
+
+
+async def backfill_lexical_index():
+    """Add chunks indexed before chunk text was stored locally to the lexical index."""
+    try:
+        added = await run_blocking("pinecone", backfill_chunk_text, DB_FILE, index)
+        if added:
+            log_message(f"Added {added} existing chunks to the lexical index.")
     except Exception as e:
-        log_message(f"Error uploading file: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        log_message(f"Error backfilling the lexical index: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    """Stop the ingestion workers, upload spooled chat logs and release the dependency thread pools."""
+    await ingest_workers.stop()
+    await chat_log_sink.stop()
+    shutdown_pools()
+    shutdown_process_pool()
+    close_pools()
 
 
 @app.delete("/delete/{doc_id}")
@@ -219,8 +440,17 @@ async def delete_file(doc_id: str):
     """Delete a document and its associated data."""
     try:
         # Retrieve the mapping to identify the file keys
-        mapping = get_mapping(doc_id)
+        mapping = await run_blocking("sqlite", get_mapping, doc_id)
+        # Refuses, atomically, while a worker is processing the document
+        job_deleted = await run_blocking("sqlite", ingest_queue.delete, doc_id)
+        if job_deleted is False:
+            raise HTTPException(status_code=409, detail="Document is still being processed.")
+        if job_deleted:
+            # Drop anything still spooled for the forgotten job
+            await run_blocking("disk", remove_spool, doc_id)
         if not mapping:
+            if job_deleted:
+                return {"message": f"Queued document {doc_id} deleted successfully."}
             raise HTTPException(status_code=404, detail="Document ID not found.")
 
         # Extract S3 keys from the mapping
@@ -228,31 +458,26 @@ async def delete_file(doc_id: str):
         text_key = f"{doc_id}/{doc_id}.txt"
 
         # Delete the files from S3
-        s3_client.delete_object(Bucket=BUCKET_NAME, Key=s3_key)
-        s3_client.delete_object(Bucket=BUCKET_NAME, Key=text_key)
+        await run_blocking("s3", s3_client.delete_object, Bucket=BUCKET_NAME, Key=s3_key)
+        await run_blocking("s3", s3_client.delete_object, Bucket=BUCKET_NAME, Key=text_key)
         log_message(f"Deleted files {s3_key} and {text_key} from S3.")
 
         # Retrieve chunk IDs from the database
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT chunk_id FROM chunk_mappings WHERE doc_id = ?", (doc_id,))
-        chunk_ids = [row[0] for row in cursor.fetchall()]
-        
+        chunk_ids = await run_blocking("sqlite", get_chunk_ids, doc_id)
+
         if chunk_ids:
             # Delete vectors from Pinecone
-            index.delete(ids=chunk_ids)
+            await run_blocking("pinecone", index.delete, ids=chunk_ids)
+            await run_blocking("sqlite", response_cache.invalidate)
             log_message(f"Deleted {len(chunk_ids)} vectors for document {doc_id} from Pinecone.")
 
-            # Delete chunk mappings from the database
-            cursor.execute("DELETE FROM chunk_mappings WHERE doc_id = ?", (doc_id,))
-        
-        # Delete the document mapping
-        cursor.execute("DELETE FROM file_mappings WHERE doc_id = ?", (doc_id,))
-        conn.commit()
-        conn.close()
+        # Delete the chunk and document mappings
+        await run_blocking("sqlite", delete_mappings, doc_id)
         log_message(f"Deleted file mapping for document {doc_id} from SQLite database.")
 
         return {"message": f"Document {doc_id} and its associated data deleted successfully."}
+    except HTTPException:
+        raise
     except Exception as e:
         log_message(f"Error deleting file: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -264,35 +489,27 @@ async def chat_with_bot(request: ChatRequest):
     """Handle user query and return relevant response."""
     query = request.query
     session_id = str(uuid.uuid4())
-    log_key = f"chat_logs/{session_id}.txt"
 
     try:
         log_message(f"Received query: {query}")
-
-        # Vectorize query
+        cache_version = await run_blocking("sqlite", response_cache.current_version)
         query_vector = await embed_text(query)
 
-        # Find top chunks in Pinecone
-        top_chunks = index.query(vector=query_vector, top_k=5, include_metadata=True)
-
-        log_message(f"Top chunks found: {len(top_chunks['matches'])}")
-
-        # Retrieve original documents and generate response
-        context = "\n".join([match["metadata"]["text"] for match in top_chunks["matches"]])
-        chatbot_response = generate_response(query, context)
+        cached = response_cache.get(query_vector)
+        if cached:
+            log_message("Answered from the response cache.")
+            chatbot_response, sources = cached
+        else:
+            # Retrieve original documents and generate response
+            matches, context = await retrieve_context(query, query_vector)
+            chatbot_response = await generate_response(query, context)
 
-        # Extract unique document IDs and filenames
-        sources = []
-        for match in top_chunks["matches"]:
-            doc_id = match["metadata"].get("doc_id")
-            mapping = get_mapping(doc_id)
-            if mapping and {"doc_id": doc_id, "name": mapping["filename"]} not in sources:
-                sources.append({"doc_id": doc_id, "name": mapping["filename"]})
+            # Extract unique document IDs and filenames
+            sources = await run_blocking("sqlite", collect_sources, matches)
+            response_cache.put(query_vector, (chatbot_response, sources), cache_version)
 
         # Log the interaction
-        log_content = f"Query: {query}\nResponse: {chatbot_response}\n\n"
-        s3_client.put_object(Bucket=BUCKET_NAME, Key=log_key, Body=log_content.encode("utf-8"))
-        log_message(f"Logged conversation to {log_key}.")
+        await log_chat(session_id, query, chatbot_response, sources)
 
         return {"response": chatbot_response, "session_id": session_id, "sources": sources}
     except Exception as e:
@@ -300,19 +517,132 @@ async def chat_with_bot(request: ChatRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/chat/stream/")
+async def chat_with_bot_stream(request: ChatRequest):
+    """Handle user query and stream the response as Server-Sent Events.
+
+    Emits one "token" event per completion delta, then a final "done" event
+    carrying the session id and sources (or an "error" event on failure).
+    """
+    query = request.query
+    session_id = str(uuid.uuid4())
+
+    try:
+        log_message(f"Received streaming query: {query}")
+        cache_version = await run_blocking("sqlite", response_cache.current_version)
+        query_vector = await embed_text(query)
+        cached = response_cache.get(query_vector)
+        if not cached:
+            matches, context = await retrieve_context(query, query_vector)
+    except Exception as e:
+        log_message(f"Error in chat process: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        tokens = []
+        try:
+            if cached:
+                # A cached answer arrives as a single token
+                log_message("Answered from the response cache.")
+                response, sources = cached
+                tokens.append(response)
+                yield sse_event("token", {"token": response})
+            else:
+                async for token in stream_response(query, context):
+                    tokens.append(token)
+                    yield sse_event("token", {"token": token})
+
+                sources = await run_blocking("sqlite", collect_sources, matches)
+                response_cache.put(query_vector, ("".join(tokens), sources), cache_version)
+            yield sse_event("done", {"session_id": session_id, "sources": sources})
+
+            await log_chat(session_id, query, "".join(tokens), sources)
+        except Exception as e:
+            log_message(f"Error in streaming chat process: {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # Stop proxies from buffering events
+    )
+
+
+@app.get("/chat/cache/")
+async def chat_cache_metrics():
+    """Report hit/miss counters of the semantic response cache."""
+    return response_cache.metrics()
+
+
+def sse_event(event, data):
+    """Format a Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def retrieve_context(query, query_vector=None):
+    """Find the top matching chunks for a query and join their text into a context.
+
+    Dense matches from Pinecone and BM25 matches over the chunk text are
+    fetched concurrently and merged with reciprocal rank fusion.
+    """
+    async def vector_matches():
+        vector = query_vector if query_vector is not None else await embed_text(query)
+        top_chunks = await run_blocking(
+            "pinecone", index.query, vector=vector, top_k=HYBRID_VECTOR_CANDIDATES, include_metadata=True
+        )
+        return top_chunks["matches"]
+
+    async def lexical_matches():
+        if HYBRID_LEXICAL_WEIGHT <= 0:
+            return []
+        return await run_blocking("sqlite", lexical_search, DB_FILE, query, HYBRID_LEXICAL_CANDIDATES)
+
+    dense, lexical = await asyncio.gather(vector_matches(), lexical_matches())
+    matches = reciprocal_rank_fusion([dense, lexical], [HYBRID_VECTOR_WEIGHT, HYBRID_LEXICAL_WEIGHT], HYBRID_TOP_K)
+    log_message(f"Top chunks found: {len(matches)} ({len(dense)} vector, {len(lexical)} lexical candidates)")
+
+    context = "\n".join([match["metadata"]["text"] for match in matches])
+    return matches, context
+
+
+async def log_chat(session_id, query, response, sources):
+    """Queue a chat interaction for the next batched upload to S3."""
+    await chat_log_sink.log({
+        "session_id": session_id,
+        "timestamp": time.time(),
+        "query": query,
+        "response": response,
+        "sources": sources,
+    })
+    log_message(f"Logged conversation {session_id}.")
+
+
+def collect_sources(matches):
+    """Resolve unique source documents for the matched chunks, in match order."""
+    doc_ids = [match["metadata"].get("doc_id") for match in matches]
+    mappings = get_mappings([doc_id for doc_id in doc_ids if doc_id])
+    return [
+        {"doc_id": doc_id, "name": mappings[doc_id]["filename"]}
+        for doc_id in dict.fromkeys(doc_ids)
+        if doc_id in mappings
+    ]
+
+
 
 @app.get("/download/{doc_id}")
 async def download_pdf(doc_id: str):
     """Retrieve the original PDF file for the given document ID."""
     try:
-        mapping = get_mapping(doc_id)  # Retrieve mapping from SQLite
+        mapping = await run_blocking("sqlite", get_mapping, doc_id)  # Retrieve mapping from the mapping cache
         if not mapping:
             raise HTTPException(status_code=404, detail="Document ID not found.")
 
         pdf_key = mapping["s3_key"]
 
         # Generate a pre-signed URL with Content-Disposition set to inline
-        download_url = s3_client.generate_presigned_url(
+        download_url = await run_blocking(
+            "s3",
+            s3_client.generate_presigned_url,
             ClientMethod="get_object",
             Params={
                 "Bucket": BUCKET_NAME,
@@ -329,92 +659,77 @@ async def download_pdf(doc_id: str):
 
 
 
-async def convert_to_text(filename, file_content):
-    """Convert file content to text and enrich it using an LLM."""
-    try:
-        if filename.endswith(".pdf"):
-            # Extract text from PDF
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-            raw_text = "".join(page.extract_text() or "" for page in pdf_reader.pages)
-        elif filename.endswith(".txt"):
-            # Handle plain text files
-            raw_text = file_content.decode("utf-8")
-        else:
-            raise ValueError("Unsupported file type for conversion.")
-        
-        # Enrich text using OpenAI GPT model
-        log_message("Enriching text using OpenAI GPT model.")
-        response = openai.ChatCompletion.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are an advanced AI designed to process and enhance documents. "
-                        "Your task is to improve readability, correct typos, fix grammar issues, and refine the content "
-                        "without changing the core meaning. Return the enhanced text in plain form."
-                        "Try to use markdown to arrange the texts neatly"
-                        "If there are mathematical equations, use latex syntax."
-                    )
-                },
-                {"role": "user", "content": raw_text},
-            ],
-            max_tokens=4000,  # Adjust based on typical document length
-            temperature=0.3,
-        )
-        enriched_text = response["choices"][0]["message"]["content"]
-        log_message("Text enrichment completed.")
-        return enriched_text
-    except Exception as e:
-        log_message(f"Error converting and enriching text: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to convert and enrich text: {str(e)}")
+async def iter_raw_pages(filename, path, metrics):
+    """Yield the raw text of an uploaded file page by page, in order."""
+    if filename.endswith(".pdf"):
+        # Extract PDF pages in worker processes
+        async for page in aiter_pdf_pages(path, metrics=metrics):
+            yield page
+    elif filename.endswith(".txt"):
+        # Handle plain text files as a single page
+        started = time.perf_counter()
+        with open(path, "rb") as text_file:
+            yield (await run_blocking("disk", text_file.read)).decode("utf-8")
+        metrics.update({"pages": 1, "seconds": time.perf_counter() - started})
+    else:
+        raise ValueError("Unsupported file type for conversion.")
 
 
-def chunk_text(text):
-    """Chunk text into manageable pieces."""
-    return [text[i:i + 500] for i in range(0, len(text), 500)]
+def chunk_file(path):
+    """Chunk a text file into token-budgeted pieces, streaming it line by line."""
+    with open(path, encoding="utf-8") as text_file:
+        return list(iter_chunks(text_file))
 
 async def vectorize_chunks(chunks, doc_id, filename):
-    """Embed chunks using OpenAI and prepare them for Pinecone."""
-    vectors = []
-    chunk_ids = []
-    for chunk in chunks:
-        chunk_id = str(uuid.uuid4())
-        embedding = await embed_text(chunk)
-        vectors.append({
+    """Embed chunks in batches using OpenAI and prepare them for Pinecone."""
+    chunk_ids = [str(uuid.uuid4()) for _ in chunks]
+    embeddings = await embed_texts(chunks)
+
+    vectors = [
+        {
             "id": chunk_id,
             "values": embedding,
             "metadata": {"doc_id": doc_id, "text": chunk, "filename": filename}  # Dynamically use actual file name
-        })
-        chunk_ids.append(chunk_id)
+        }
+        for chunk_id, chunk, embedding in zip(chunk_ids, chunks, embeddings)
+    ]
 
-    # Store chunk IDs in the database
-    save_chunk_ids(doc_id, chunk_ids)
+    # Store chunk IDs and texts in the database
+    await run_blocking("sqlite", save_chunk_ids, doc_id, chunk_ids, chunks)
 
     return vectors
 
-def save_chunk_ids(doc_id, chunk_ids):
-    """Save chunk IDs to the database."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.executemany(
-        "INSERT INTO chunk_mappings (chunk_id, doc_id) VALUES (?, ?)",
-        [(chunk_id, doc_id) for chunk_id in chunk_ids]
-    )
-    conn.commit()
-    conn.close()
+def save_chunk_ids(doc_id, chunk_ids, chunks):
+    """Save chunk IDs, and the chunk texts for lexical search, to the database."""
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO chunk_mappings (chunk_id, doc_id) VALUES (?, ?)",
+            [(chunk_id, doc_id) for chunk_id in chunk_ids]
+        )
+        save_chunk_text(cursor, doc_id, chunk_ids, chunks)
 
 
 
 
 async def embed_text(text):
     """Generate embeddings using OpenAI."""
-    response = openai.Embedding.create(input=text, model="text-embedding-3-large")
-    return response["data"][0]["embedding"]
+    embeddings = await embed_texts([text])
+    return embeddings[0]
+
+# Completion settings shared by the buffered and streaming chat responses
+CHAT_COMPLETION_PARAMS = {
+    "model": "gpt-4o",
+    "max_tokens": 800,  # Allows more elaborate but concise responses
+    "temperature": 0.3,  # Enhances precision over creativity
+    "top_p": 0.85,  # Balances diversity while maintaining relevance
+    "frequency_penalty": 0.2,  # Reduces redundancy
+    "presence_penalty": 0.3,  # Encourages nuanced exploration of context
+}
+
+def build_chat_messages(query, context):
+    """Build the chat messages tailored for a professional hiring manager context."""
 
-def generate_response(query, context):
-    """Generate chatbot response tailored for a professional hiring manager context."""
-    
     # Define the system prompt with advanced structure
     system_prompt = (
         "You are Lylebot, a cutting-edge AI assistant designed to support hiring managers in assessing "
@@ -444,23 +759,34 @@ def generate_response(query, context):
         f"{context}\n\n"
         "Now, generate a response to the query below, adhering to these principles."
     )
-    
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"Query: {query}"},
+    ]
+
+async def generate_response(query, context):
+    """Generate chatbot response tailored for a professional hiring manager context."""
     # Generate the response using OpenAI's API
-    response = openai.ChatCompletion.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Query: {query}"},
-        ],
-        max_tokens=800,  # Allows more elaborate but concise responses
-        temperature=0.3,  # Enhances precision over creativity
-        top_p=0.85,  # Balances diversity while maintaining relevance
-        frequency_penalty=0.2,  # Reduces redundancy
-        presence_penalty=0.3,  # Encourages nuanced exploration of context
+    response = await openai.ChatCompletion.acreate(
+        messages=build_chat_messages(query, context),
+        **CHAT_COMPLETION_PARAMS,
     )
     print(response["choices"][0]["message"]["content"])
     return response["choices"][0]["message"]["content"]
 
+async def stream_response(query, context):
+    """Yield chatbot response tokens as OpenAI produces them."""
+    response = await openai.ChatCompletion.acreate(
+        messages=build_chat_messages(query, context),
+        stream=True,
+        **CHAT_COMPLETION_PARAMS,
+    )
+    async for chunk in response:
+        token = chunk["choices"][0]["delta"].get("content")
+        if token:
+            yield token
+
 
 
 
@@ -526,7 +852,7 @@ async def generate_email(request: EmailRequest):
         - A structured body that aligns with the guidelines.
         """
 
-        response = openai.ChatCompletion.create(
+        response = await openai.ChatCompletion.acreate(
             model="gpt-4o",  # You can replace this with your chosen model
             messages=[
                 {"role": "system", "content": "You are an assistant who helps users generate professional emails."},
@@ -556,7 +882,7 @@ async def send_email(request: EmailRequest):
 
 
 
-        response = openai.ChatCompletion.create(
+        response = await openai.ChatCompletion.acreate(
             model="gpt-4o",  
             messages=[
                 {"role": "system", "content": "You are an assistant who helps users generate professional emails."},
@@ -584,11 +910,7 @@ async def send_email(request: EmailRequest):
 async def list_uploaded_files():
     """Retrieve all uploaded PDF files from the database."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT doc_id, filename, s3_key FROM file_mappings")
-        files = [{"doc_id": row[0], "filename": row[1], "s3_key": row[2]} for row in cursor.fetchall()]
-        conn.close()
+        files = await run_blocking("sqlite", list_mappings)
         return {"files": files}
     except Exception as e:
         log_message(f"Error retrieving files: {e}")
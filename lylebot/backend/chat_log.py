@@ -0,0 +1,218 @@
+import asyncio
+import datetime
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from fastapi.logger import logger
+from executors import run_blocking
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; spools of dead processes are not adopted there
+    fcntl = None
+
+# Chat log configuration
+CHAT_LOG_PREFIX = "chat_logs/"  # S3 directory where chat logs are stored
+CHAT_LOG_SPOOL_DIR = os.getenv("CHAT_LOG_SPOOL_DIR", "chat_log_spool")
+CHAT_LOG_FLUSH_INTERVAL = float(os.getenv("CHAT_LOG_FLUSH_INTERVAL", "60"))  # Seconds between uploads
+CHAT_LOG_MAX_RECORDS = int(os.getenv("CHAT_LOG_MAX_RECORDS", "1000"))  # Buffered records that trigger an early upload
+
+CURRENT_SPOOL = "current.log"  # Records not yet handed to a batch
+BATCH_SUFFIX = ".jsonl"  # Closed batches waiting to be uploaded
+LOCK_FILE = "lock"  # Held by the process that owns a spool directory
+
+
+def batch_key(prefix, created_at, name):
+    """S3 key of a batch, partitioned by the UTC date and hour it was closed."""
+    closed = datetime.datetime.fromtimestamp(created_at, tz=datetime.timezone.utc)
+    return f"{prefix}dt={closed:%Y-%m-%d}/hour={closed:%H}/{name}.gz"
+
+
+def close_spool(directory):
+    """Rename a spool directory's current file to a batch, if it holds any records."""
+    current = os.path.join(directory, CURRENT_SPOOL)
+    if os.path.exists(current) and os.path.getsize(current) > 0:
+        # Nanosecond timestamps keep batches in order; the uuid keeps names unique across processes
+        name = f"{time.time_ns()}-{uuid.uuid4().hex}{BATCH_SUFFIX}"
+        os.replace(current, os.path.join(directory, name))
+
+
+class ChatLogSink:
+    """Buffer chat interactions in a local spool and upload them in compressed batches.
+
+    Every record is appended as a JSON line to the spool file, so a crash
+    loses nothing that was logged. Every flush_interval seconds, or sooner
+    once max_records are waiting, the spool is closed as a batch, gzipped
+    and uploaded to a time-partitioned key under prefix. Batches that fail
+    to upload stay on disk and are retried on the next flush.
+
+    Each process spools into its own locked subdirectory of spool_dir, so
+    workers never write to or upload each other's files. A flush also
+    uploads the spools of processes that died, whose locks are free.
+    """
+
+    def __init__(self, s3_client, bucket, prefix=CHAT_LOG_PREFIX, spool_dir=CHAT_LOG_SPOOL_DIR,
+                 flush_interval=CHAT_LOG_FLUSH_INTERVAL, max_records=CHAT_LOG_MAX_RECORDS, log_error=logger.error):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.spool_dir = spool_dir
+        self.flush_interval = flush_interval
+        self.max_records = max_records
+        self.log_error = log_error
+        self._directory = None
+        self._directory_lock = None
+        self._pid = None
+        self._file = None
+        self._records = 0
+        self._lock = threading.Lock()  # Guards the current spool file
+        self._flush_lock = threading.Lock()  # One flush at a time
+        self._task = None
+        self._wakeup = None
+
+    async def log(self, record):
+        """Append a record to the spool; triggers an early flush once enough are waiting."""
+        count = await run_blocking("disk", self._append, json.dumps(record) + "\n")
+        if count >= self.max_records and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _own_directory(self):
+        """Return this process's spool directory, creating and locking it on first use."""
+        if self._pid != os.getpid():
+            # First use, or a forked child that must not share its parent's spool
+            name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            directory = os.path.join(self.spool_dir, name)
+            # Lock it under a hidden name that sweepers skip, then move it into
+            # place, so no sweeper ever sees it unlocked and takes it for orphaned
+            staging = os.path.join(self.spool_dir, f".{name}")
+            os.makedirs(staging)
+            lock = open(os.path.join(staging, LOCK_FILE), "a")
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            os.rename(staging, directory)
+            self._directory, self._directory_lock, self._pid = directory, lock, os.getpid()
+            self._file = None
+            self._records = 0
+        return self._directory
+
+    def _append(self, line):
+        with self._lock:
+            directory = self._own_directory()
+            if self._file is None:
+                self._file = open(os.path.join(directory, CURRENT_SPOOL), "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+            self._records += 1
+            return self._records
+
+    def _rotate(self):
+        """Close this process's current spool as a batch."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._records = 0
+            directory = self._own_directory()
+            close_spool(directory)
+            return directory
+
+    def _orphaned_directories(self):
+        """Yield (directory, lock) for every spool directory whose owning process is gone."""
+        if fcntl is None or not os.path.isdir(self.spool_dir):
+            return
+        for name in sorted(os.listdir(self.spool_dir)):
+            directory = os.path.join(self.spool_dir, name)
+            if name.startswith(".") or directory == self._directory:
+                continue  # Still being created, or our own
+            try:
+                lock = open(os.path.join(directory, LOCK_FILE), "a")
+            except (FileNotFoundError, NotADirectoryError):
+                continue  # Removed by its owner or another sweeper
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()  # Its owner is alive
+                continue
+            if not os.path.isdir(directory):
+                lock.close()  # Removed while we waited for the lock
+                continue
+            yield directory, lock
+
+    def _upload_batches(self, directory):
+        """Upload every closed batch in directory, oldest first. Returns the number uploaded."""
+        uploaded = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(BATCH_SUFFIX):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, "rb") as batch:
+                body = gzip.compress(batch.read())
+            created_at = int(name.split("-", 1)[0]) / 1e9
+            self.s3_client.put_object(
+                Bucket=self.bucket, Key=batch_key(self.prefix, created_at, name),
+                Body=body, ContentType="application/gzip",
+            )
+            os.remove(path)
+            uploaded += 1
+        return uploaded
+
+    def flush(self):
+        """Upload every closed batch, this process's and dead processes'. Returns the number uploaded."""
+        with self._flush_lock:
+            uploaded = self._upload_batches(self._rotate())
+            for directory, lock in self._orphaned_directories():
+                try:
+                    close_spool(directory)
+                    uploaded += self._upload_batches(directory)
+                    shutil.rmtree(directory, ignore_errors=True)  # A racing sweeper may recreate its lock file
+                finally:
+                    lock.close()
+            return uploaded
+
+    def close(self):
+        """Release this process's spool directory, removing it if nothing is left to upload."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            close_spool(self._directory)
+            if not any(name.endswith(BATCH_SUFFIX) for name in os.listdir(self._directory)):
+                shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory_lock.close()
+            self._directory = self._directory_lock = self._pid = None
+
+    def start(self):
+        """Start flushing periodically on the running event loop."""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="chat-log-flush")
+
+    async def stop(self):
+        """Stop the periodic flush, upload everything still spooled and release the spool."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await run_blocking("s3", self.flush)
+        finally:
+            await run_blocking("disk", self.close)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await run_blocking("s3", self.flush)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.log_error(f"Chat log flush failed: {e}")
@@ -0,0 +1,178 @@
+import os
+import re
+from collections import namedtuple
+from tokens import count_tokens
+
+# Chunking configuration
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "400"))  # Target size of each chunk
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))  # Context repeated from the previous chunk
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "100"))  # Smaller chunks are not closed at a heading
+
+HEADING_PATTERN = re.compile(r"^#{1,6}\s")
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+# Openers of blocks that must never be split, mapped to their closers
+ATOMIC_BLOCKS = {"```": "```", "$$": "$$", "\\[": "\\]", "\\begin{": "\\end{"}
+
+# A piece of text the chunker will not split further.
+# kind is "heading", "sentence" or "atomic"; text includes its trailing separator.
+Unit = namedtuple("Unit", ["text", "tokens", "kind"])
+
+
+def iter_lines(source):
+    """Yield lines from a string or from an iterable of strings such as pages or a file."""
+    if isinstance(source, str):
+        source = [source]
+    buffer = ""
+    for piece in source:
+        buffer += piece
+        *lines, buffer = buffer.split("\n")
+        yield from lines
+    if buffer:
+        yield buffer
+
+
+def make_unit(text, kind):
+    return Unit(text, count_tokens(text), kind)
+
+
+def split_characters(text, max_tokens):
+    """Yield consecutive pieces of text, cut anywhere, of at most max_tokens tokens each.
+
+    For runs with no whitespace to cut at, such as URLs, base64 or CJK text.
+    """
+    tokens = count_tokens(text)
+    size = max(1, len(text) * max_tokens // max(tokens, 1))
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        while end - start > 1 and count_tokens(text[start:end]) > max_tokens:
+            end = start + max(1, (end - start) * 3 // 4)
+        yield text[start:end]
+        start = end
+
+
+def split_words(sentence, max_tokens):
+    """Yield windows of whole words of at most max_tokens tokens, cutting longer words by characters."""
+    window = []
+    window_tokens = 0
+    for word in sentence.split():
+        tokens = count_tokens(" " + word)
+        if window and window_tokens + tokens > max_tokens:
+            yield " ".join(window)
+            window = []
+            window_tokens = 0
+        if tokens > max_tokens:
+            yield from split_characters(word, max_tokens)
+            continue
+        window.append(word)
+        window_tokens += tokens
+    if window:
+        yield " ".join(window)
+
+
+def split_sentences(paragraph, max_tokens):
+    """Yield sentence units of a paragraph, cutting sentences over max_tokens at word boundaries, or inside words longer still."""
+    sentences = [sentence for sentence in SENTENCE_BOUNDARY.split(paragraph.strip()) if sentence]
+    for position, sentence in enumerate(sentences):
+        separator = "\n\n" if position == len(sentences) - 1 else " "
+        unit = make_unit(sentence + separator, "sentence")
+        if unit.tokens <= max_tokens:
+            yield unit
+            continue
+
+        # Oversized sentence: fall back to windows of words
+        windows = list(split_words(sentence, max_tokens))
+        for index, window in enumerate(windows):
+            window_separator = separator if index == len(windows) - 1 else " "
+            yield make_unit(window + window_separator, "sentence")
+
+
+def iter_units(lines, max_tokens):
+    """Group lines into headings, LaTeX/code blocks and sentences."""
+    paragraph = []
+    block = []
+    closer = None
+
+    for line in lines:
+        stripped = line.strip()
+
+        if closer is not None:
+            # Inside a LaTeX or code block: keep collecting until it closes
+            block.append(line)
+            if closer in stripped:
+                yield make_unit("\n".join(block) + "\n\n", "atomic")
+                block = []
+                closer = None
+            continue
+
+        opener = next((opener for opener in ATOMIC_BLOCKS if stripped.startswith(opener)), None)
+        if opener is not None:
+            if paragraph:
+                yield from split_sentences("\n".join(paragraph), max_tokens)
+                paragraph = []
+            if ATOMIC_BLOCKS[opener] in stripped[len(opener):]:
+                yield make_unit(line + "\n\n", "atomic")
+            else:
+                block = [line]
+                closer = ATOMIC_BLOCKS[opener]
+            continue
+
+        if HEADING_PATTERN.match(stripped) or not stripped:
+            if paragraph:
+                yield from split_sentences("\n".join(paragraph), max_tokens)
+                paragraph = []
+            if stripped:
+                yield make_unit(stripped + "\n", "heading")
+            continue
+
+        paragraph.append(line)
+
+    if paragraph:
+        yield from split_sentences("\n".join(paragraph), max_tokens)
+    if block:
+        # Unterminated block at the end of the text
+        yield make_unit("\n".join(block) + "\n\n", "atomic")
+
+
+def overlap_tail(units, overlap_tokens):
+    """Return the trailing sentence units that fit in overlap_tokens."""
+    tail = []
+    total = 0
+    for unit in reversed(units):
+        if unit.kind != "sentence" or total + unit.tokens > overlap_tokens:
+            break
+        tail.insert(0, unit)
+        total += unit.tokens
+    return tail
+
+
+def iter_chunks(source, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, min_tokens=CHUNK_MIN_TOKENS):
+    """Yield chunks of about max_tokens tokens from a string or an iterable of strings.
+
+    Chunks end at sentence boundaries, a new chunk starts at each markdown
+    heading once the current one holds min_tokens, and LaTeX or code blocks
+    are kept whole. Each chunk after the first in a section repeats up to
+    overlap_tokens of trailing sentences from the chunk before it.
+    """
+    current = []
+    current_tokens = 0
+    fresh_tokens = 0  # Tokens not repeated from the previous chunk
+
+    for unit in iter_units(iter_lines(source), max_tokens):
+        new_section = unit.kind == "heading" and current_tokens >= min_tokens
+        if fresh_tokens and (current_tokens + unit.tokens > max_tokens or new_section):
+            yield "".join(part.text for part in current).strip()
+            current = [] if new_section else overlap_tail(current, overlap_tokens)
+            current_tokens = sum(part.tokens for part in current)
+            fresh_tokens = 0
+            if current_tokens + unit.tokens > max_tokens:
+                current = []
+                current_tokens = 0
+
+        current.append(unit)
+        current_tokens += unit.tokens
+        fresh_tokens += unit.tokens
+
+    if fresh_tokens:
+        yield "".join(part.text for part in current).strip()
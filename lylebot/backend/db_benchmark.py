@@ -0,0 +1,152 @@
+"""Benchmark of per-request SQLite time for /chat/ source lookups under concurrent load.
+
+Compares the old access pattern (a fresh connection and one query per
+matched chunk, rollback journal) with the pooled one (long-lived WAL
+connections and a single IN query per request) on a scratch copy of the
+schema. A writer thread keeps inserting chunk mappings throughout, the way
+ingestion does, so readers also contend with writes.
+
+Usage: python db_benchmark.py [requests_per_level]
+"""
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from executors import POOL_SIZES
+from sqlite_pool import SQLitePool
+
+DOCUMENTS = 200
+MATCHES_PER_REQUEST = 5  # Chunks behind every chat answer
+WRITE_INTERVAL = 0.002  # Seconds between chunk mapping inserts by the writer
+CONCURRENCY_LEVELS = [1, 4, 16, 64]
+
+
+def create_database(path, doc_ids):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE file_mappings (doc_id TEXT PRIMARY KEY, filename TEXT NOT NULL, s3_key TEXT NOT NULL)")
+    conn.execute("CREATE TABLE chunk_mappings (chunk_id TEXT PRIMARY KEY, doc_id TEXT NOT NULL)")
+    conn.executemany(
+        "INSERT INTO file_mappings VALUES (?, ?, ?)",
+        [(doc_id, f"{doc_id}.pdf", f"{doc_id}/{doc_id}.pdf") for doc_id in doc_ids]
+    )
+    conn.commit()
+    conn.close()
+
+
+def connect_per_query_sources(path, doc_ids):
+    """The old collect_sources: one connection and query per match."""
+    sources = []
+    for doc_id in doc_ids:
+        conn = sqlite3.connect(path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT filename, s3_key FROM file_mappings WHERE doc_id = ?", (doc_id,))
+        result = cursor.fetchone()
+        conn.close()
+        if result and {"doc_id": doc_id, "name": result[0]} not in sources:
+            sources.append({"doc_id": doc_id, "name": result[0]})
+    return sources
+
+
+def pooled_sources(pool, doc_ids):
+    """The pooled collect_sources: one IN query on a borrowed connection."""
+    unique = list(dict.fromkeys(doc_ids))
+    with pool.connection() as conn:
+        rows = conn.execute(
+            f"SELECT doc_id, filename FROM file_mappings WHERE doc_id IN ({', '.join('?' for _ in unique)})",
+            unique
+        ).fetchall()
+    names = dict(rows)
+    return [{"doc_id": doc_id, "name": names[doc_id]} for doc_id in unique if doc_id in names]
+
+
+def connect_per_query_write(path, chunk_id, doc_id):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("INSERT INTO chunk_mappings VALUES (?, ?)", (chunk_id, doc_id))
+    conn.commit()
+    conn.close()
+
+
+def pooled_write(pool, chunk_id, doc_id):
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO chunk_mappings VALUES (?, ?)", (chunk_id, doc_id))
+
+
+def write_continuously(write, doc_ids, stop):
+    """Insert chunk mappings until stop is set, one transaction per insert."""
+    count = 0
+    while not stop.is_set():
+        write(str(uuid.uuid4()), doc_ids[count % len(doc_ids)])
+        count += 1
+        time.sleep(WRITE_INTERVAL)
+
+
+async def run_level(lookup, doc_ids, concurrency, total, executor):
+    """Run total lookups, concurrency at a time, and return each one's latency in milliseconds."""
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def request(i):
+        matches = [doc_ids[(i * 7 + j * 13) % len(doc_ids)] for j in range(MATCHES_PER_REQUEST)]
+        async with semaphore:
+            started = time.perf_counter()
+            await loop.run_in_executor(executor, lookup, matches)
+            latencies.append(1000 * (time.perf_counter() - started))
+
+    await asyncio.gather(*(request(i) for i in range(total)))
+    return latencies
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def main(total):
+    workdir = tempfile.mkdtemp(prefix="db-benchmark-")
+    doc_ids = [str(uuid.uuid4()) for _ in range(DOCUMENTS)]
+    variants = {}
+
+    legacy_path = os.path.join(workdir, "legacy.db")
+    create_database(legacy_path, doc_ids)
+    variants["connect per query"] = (
+        lambda matches: connect_per_query_sources(legacy_path, matches),
+        lambda chunk_id, doc_id: connect_per_query_write(legacy_path, chunk_id, doc_id),
+    )
+
+    pooled_path = os.path.join(workdir, "pooled.db")
+    create_database(pooled_path, doc_ids)
+    pool = SQLitePool(pooled_path)
+    variants["pooled WAL + IN"] = (
+        lambda matches: pooled_sources(pool, matches),
+        lambda chunk_id, doc_id: pooled_write(pool, chunk_id, doc_id),
+    )
+
+    # The backend runs SQLite calls on a dedicated thread pool of this size
+    executor = ThreadPoolExecutor(max_workers=POOL_SIZES["sqlite"])
+    print(f"{'variant':<18} {'concurrency':>11} {'mean ms':>8} {'p95 ms':>8} {'req/s':>8}")
+    for name, (lookup, write) in variants.items():
+        stop = threading.Event()
+        writer = threading.Thread(target=write_continuously, args=(write, doc_ids, stop), daemon=True)
+        writer.start()
+        for concurrency in CONCURRENCY_LEVELS:
+            started = time.perf_counter()
+            latencies = await run_level(lookup, doc_ids, concurrency, total, executor)
+            elapsed = time.perf_counter() - started
+            print(f"{name:<18} {concurrency:>11} {statistics.mean(latencies):>8.2f} "
+                  f"{percentile(latencies, 0.95):>8.2f} {total / elapsed:>8.0f}")
+        stop.set()
+        writer.join()
+    executor.shutdown()
+    pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -1,5 +1,6 @@
 import boto3
 import os
+from s3_transfer import get_objects, iter_keys
 
 # Environment variables
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
@@ -15,48 +16,41 @@ s3_client = boto3.client(
 
 
 def list_txt_files_excluding_chat_logs(bucket_name):
-    """List all .txt files in the S3 bucket, excluding those under 'chat_logs/'."""
+    """Yield every .txt file key in the S3 bucket, excluding those under 'chat_logs/'."""
     try:
-        response = s3_client.list_objects_v2(Bucket=bucket_name)
-        if 'Contents' in response:
-            return [
-                content['Key'] for content in response['Contents']
-                if content['Key'].endswith('.txt') and not content['Key'].startswith('chat_logs/')
-            ]
-        return []
+        for key in iter_keys(s3_client, bucket_name):
+            if key.endswith('.txt') and not key.startswith('chat_logs/'):
+                yield key
     except Exception as e:
         print(f"Error listing .txt files: {e}")
-        return []
 
 
-def download_txt_file(bucket_name, key):
-    """Download a .txt file from S3 and return its content."""
-    try:
-        txt_file = s3_client.get_object(Bucket=bucket_name, Key=key)
-        return txt_file['Body'].read().decode('utf-8')
-    except Exception as e:
-        print(f"Error downloading .txt file {key}: {e}")
-        return None
+def download_txt_files(bucket_name, keys):
+    """Yield (key, content) for every .txt file, downloading several at once; content is None on error."""
+    for key, body, error in get_objects(s3_client, bucket_name, keys):
+        if error:
+            print(f"Error downloading .txt file {key}: {error}")
+            yield key, None
+        else:
+            yield key, body.decode('utf-8')
 
 
 def main():
     print("Reading all .txt files in the S3 bucket (excluding chat logs)...\n")
 
-    # List all .txt files excluding those in 'chat_logs/'
-    txt_files = list_txt_files_excluding_chat_logs(BUCKET_NAME)
-
-    if not txt_files:
-        print("No eligible .txt files found.")
-        return
-
-    for txt_file in txt_files:
+    # List and download all .txt files excluding those in 'chat_logs/'
+    found = False
+    for txt_file, content in download_txt_files(BUCKET_NAME, list_txt_files_excluding_chat_logs(BUCKET_NAME)):
+        found = True
         print(f"Reading .txt file: {txt_file}")
-        content = download_txt_file(BUCKET_NAME, txt_file)
         if content:
             print(f"--- Start of {txt_file} ---")
             print(content)
             print(f"--- End of {txt_file} ---\n")
 
+    if not found:
+        print("No eligible .txt files found.")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,58 @@
+import asyncio
+import functools
+import os
+import sys
+import openai
+from executors import run_blocking
+
+# Make the repo-level shared package importable when run from this directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from shared.embedding_cache import get_embedding_cache
+
+# Embedding configuration
+EMBEDDING_MODEL = "text-embedding-3-large"
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))  # Inputs per embeddings request
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))  # Requests in flight at once
+
+
+def batched(items, batch_size):
+    """Split items into consecutive lists of at most batch_size elements."""
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+async def embed_batch(texts, model=EMBEDDING_MODEL):
+    """Embed a list of texts with a single OpenAI request, preserving input order."""
+    response = await openai.Embedding.acreate(input=texts, model=model)
+    data = sorted(response["data"], key=lambda item: item["index"])
+    return [item["embedding"] for item in data]
+
+
+async def embed_texts(texts, model=EMBEDDING_MODEL, batch_size=EMBED_BATCH_SIZE,
+                      max_concurrency=EMBED_MAX_CONCURRENCY):
+    """Embed texts, serving repeats from the shared embedding cache.
+
+    The returned embeddings line up index-for-index with the input texts.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+
+    async def compute(missing):
+        return await embed_uncached(missing, model, batch_size, max_concurrency)
+
+    return await get_embedding_cache().aget_or_compute(
+        model, texts, compute, run_blocking=functools.partial(run_blocking, "sqlite")
+    )
+
+
+async def embed_uncached(texts, model=EMBEDDING_MODEL, batch_size=EMBED_BATCH_SIZE,
+                         max_concurrency=EMBED_MAX_CONCURRENCY):
+    """Embed texts in batches, running at most max_concurrency batches at a time."""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(batch):
+        async with semaphore:
+            return await embed_batch(batch, model)
+
+    results = await asyncio.gather(*(run(batch) for batch in batched(texts, max(1, batch_size))))
+    return [embedding for batch in results for embedding in batch]
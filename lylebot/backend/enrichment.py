@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import os
+import time
+import openai
+from chunker import split_characters
+from executors import run_blocking
+from sqlite_pool import batched, get_pool
+from tokens import count_tokens
+
+# Enrichment configuration
+ENRICH_MODEL = "gpt-4o"
+ENRICH_SECTION_TOKENS = int(os.getenv("ENRICH_SECTION_TOKENS", "2000"))  # Input budget per request
+ENRICH_MAX_OUTPUT_TOKENS = int(os.getenv("ENRICH_MAX_OUTPUT_TOKENS", "4000"))
+ENRICH_MAX_CONCURRENCY = int(os.getenv("ENRICH_MAX_CONCURRENCY", "4"))  # Sections enriched at once
+ENRICH_REUSE_SECTIONS = os.getenv("ENRICH_REUSE_SECTIONS", "true").lower() == "true"
+
+ENRICH_SYSTEM_PROMPT = (
+    "You are an advanced AI designed to process and enhance documents. "
+    "Your task is to improve readability, correct typos, fix grammar issues, and refine the content "
+    "without changing the core meaning. Return the enhanced text in plain form."
+    "Try to use markdown to arrange the texts neatly"
+    "If there are mathematical equations, use latex syntax."
+)
+
+PARAGRAPH_SEPARATOR = "\n\n"
+# Boundaries tried in order, within a paragraph, when a piece of text is over budget
+SECTION_SEPARATORS = ["\n", ". ", " "]
+
+
+class SectionSplitter:
+    """Split text that arrives piece by piece, such as PDF pages, into sections.
+
+    feed() takes the next piece and returns the sections it completed;
+    close() returns the rest. Text is split paragraph by paragraph, and a
+    paragraph already over budget, which will be split at lines anyway, gives
+    up its complete lines before it ends. Where the text was cut into pieces
+    does not change the sections, so they match split_sections on the whole.
+    """
+
+    def __init__(self, max_tokens=ENRICH_SECTION_TOKENS):
+        self.max_tokens = max_tokens
+        self._buffer = ""  # Unsplit text of the current paragraph
+        self._oversized = False  # The current paragraph is over budget and splits at lines
+        self._current = []
+        self._current_tokens = 0
+
+    def feed(self, text):
+        self._buffer += text
+        sections = []
+        while True:
+            end = self._buffer.find(PARAGRAPH_SEPARATOR)
+            if end < 0:
+                break
+            end += len(PARAGRAPH_SEPARATOR)
+            paragraph, self._buffer = self._buffer[:end], self._buffer[end:]
+            sections += self._pack(paragraph)
+            self._oversized = False
+
+        # Only the token count of a buffer longer than the budget in characters can exceed it
+        if not self._oversized and len(self._buffer) > self.max_tokens:
+            self._oversized = count_tokens(self._buffer) > self.max_tokens
+        if self._oversized:
+            # Every newline before the last character is a line break, not half a paragraph separator
+            cut = self._buffer.rfind("\n", 0, len(self._buffer) - 1) + 1
+            if cut:
+                lines, self._buffer = self._buffer[:cut], self._buffer[cut:]
+                sections += self._pack(lines)
+        return sections
+
+    def close(self):
+        sections = self._pack(self._buffer) if self._buffer else []
+        if self._current and "".join(self._current).strip():
+            sections.append("".join(self._current))
+        self._buffer = ""
+        self._oversized = False
+        self._current = []
+        self._current_tokens = 0
+        return sections
+
+    def _pieces(self, text):
+        if not self._oversized:
+            return split_pieces(text, self.max_tokens, SECTION_SEPARATORS)
+        # Skip the whole-paragraph check, which the paragraph already failed
+        return split_parts(text, self.max_tokens, SECTION_SEPARATORS)
+
+    def _pack(self, text):
+        """Add text from the current paragraph to the current section, returning the sections that filled up."""
+        sections = []
+        for piece, tokens in self._pieces(text):
+            if self._current and self._current_tokens + tokens > self.max_tokens:
+                sections.append("".join(self._current))
+                self._current = []
+                self._current_tokens = 0
+            self._current.append(piece)
+            self._current_tokens += tokens
+        return [section for section in sections if section.strip()]
+
+
+def split_sections(text, max_tokens=ENRICH_SECTION_TOKENS):
+    """Split text into consecutive sections of at most max_tokens tokens.
+
+    Sections break at paragraph boundaries where possible, falling back to
+    lines, sentences, words and finally characters for oversized pieces.
+    """
+    splitter = SectionSplitter(max_tokens)
+    return splitter.feed(text) + splitter.close()
+
+
+def split_pieces(text, max_tokens, separators):
+    """Yield (piece, token_count) pairs that each fit within max_tokens."""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        yield text, tokens
+        return
+
+    if not separators:
+        # No boundary left, so cut by characters, re-checking every piece against the budget
+        for piece in split_characters(text, max_tokens):
+            yield piece, count_tokens(piece)
+        return
+
+    yield from split_parts(text, max_tokens, separators)
+
+
+def split_parts(text, max_tokens, separators):
+    """Yield (piece, token_count) pairs for text cut at its first separator, each part split further as needed."""
+    separator = separators[0]
+    parts = text.split(separator)
+    for position, part in enumerate(parts):
+        if position < len(parts) - 1:
+            part += separator
+        if part:
+            yield from split_pieces(part, max_tokens, separators[1:])
+
+
+def section_hash(section):
+    """Hash a section together with the model and prompt that enrich it."""
+    digest = hashlib.sha256()
+    for value in (ENRICH_MODEL, ENRICH_SYSTEM_PROMPT, section):
+        digest.update(value.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def init_section_cache(db_file):
+    """Create the table of previously enriched sections."""
+    with get_pool(db_file).connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS enriched_sections (
+                section_hash TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+
+
+def get_enriched_sections(db_file, hashes):
+    """Return {section_hash: content} for every hash that was enriched before."""
+    found = {}
+    with get_pool(db_file).connection() as conn:
+        for batch in batched(hashes):
+            placeholders = ", ".join("?" for _ in batch)
+            rows = conn.execute(
+                f"SELECT section_hash, content FROM enriched_sections WHERE section_hash IN ({placeholders})",
+                batch
+            ).fetchall()
+            found.update(rows)
+    return found
+
+
+def save_enriched_section(db_file, key, content):
+    """Store the enriched content of a section."""
+    with get_pool(db_file).connection() as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO enriched_sections (section_hash, content, created_at)
+            VALUES (?, ?, ?)
+        """, (key, content, time.time()))
+
+
+async def enrich_section(section):
+    """Enrich a single section using OpenAI GPT model."""
+    response = await openai.ChatCompletion.acreate(
+        model=ENRICH_MODEL,
+        messages=[
+            {"role": "system", "content": ENRICH_SYSTEM_PROMPT},
+            {"role": "user", "content": section},
+        ],
+        max_tokens=ENRICH_MAX_OUTPUT_TOKENS,
+        temperature=0.3,
+    )
+    return response["choices"][0]["message"]["content"]
+
+
+async def enrich_document(raw_text, db_file, section_tokens=ENRICH_SECTION_TOKENS,
+                          max_concurrency=ENRICH_MAX_CONCURRENCY, reuse_sections=ENRICH_REUSE_SECTIONS):
+    """Enrich a whole document section by section and reassemble it in order.
+
+    Sections are enriched concurrently, at most max_concurrency at a time.
+    With reuse_sections, sections enriched before are taken from db_file.
+    Returns the enriched text, the section count and how many sections were reused.
+    """
+    # Tokenizing a whole document is CPU-bound, so keep it off the event loop
+    sections = await run_blocking("disk", split_sections, raw_text, section_tokens)
+    hashes = [section_hash(section) for section in sections]
+    cached = await run_blocking("sqlite", get_enriched_sections, db_file, hashes) if reuse_sections else {}
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(section, key):
+        if key in cached:
+            return cached[key]
+        async with semaphore:
+            content = await enrich_section(section)
+        await run_blocking("sqlite", save_enriched_section, db_file, key, content)
+        return content
+
+    enriched = await asyncio.gather(*(run(section, key) for section, key in zip(sections, hashes)))
+    reused = sum(1 for key in hashes if key in cached)
+    return "\n\n".join(enriched), len(sections), reused
+
+
+class SectionPrefetcher:
+    """Enrich a document's sections while the rest of it is still being extracted.
+
+    Feed it the text in order; every section it completes is enriched in
+    the background, at most max_concurrency at a time, and stored in the
+    section cache in db_file. enrich_document on the same text then finds
+    those sections already enriched. A section that fails here is simply
+    left for enrich_document to retry.
+    """
+
+    def __init__(self, db_file, section_tokens=ENRICH_SECTION_TOKENS, max_concurrency=ENRICH_MAX_CONCURRENCY):
+        self.db_file = db_file
+        self._splitter = SectionSplitter(section_tokens)
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._tasks = []
+
+    async def feed(self, text):
+        """Add the next piece of text, starting on every section it completes."""
+        self._start(await run_blocking("disk", self._splitter.feed, text))
+
+    async def finish(self):
+        """Start on the last section and wait for all of them.
+
+        Returns the number of sections and how many of them were enriched here.
+        """
+        self._start(await run_blocking("disk", self._splitter.close))
+        results = await asyncio.gather(*self._tasks, return_exceptions=True)
+        return len(results), sum(1 for result in results if result is True)
+
+    def cancel(self):
+        """Stop enriching, e.g. when extraction fails."""
+        for task in self._tasks:
+            task.cancel()
+
+    def _start(self, sections):
+        for section in sections:
+            self._tasks.append(asyncio.create_task(self._enrich(section)))
+
+    async def _enrich(self, section):
+        key = section_hash(section)
+        if await run_blocking("sqlite", get_enriched_sections, self.db_file, [key]):
+            return False
+        async with self._semaphore:
+            content = await enrich_section(section)
+        await run_blocking("sqlite", save_enriched_section, self.db_file, key, content)
+        return True
@@ -0,0 +1,29 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Thread pool sizes for each blocking dependency
+POOL_SIZES = {
+    "s3": int(os.getenv("S3_POOL_SIZE", "16")),
+    "pinecone": int(os.getenv("PINECONE_POOL_SIZE", "8")),
+    "sqlite": int(os.getenv("SQLITE_POOL_SIZE", "4")),
+    "disk": int(os.getenv("DISK_POOL_SIZE", "4")),
+}
+
+_pools = {
+    name: ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"{name}-pool")
+    for name, size in POOL_SIZES.items()
+}
+
+
+async def run_blocking(dependency, func, *args, **kwargs):
+    """Run a blocking call on the dependency's thread pool without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pools[dependency], functools.partial(func, *args, **kwargs))
+
+
+def shutdown_pools(wait=True):
+    """Shut down every dependency thread pool."""
+    for pool in _pools.values():
+        pool.shutdown(wait=wait)
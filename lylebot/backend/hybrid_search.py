@@ -0,0 +1,138 @@
+import os
+import re
+from sqlite_pool import get_pool
+
+# Hybrid retrieval configuration
+HYBRID_TOP_K = int(os.getenv("HYBRID_TOP_K", "5"))  # Chunks sent to the model as context
+HYBRID_VECTOR_CANDIDATES = int(os.getenv("HYBRID_VECTOR_CANDIDATES", "20"))  # Dense matches fused
+HYBRID_LEXICAL_CANDIDATES = int(os.getenv("HYBRID_LEXICAL_CANDIDATES", "20"))  # BM25 matches fused
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))  # Damps the lead of the very top ranks
+BACKFILL_BATCH_SIZE = 100  # Chunk ids fetched from the vector store per request
+
+
+def init_chunk_text(db_file):
+    """Create the chunk text table and its FTS5 index.
+
+    chunk_fts indexes chunk_text as external content, so the text is stored
+    once. Triggers keep the index in step with chunk_text, and deleting a
+    chunk mapping deletes its text, so every path that drops chunk_mappings
+    rows also drops them from the lexical index.
+    """
+    with get_pool(db_file).connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_text (
+                id INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL UNIQUE,
+                doc_id TEXT NOT NULL,
+                text TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunk_fts USING fts5(
+                text, content = 'chunk_text', content_rowid = 'id', tokenize = 'porter unicode61'
+            )
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS chunk_text_insert AFTER INSERT ON chunk_text
+            BEGIN
+                INSERT INTO chunk_fts (rowid, text) VALUES (NEW.id, NEW.text);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS chunk_text_delete AFTER DELETE ON chunk_text
+            BEGIN
+                INSERT INTO chunk_fts (chunk_fts, rowid, text) VALUES ('delete', OLD.id, OLD.text);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS chunk_mappings_delete AFTER DELETE ON chunk_mappings
+            BEGIN
+                DELETE FROM chunk_text WHERE chunk_id = OLD.chunk_id;
+            END
+        """)
+
+
+def save_chunk_text(cursor, doc_id, chunk_ids, chunks):
+    """Store chunk texts for lexical search, inside the caller's transaction."""
+    cursor.executemany(
+        "INSERT OR REPLACE INTO chunk_text (chunk_id, doc_id, text) VALUES (?, ?, ?)",
+        [(chunk_id, doc_id, chunk) for chunk_id, chunk in zip(chunk_ids, chunks)]
+    )
+
+
+def backfill_chunk_text(db_file, index, batch_size=BACKFILL_BATCH_SIZE):
+    """Copy the text of chunks indexed before chunk_text existed from the vector store metadata.
+
+    Returns the number of chunks added to the lexical index.
+    """
+    pool = get_pool(db_file)
+    with pool.connection() as conn:
+        missing = [row[0] for row in conn.execute("""
+            SELECT chunk_id FROM chunk_mappings
+            WHERE chunk_id NOT IN (SELECT chunk_id FROM chunk_text)
+        """)]
+
+    added = 0
+    for start in range(0, len(missing), batch_size):
+        # Fetch without holding a pooled connection across the network call
+        vectors = index.fetch(ids=missing[start:start + batch_size])["vectors"]
+        rows = [
+            (chunk_id, vector["metadata"]["doc_id"], vector["metadata"]["text"])
+            for chunk_id, vector in vectors.items()
+            if vector.get("metadata") and "text" in vector["metadata"]
+        ]
+        with pool.connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO chunk_text (chunk_id, doc_id, text) VALUES (?, ?, ?)", rows)
+        added += len(rows)
+    return added
+
+
+def match_expression(query):
+    """Turn a question into an FTS5 query matching any of its terms.
+
+    Terms are quoted so punctuation and FTS5 keywords in the question are
+    taken literally; bm25 rewards chunks that contain more, and rarer, terms.
+    """
+    terms = dict.fromkeys(term.lower() for term in re.findall(r"\w+", query))
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def lexical_search(db_file, query, top_k=HYBRID_LEXICAL_CANDIDATES):
+    """Return the top_k chunks for query by BM25, shaped like vector store matches."""
+    expression = match_expression(query)
+    if not expression or top_k <= 0:
+        return []
+    with get_pool(db_file).connection() as conn:
+        rows = conn.execute("""
+            SELECT ct.chunk_id, ct.doc_id, ct.text, fm.filename, bm25(chunk_fts) AS score
+            FROM chunk_fts
+            JOIN chunk_text ct ON ct.id = chunk_fts.rowid
+            LEFT JOIN file_mappings fm ON fm.doc_id = ct.doc_id
+            WHERE chunk_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+        """, (expression, top_k)).fetchall()
+    # bm25() is lower for better matches; flip it so higher is better like vector scores
+    return [
+        {"id": chunk_id, "score": -score, "metadata": {"doc_id": doc_id, "text": text, "filename": filename}}
+        for chunk_id, doc_id, text, filename, score in rows
+    ]
+
+
+def reciprocal_rank_fusion(ranked_lists, weights, top_k=HYBRID_TOP_K, k=HYBRID_RRF_K):
+    """Fuse ranked match lists into one, scoring each match sum(weight / (k + rank)).
+
+    Matches are identified by id; the first list a match appears in supplies
+    its metadata. Returns {"id", "score", "metadata"} dicts with the fused score.
+    """
+    metadata = {}
+    scores = {}
+    for matches, weight in zip(ranked_lists, weights):
+        for rank, match in enumerate(matches, start=1):
+            metadata.setdefault(match["id"], match["metadata"])
+            scores[match["id"]] = scores.get(match["id"], 0.0) + weight / (k + rank)
+
+    best = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [{"id": match_id, "score": scores[match_id], "metadata": metadata[match_id]} for match_id in best]
@@ -0,0 +1,342 @@
+import asyncio
+import contextlib
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from fastapi.logger import logger
+from executors import run_blocking
+
+# Ingestion worker configuration
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))  # Attempts per stage before the job fails
+INGEST_RETRY_DELAY = float(os.getenv("INGEST_RETRY_DELAY", "5"))  # Seconds, doubled after every failed attempt
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "1"))
+INGEST_LEASE_SECONDS = float(os.getenv("INGEST_LEASE_SECONDS", "60"))  # A running job is reclaimed once its lease lapses
+
+
+class IngestQueue:
+    """Ingestion jobs and their per-stage status, persisted in SQLite.
+
+    A claimed job is leased to its worker, which renews the lease while it
+    runs. Several server processes can share the queue: a job is only taken
+    from another worker once its lease has expired, e.g. because that
+    process died.
+
+    Queries run on connections borrowed from pool, a sqlite_pool.SQLitePool.
+    """
+
+    def __init__(self, pool, stages):
+        self.pool = pool
+        self.stages = list(stages)
+
+    @contextlib.contextmanager
+    def _cursor(self, immediate=False):
+        """Borrow a pooled connection for one transaction, committed on success.
+
+        immediate takes the write lock up front, so a read and the write that
+        depends on it cannot be interleaved with another writer.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row  # Per cursor: the connection is shared
+            if immediate:
+                cursor.execute("BEGIN IMMEDIATE")
+            yield cursor
+
+    def init(self):
+        """Create the job tables."""
+        with self._cursor() as cursor:
+            # One row per uploaded document
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_jobs (
+                    doc_id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    error TEXT,
+                    available_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    owner TEXT,
+                    lease_expires_at REAL
+                )
+            """)
+            columns = {row["name"] for row in cursor.execute("PRAGMA table_info(ingest_jobs)").fetchall()}
+            for column, column_type in (("owner", "TEXT"), ("lease_expires_at", "REAL")):
+                if column not in columns:
+                    cursor.execute(f"ALTER TABLE ingest_jobs ADD COLUMN {column} {column_type}")
+
+            # One row per stage of each job
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_stages (
+                    doc_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    started_at REAL,
+                    finished_at REAL,
+                    PRIMARY KEY (doc_id, stage)
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status, available_at)")
+
+    def enqueue(self, doc_id, filename):
+        """Add a new job with every stage pending."""
+        now = time.time()
+        with self._cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO ingest_jobs (doc_id, filename, status, stage, available_at, created_at, updated_at)
+                VALUES (?, ?, 'queued', ?, ?, ?, ?)
+            """, (doc_id, filename, self.stages[0], now, now, now))
+            cursor.executemany(
+                "INSERT INTO ingest_stages (doc_id, stage, position, status) VALUES (?, ?, ?, 'pending')",
+                [(doc_id, stage, position) for position, stage in enumerate(self.stages)]
+            )
+
+    def claim(self, owner, lease_seconds=INGEST_LEASE_SECONDS):
+        """Atomically lease the oldest runnable job to owner, or return None.
+
+        Runnable means queued and due, or running under a lease that expired.
+        A reclaimed job's interrupted stage is set back to pending.
+        """
+        with self._cursor(immediate=True) as cursor:
+            now = time.time()
+            row = cursor.execute("""
+                SELECT doc_id, filename, status FROM ingest_jobs
+                WHERE (status = 'queued' AND available_at <= ?)
+                   OR (status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?))
+                ORDER BY created_at LIMIT 1
+            """, (now, now)).fetchone()
+            if row is None:
+                return None
+            if row["status"] == "running":
+                cursor.execute(
+                    "UPDATE ingest_stages SET status = 'pending' WHERE doc_id = ? AND status = 'running'",
+                    (row["doc_id"],)
+                )
+            cursor.execute("""
+                UPDATE ingest_jobs SET status = 'running', owner = ?, lease_expires_at = ?, updated_at = ?
+                WHERE doc_id = ?
+            """, (owner, now + lease_seconds, now, row["doc_id"]))
+            return {"doc_id": row["doc_id"], "filename": row["filename"]}
+
+    def renew(self, doc_id, owner, lease_seconds=INGEST_LEASE_SECONDS):
+        """Extend owner's lease on a running job. Returns False if owner no longer holds it."""
+        with self._cursor() as cursor:
+            cursor.execute("""
+                UPDATE ingest_jobs SET lease_expires_at = ?
+                WHERE doc_id = ? AND owner = ? AND status = 'running'
+            """, (time.time() + lease_seconds, doc_id, owner))
+            return cursor.rowcount == 1
+
+    def release(self, owner):
+        """Requeue every job owner is running, e.g. on shutdown, so other workers can take it at once."""
+        with self._cursor(immediate=True) as cursor:
+            cursor.execute("""
+                UPDATE ingest_stages SET status = 'pending'
+                WHERE status = 'running'
+                  AND doc_id IN (SELECT doc_id FROM ingest_jobs WHERE owner = ? AND status = 'running')
+            """, (owner,))
+            cursor.execute("""
+                UPDATE ingest_jobs SET status = 'queued', owner = NULL, lease_expires_at = NULL, updated_at = ?
+                WHERE owner = ? AND status = 'running'
+            """, (time.time(), owner))
+
+    def pending_stages(self, doc_id):
+        """Return the stages of a job that have not completed yet, in order."""
+        with self._cursor() as cursor:
+            rows = cursor.execute("""
+                SELECT stage, attempts FROM ingest_stages
+                WHERE doc_id = ? AND status != 'completed'
+                ORDER BY position
+            """, (doc_id,)).fetchall()
+        return [{"stage": row["stage"], "attempts": row["attempts"]} for row in rows]
+
+    def start_stage(self, doc_id, stage):
+        """Mark a stage as running."""
+        now = time.time()
+        with self._cursor() as cursor:
+            cursor.execute("""
+                UPDATE ingest_stages SET status = 'running', attempts = attempts + 1, started_at = ?
+                WHERE doc_id = ? AND stage = ?
+            """, (now, doc_id, stage))
+            cursor.execute("UPDATE ingest_jobs SET stage = ?, updated_at = ? WHERE doc_id = ?", (stage, now, doc_id))
+
+    def complete_stage(self, doc_id, stage):
+        """Mark a stage as completed."""
+        with self._cursor() as cursor:
+            cursor.execute("""
+                UPDATE ingest_stages SET status = 'completed', error = NULL, finished_at = ?
+                WHERE doc_id = ? AND stage = ?
+            """, (time.time(), doc_id, stage))
+
+    def fail_stage(self, doc_id, stage, error, retry_at=None):
+        """Record a stage failure and either schedule a retry or fail the job."""
+        now = time.time()
+        with self._cursor() as cursor:
+            cursor.execute("""
+                UPDATE ingest_stages SET status = ?, error = ?, finished_at = ?
+                WHERE doc_id = ? AND stage = ?
+            """, ("pending" if retry_at else "failed", error, now, doc_id, stage))
+            cursor.execute("""
+                UPDATE ingest_jobs SET status = ?, error = ?, available_at = ?, updated_at = ?
+                WHERE doc_id = ?
+            """, ("queued" if retry_at else "failed", error, retry_at or now, now, doc_id))
+
+    def complete(self, doc_id):
+        """Mark a job as completed."""
+        with self._cursor() as cursor:
+            cursor.execute(
+                "UPDATE ingest_jobs SET status = 'completed', stage = NULL, error = NULL, updated_at = ? WHERE doc_id = ?",
+                (time.time(), doc_id)
+            )
+
+    def status(self, doc_id):
+        """Return the job and its per-stage status, or None if unknown."""
+        with self._cursor() as cursor:
+            job = cursor.execute("SELECT * FROM ingest_jobs WHERE doc_id = ?", (doc_id,)).fetchone()
+            if job is None:
+                return None
+            stages = cursor.execute("""
+                SELECT stage, status, attempts, error, started_at, finished_at FROM ingest_stages
+                WHERE doc_id = ? ORDER BY position
+            """, (doc_id,)).fetchall()
+        return {
+            "doc_id": job["doc_id"],
+            "filename": job["filename"],
+            "status": job["status"],
+            "stage": job["stage"],
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+            "stages": [dict(stage) for stage in stages],
+        }
+
+    def delete(self, doc_id):
+        """Forget a job and its stages unless a worker holds a live lease on it.
+
+        The check and the delete share one transaction, so no worker can
+        claim the job in between. Returns True if the job was deleted, False
+        if it is running, and None if there is no such job.
+        """
+        with self._cursor(immediate=True) as cursor:
+            job = cursor.execute(
+                "SELECT status, lease_expires_at FROM ingest_jobs WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            if job["status"] == "running" and (job["lease_expires_at"] or 0) >= time.time():
+                return False
+            cursor.execute("DELETE FROM ingest_stages WHERE doc_id = ?", (doc_id,))
+            cursor.execute("DELETE FROM ingest_jobs WHERE doc_id = ?", (doc_id,))
+            return True
+
+
+class IngestWorkerPool:
+    """Asyncio workers that run queued jobs through their stages.
+
+    handlers maps each stage name to an async function taking the job dict.
+    A failed stage is retried with exponential backoff; completed stages are
+    never re-run, so a retried job resumes where it stopped. While a job runs
+    its lease is renewed every third of lease_seconds; if the lease is lost
+    to another worker the job is abandoned here.
+    """
+
+    def __init__(self, queue, handlers, workers=INGEST_WORKERS, max_attempts=INGEST_MAX_ATTEMPTS,
+                 retry_delay=INGEST_RETRY_DELAY, poll_interval=INGEST_POLL_INTERVAL, on_complete=None,
+                 lease_seconds=INGEST_LEASE_SECONDS):
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.on_complete = on_complete
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks = []
+        self._wakeup = None
+
+    def start(self):
+        """Start the worker tasks on the running event loop."""
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work(), name=f"ingest-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the worker tasks and requeue the jobs they were running."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await run_blocking("sqlite", self.queue.release, self.owner)
+
+    def notify(self):
+        """Wake idle workers after a job has been enqueued."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _work(self):
+        while True:
+            try:
+                job = await run_blocking("sqlite", self.queue.claim, self.owner, self.lease_seconds)
+                if job is not None:
+                    await self._run_leased(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion worker error: {e}")
+                print(f"Ingestion worker error: {e}")
+
+            # Nothing runnable: wait for a new job or the next poll
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_leased(self, job):
+        """Run a job while renewing its lease, abandoning it if the lease is lost."""
+        run = asyncio.create_task(self._run(job))
+        try:
+            while not run.done():
+                await asyncio.wait({run}, timeout=self.lease_seconds / 3)
+                if run.done():
+                    break
+                if not await run_blocking("sqlite", self.queue.renew, job["doc_id"], self.owner, self.lease_seconds):
+                    run.cancel()
+                    logger.error(f"Lost the lease on ingestion job {job['doc_id']}; abandoning it.")
+                    print(f"Lost the lease on ingestion job {job['doc_id']}; abandoning it.")
+                    await asyncio.gather(run, return_exceptions=True)
+                    return
+            run.result()
+        finally:
+            run.cancel()
+
+    async def _run(self, job):
+        doc_id = job["doc_id"]
+        for pending in await run_blocking("sqlite", self.queue.pending_stages, doc_id):
+            stage = pending["stage"]
+            attempt = pending["attempts"] + 1
+            await run_blocking("sqlite", self.queue.start_stage, doc_id, stage)
+            try:
+                await self.handlers[stage](job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                retry_at = None
+                if attempt < self.max_attempts:
+                    retry_at = time.time() + self.retry_delay * 2 ** (attempt - 1)
+                logger.error(f"Ingestion stage {stage} failed for {doc_id} (attempt {attempt}): {e}")
+                print(f"Ingestion stage {stage} failed for {doc_id} (attempt {attempt}): {e}")
+                await run_blocking("sqlite", self.queue.fail_stage, doc_id, stage, str(e), retry_at)
+                return
+            await run_blocking("sqlite", self.queue.complete_stage, doc_id, stage)
+
+        await run_blocking("sqlite", self.queue.complete, doc_id)
+        if self.on_complete is not None:
+            await self.on_complete(job)
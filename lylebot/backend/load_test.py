@@ -0,0 +1,119 @@
+"""Load test for the lylebot API against stubbed dependencies.
+
+Pinecone, S3 and OpenAI are replaced with stubs that only sleep, so the
+numbers reflect how well concurrent /chat/ and /upload/ requests overlap
+inside a single event loop rather than the speed of the real services.
+
+Usage: python load_test.py [requests_per_level]
+"""
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import types
+
+import httpx
+
+STUB_NETWORK_LATENCY = 0.02  # Seconds slept by blocking Pinecone/S3 stubs
+STUB_OPENAI_LATENCY = 0.05  # Seconds awaited by async OpenAI stubs
+CONCURRENCY_LEVELS = [1, 2, 4, 8, 16, 32]
+
+
+class StubIndex:
+    """Blocking stand-in for a Pinecone index."""
+
+    def query(self, vector, top_k, include_metadata=True, **kwargs):
+        time.sleep(STUB_NETWORK_LATENCY)
+        return {"matches": []}
+
+    def upsert(self, vectors, **kwargs):
+        time.sleep(STUB_NETWORK_LATENCY)
+
+    def delete(self, **kwargs):
+        time.sleep(STUB_NETWORK_LATENCY)
+
+
+class StubS3Client:
+    """Blocking stand-in for a boto3 S3 client."""
+
+    def put_object(self, **kwargs):
+        time.sleep(STUB_NETWORK_LATENCY)
+
+    def upload_fileobj(self, fileobj, bucket, key, **kwargs):
+        time.sleep(STUB_NETWORK_LATENCY)
+
+    def delete_object(self, **kwargs):
+        time.sleep(STUB_NETWORK_LATENCY)
+
+
+async def stub_chat_completion(**kwargs):
+    await asyncio.sleep(STUB_OPENAI_LATENCY)
+    return {"choices": [{"message": {"content": "stub response"}}]}
+
+
+async def stub_embedding(input, model, **kwargs):
+    await asyncio.sleep(STUB_OPENAI_LATENCY)
+    return {"data": [{"index": i, "embedding": [0.0] * 8} for i, _ in enumerate(input)]}
+
+
+def load_backend():
+    """Import the backend inside a scratch directory with every dependency stubbed."""
+    workdir = tempfile.mkdtemp(prefix="lylebot-load-")
+    os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(workdir, "embedding_cache.db"))
+    os.environ["VECTOR_STORE"] = "pinecone"
+    os.environ.setdefault("PINECONE_API_KEY", "load-test")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)
+
+    stub_pinecone = types.ModuleType("pinecone")
+    stub_pinecone.Pinecone = lambda api_key=None: types.SimpleNamespace(Index=lambda name: StubIndex())
+    sys.modules["pinecone"] = stub_pinecone
+
+    import openai
+    openai.ChatCompletion.acreate = stub_chat_completion
+    openai.Embedding.acreate = stub_embedding
+
+    import backend
+    backend.s3_client = StubS3Client()
+    backend.log_message = lambda message: None
+    return backend
+
+
+async def run_level(app, concurrency, total):
+    """Send total mixed chat/upload requests with at most concurrency in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+        async def send(i):
+            async with semaphore:
+                if i % 4 == 0:
+                    files = {"file": (f"doc-{concurrency}-{i}.txt", f"document {concurrency} {i}".encode("utf-8"))}
+                    response = await client.post("/upload/", files=files)
+                else:
+                    response = await client.post("/chat/", json={"query": f"question {concurrency} {i}"})
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send(i) for i in range(total)))
+        return time.perf_counter() - started
+
+
+async def main(total):
+    backend = load_backend()
+    print(f"{'concurrency':>11} {'requests':>9} {'seconds':>8} {'req/s':>8}")
+    baseline = None
+    for concurrency in CONCURRENCY_LEVELS:
+        with contextlib.redirect_stdout(io.StringIO()):  # The backend prints every response
+            elapsed = await run_level(backend.app, concurrency, total)
+        throughput = total / elapsed
+        baseline = baseline or throughput
+        print(f"{concurrency:>11} {total:>9} {elapsed:>8.2f} {throughput:>8.1f}  ({throughput / baseline:.1f}x)")
+    backend.shutdown_pools()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 64))
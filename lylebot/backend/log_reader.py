@@ -1,5 +1,10 @@
 import boto3
+import datetime
+import gzip
+import json
 import os
+import sys
+from s3_transfer import get_objects, iter_keys
 
 # Environment variables
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
@@ -14,44 +19,63 @@ s3_client = boto3.client(
 )
 
 LOG_PREFIX = "chat_logs/"  # S3 directory where chat logs are stored
+BATCH_SUFFIX = ".jsonl.gz"  # Compressed batches of JSON lines, one interaction per line
 
 
 def list_log_files(bucket_name, prefix):
-    """List all log files in the S3 bucket under the given prefix."""
-    response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-    if 'Contents' in response:
-        return [content['Key'] for content in response['Contents']]
-    return []
+    """Yield every log file key in the S3 bucket under the given prefix, page by page."""
+    return iter_keys(s3_client, bucket_name, prefix)
 
 
-def download_log_file(bucket_name, key):
-    """Download a log file from S3 and return its content."""
-    try:
-        log_file = s3_client.get_object(Bucket=bucket_name, Key=key)
-        return log_file['Body'].read().decode('utf-8')
-    except Exception as e:
-        print(f"Error downloading log file {key}: {e}")
-        return None
+def download_log_files(bucket_name, keys):
+    """Yield (key, content) for every log file, downloading several at once; content is None on error."""
+    for key, body, error in get_objects(s3_client, bucket_name, keys):
+        if error:
+            print(f"Error downloading log file {key}: {error}")
+            yield key, None
+        elif key.endswith(BATCH_SUFFIX):
+            yield key, format_batch(body)
+        else:
+            # Single-interaction text files written before logs were batched
+            yield key, body.decode('utf-8')
 
 
-def main():
-    print("Reading historical chat logs...\n")
+def format_batch(body):
+    """Render a compressed JSONL batch in the same layout as the single-interaction logs."""
+    interactions = []
+    for line in gzip.decompress(body).decode('utf-8').splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        logged_at = datetime.datetime.fromtimestamp(record["timestamp"], tz=datetime.timezone.utc)
+        interactions.append(
+            f"Session: {record['session_id']} ({logged_at:%Y-%m-%d %H:%M:%S} UTC)\n"
+            f"Query: {record['query']}\nResponse: {record['response']}\n"
+        )
+    return "\n".join(interactions)
 
-    # List all log files
-    log_files = list_log_files(BUCKET_NAME, LOG_PREFIX)
 
-    if not log_files:
-        print("No chat logs found.")
-        return
+def log_prefix(date=None):
+    """Prefix of every log, or only of the batches closed on date (YYYY-MM-DD, UTC)."""
+    return f"{LOG_PREFIX}dt={date}/" if date else LOG_PREFIX
 
-    for log_file in log_files:
+
+def main(date=None):
+    print("Reading historical chat logs...\n")
+
+    # List and download all log files, or one day's batches
+    found = False
+    for log_file, content in download_log_files(BUCKET_NAME, list_log_files(BUCKET_NAME, log_prefix(date))):
+        found = True
         print(f"Reading log file: {log_file}")
-        content = download_log_file(BUCKET_NAME, log_file)
         if content:
             print(f"--- Start of {log_file} ---")
             print(content)
             print(f"--- End of {log_file} ---\n")
 
+    if not found:
+        print("No chat logs found.")
+
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+
+# Mapping cache configuration
+MAPPING_CACHE_CHECK_INTERVAL = float(os.getenv("MAPPING_CACHE_CHECK_INTERVAL", "1.0"))  # Seconds between version checks
+
+
+def init_version_counter(cursor, name):
+    """Create a one-row version counter table shared by every worker."""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    cursor.execute(f"INSERT OR IGNORE INTO {name} (id, version) VALUES (1, 0)")
+
+
+def read_version(cursor, name):
+    """Return the current value of a version counter."""
+    cursor.execute(f"SELECT version FROM {name} WHERE id = 1")
+    return cursor.fetchone()[0]
+
+
+def bump_version(cursor, name):
+    """Increment a version counter and return its new value."""
+    cursor.execute(f"UPDATE {name} SET version = version + 1 WHERE id = 1")
+    return read_version(cursor, name)
+
+
+def init_mapping_version(cursor):
+    """Create the file_mappings version counter and the triggers that bump it on every change."""
+    init_version_counter(cursor, "mapping_version")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS file_mappings_version_{event.lower()} AFTER {event} ON file_mappings
+            BEGIN
+                UPDATE mapping_version SET version = version + 1 WHERE id = 1;
+            END
+        """)
+
+
+def mapping_version(cursor):
+    """Return the current file_mappings version."""
+    return read_version(cursor, "mapping_version")
+
+
+class MappingCache:
+    """In-memory copy of file_mappings, for reads that never touch SQLite.
+
+    Writes in this process are applied write-through with the version their
+    transaction produced. Changes made by other workers bump the version
+    counter in the database; it is checked at most every check_interval
+    seconds and the whole table is reloaded when it moved.
+    """
+
+    def __init__(self, pool, check_interval=MAPPING_CACHE_CHECK_INTERVAL):
+        self.pool = pool
+        self.check_interval = check_interval
+        self._mappings = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read the whole table and its version."""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            version = mapping_version(cursor)
+            cursor.execute("SELECT doc_id, filename, s3_key FROM file_mappings")
+            mappings = {row[0]: {"filename": row[1], "s3_key": row[2]} for row in cursor.fetchall()}
+        with self._lock:
+            self._mappings = mappings
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def _current(self):
+        """Return the mappings, reloading them first if another worker changed the table."""
+        if self._version is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._mappings
+        with self.pool.connection() as conn:
+            version = mapping_version(conn.cursor())
+        if version != self._version:
+            self.load()
+        else:
+            self._checked_at = time.monotonic()
+        return self._mappings
+
+    def get(self, doc_id):
+        """Return {"filename", "s3_key"} for doc_id, or None."""
+        mapping = self._current().get(doc_id)
+        return dict(mapping) if mapping else None
+
+    def get_many(self, doc_ids):
+        """Return {doc_id: mapping} for every doc_id that exists."""
+        mappings = self._current()
+        return {doc_id: dict(mappings[doc_id]) for doc_id in doc_ids if doc_id in mappings}
+
+    def list(self):
+        """Return every mapping as {"doc_id", "filename", "s3_key"}."""
+        return [{"doc_id": doc_id, **mapping} for doc_id, mapping in self._current().items()]
+
+    def put(self, doc_id, mapping, version):
+        """Record a mapping saved by a transaction that left the table at version."""
+        self._write(version, lambda mappings: mappings.__setitem__(doc_id, dict(mapping)))
+
+    def remove(self, doc_id, version):
+        """Record a mapping deleted by a transaction that left the table at version."""
+        self._write(version, lambda mappings: mappings.pop(doc_id, None))
+
+    def _write(self, version, apply):
+        with self._lock:
+            if self._version is None or version == self._version:
+                return
+            if version == self._version + 1:
+                # Ours was the only change since the cache was current; copy so readers never see a half-made update
+                mappings = dict(self._mappings)
+                apply(mappings)
+                self._mappings = mappings
+                self._version = version
+            else:
+                # Another worker wrote in between; reload on the next read
+                self._version = None
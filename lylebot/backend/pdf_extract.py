@@ -0,0 +1,74 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import PyPDF2
+
+# PDF extraction configuration
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))  # Pages parsed by one worker task
+
+_process_pool = None
+
+
+def get_process_pool():
+    """Return the shared extraction process pool, creating it on first use."""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS)
+    return _process_pool
+
+
+def shutdown_process_pool():
+    """Shut down the extraction process pool if it was started."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True)
+        _process_pool = None
+
+
+def count_pages(path):
+    """Return the number of pages in the PDF at path."""
+    return len(PyPDF2.PdfReader(path).pages)
+
+
+def extract_page_range(path, start, stop):
+    """Extract the text of pages [start, stop) of the PDF at path.
+
+    Runs inside a worker process, so it reopens the file instead of receiving
+    the document bytes.
+    """
+    reader = PyPDF2.PdfReader(path)
+    return [reader.pages[number].extract_text() or "" for number in range(start, stop)]
+
+
+def page_ranges(page_count, pages_per_task=PDF_PAGES_PER_TASK):
+    """Split page numbers into consecutive [start, stop) ranges."""
+    step = max(1, pages_per_task)
+    return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+
+async def aiter_pdf_pages(path, pages_per_task=PDF_PAGES_PER_TASK, metrics=None):
+    """Yield the text of every page in order while later pages are extracted in worker processes.
+
+    Never blocks the event loop. If metrics is a dict it receives the page
+    count and elapsed seconds once the last page has been yielded.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    started = time.perf_counter()
+    page_count = await loop.run_in_executor(pool, count_pages, path)
+    futures = [
+        loop.run_in_executor(pool, extract_page_range, path, start, stop)
+        for start, stop in page_ranges(page_count, pages_per_task)
+    ]
+    try:
+        for future in futures:
+            for page in await future:
+                yield page
+    finally:
+        for future in futures:
+            future.cancel()
+
+    if metrics is not None:
+        metrics.update({"pages": page_count, "seconds": time.perf_counter() - started})
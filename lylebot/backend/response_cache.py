@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from mapping_cache import bump_version, init_version_counter, read_version
+
+# Semantic response cache configuration
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "true").lower() == "true"
+CHAT_CACHE_THRESHOLD = float(os.getenv("CHAT_CACHE_THRESHOLD", "0.95"))  # Minimum cosine similarity for a hit
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "3600"))  # Seconds a cached response is served
+CHAT_CACHE_ITEMS = int(os.getenv("CHAT_CACHE_ITEMS", "512"))
+CHAT_CACHE_CHECK_INTERVAL = float(os.getenv("CHAT_CACHE_CHECK_INTERVAL", "1.0"))  # Seconds between document version checks
+DOCUMENT_VERSION = "document_version"  # Counter bumped whenever indexed documents change
+
+
+class SemanticResponseCache:
+    """LRU cache of chat responses keyed by query embedding.
+
+    A lookup returns the response of the most similar cached query if its
+    cosine similarity is at least threshold. Embeddings live in a fixed
+    (max_items, dimension) matrix, so a lookup is one matrix-vector product.
+    Entries expire ttl seconds after they were stored.
+
+    The document set is versioned by a counter in the database pool points
+    at. invalidate() bumps it, and every worker drops its entries once
+    current_version() sees it move, which it checks at most every
+    check_interval seconds. Responses computed against an older document
+    set are never stored.
+    """
+
+    def __init__(self, pool, threshold=CHAT_CACHE_THRESHOLD, ttl=CHAT_CACHE_TTL, max_items=CHAT_CACHE_ITEMS,
+                 enabled=CHAT_CACHE_ENABLED, check_interval=CHAT_CACHE_CHECK_INTERVAL):
+        self.pool = pool
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_items = max(1, max_items)
+        self.enabled = enabled and ttl > 0
+        self.check_interval = check_interval
+        self._version = None
+        self._checked_at = 0.0
+        self._matrix = None
+        self._entries = OrderedDict()  # slot -> (expires_at, value), least recently used first
+        self._free = list(range(self.max_items - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidations": 0}
+
+    def init(self, cursor):
+        """Create the document version counter, inside the caller's transaction."""
+        init_version_counter(cursor, DOCUMENT_VERSION)
+
+    def current_version(self):
+        """Return the document set version, dropping every entry if another worker changed it.
+
+        Reads the database, so call it off the event loop once per request
+        and pass the result to put().
+        """
+        if self._version is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._version
+        with self.pool.connection() as conn:
+            version = read_version(conn.cursor(), DOCUMENT_VERSION)
+        with self._lock:
+            if version != self._version:
+                self._clear(version)
+            self._checked_at = time.monotonic()
+        return version
+
+    def get(self, embedding):
+        """Return the cached value for the closest query within the threshold, or None."""
+        if not self.enabled:
+            return None
+        query = normalize(embedding)
+        with self._lock:
+            while self._entries:
+                slots = np.fromiter(self._entries, dtype=np.int64, count=len(self._entries))
+                scores = self._matrix[slots] @ query
+                best = int(np.argmax(scores))
+                if scores[best] < self.threshold:
+                    break
+                slot = int(slots[best])
+                expires_at, value = self._entries[slot]
+                if expires_at < time.monotonic():
+                    # Expired: drop it and look for the next closest entry
+                    self._release(slot)
+                    self.stats["expired"] += 1
+                    continue
+                self._entries.move_to_end(slot)
+                self.stats["hits"] += 1
+                return value
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, embedding, value, version):
+        """Cache value for a query embedding unless the document set changed after version."""
+        if not self.enabled:
+            return
+        vector = normalize(embedding)
+        with self._lock:
+            if version != self._version:
+                return
+            if self._matrix is None or self._matrix.shape[1] != len(vector):
+                self._matrix = np.zeros((self.max_items, len(vector)), dtype=np.float32)
+                self._entries.clear()
+                self._free = list(range(self.max_items - 1, -1, -1))
+            if not self._free:
+                self._release(next(iter(self._entries)))
+                self.stats["evicted"] += 1
+            slot = self._free.pop()
+            self._matrix[slot] = vector
+            self._entries[slot] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self):
+        """Forget every cached response in every worker; call whenever documents are added or removed."""
+        with self.pool.connection() as conn:
+            version = bump_version(conn.cursor(), DOCUMENT_VERSION)
+        with self._lock:
+            self._clear(version)
+            self._checked_at = time.monotonic()
+
+    def _clear(self, version):
+        if self._version is not None:
+            self.stats["invalidations"] += 1
+        self._version = version
+        self._entries.clear()
+        self._free = list(range(self.max_items - 1, -1, -1))
+
+    def _release(self, slot):
+        del self._entries[slot]
+        self._free.append(slot)
+
+    def metrics(self):
+        """Hit/miss counters plus the current size and hit rate."""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "size": len(self._entries),
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "version": self._version,
+            }
+
+
+def normalize(embedding):
+    """Return embedding as a unit-length float32 vector."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
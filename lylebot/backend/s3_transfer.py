@@ -0,0 +1,110 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+
+# S3 transfer configuration
+S3_PART_SIZE = int(os.getenv("S3_PART_SIZE_MB", "8")) * 1024 * 1024  # S3 requires at least 5 MB per part but the last
+S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))  # Parts uploaded at once per file
+S3_DOWNLOAD_CONCURRENCY = int(os.getenv("S3_DOWNLOAD_CONCURRENCY", "16"))  # Objects fetched at once
+S3_DELETE_CONCURRENCY = int(os.getenv("S3_DELETE_CONCURRENCY", "4"))  # delete_objects requests at once
+S3_DELETE_BATCH = 1000  # Most keys one delete_objects request accepts
+
+
+def transfer_config(part_size=S3_PART_SIZE, max_concurrency=S3_UPLOAD_CONCURRENCY):
+    """TransferConfig that uploads files of at least part_size in parts, max_concurrency at a time."""
+    return TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=max(1, max_concurrency),
+    )
+
+
+def upload_fileobj(s3_client, fileobj, bucket, key, part_size=S3_PART_SIZE,
+                   max_concurrency=S3_UPLOAD_CONCURRENCY, **extra_args):
+    """Stream fileobj to S3 with boto3's managed transfer.
+
+    Files of at least part_size go up as a multipart upload with up to
+    max_concurrency parts in flight, read from fileobj as slots free up, so
+    memory stays bounded whatever the file size; smaller files use a single
+    PUT. boto3 aborts a failed multipart upload. extra_args are passed as
+    ExtraArgs, e.g. ContentType.
+    """
+    s3_client.upload_fileobj(
+        fileobj, bucket, key, ExtraArgs=extra_args or None, Config=transfer_config(part_size, max_concurrency)
+    )
+
+
+def iter_objects(s3_client, bucket, prefix=""):
+    """Yield every object summary under prefix, following continuation tokens page by page."""
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        yield from page.get("Contents", [])
+
+
+def iter_keys(s3_client, bucket, prefix=""):
+    """Yield every key under prefix."""
+    for summary in iter_objects(s3_client, bucket, prefix):
+        yield summary["Key"]
+
+
+def batched(items, batch_size):
+    """Yield consecutive lists of at most batch_size items from any iterable."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bounded_map(func, items, max_concurrency):
+    """Yield func(item) for every item, in order, running at most max_concurrency calls at once.
+
+    Items are consumed lazily, so a generator of keys is never materialized.
+    """
+    max_concurrency = max(1, max_concurrency)
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="s3-batch") as executor:
+        pending = deque()
+        for item in items:
+            if len(pending) >= max_concurrency:
+                yield pending.popleft().result()
+            pending.append(executor.submit(func, item))
+        while pending:
+            yield pending.popleft().result()
+
+
+def delete_keys(s3_client, bucket, keys, max_concurrency=S3_DELETE_CONCURRENCY):
+    """Delete keys in batches of 1000, several batches at once.
+
+    Returns the number of keys deleted and the per-key errors S3 reported.
+    """
+    def delete_batch(batch):
+        response = s3_client.delete_objects(
+            Bucket=bucket, Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+        )
+        return len(batch), response.get("Errors", [])
+
+    deleted = 0
+    errors = []
+    for count, batch_errors in bounded_map(delete_batch, batched(keys, S3_DELETE_BATCH), max_concurrency):
+        deleted += count - len(batch_errors)
+        errors.extend(batch_errors)
+    return deleted, errors
+
+
+def get_objects(s3_client, bucket, keys, max_concurrency=S3_DOWNLOAD_CONCURRENCY):
+    """Yield (key, body bytes, error) for every key, in order, downloading several at once.
+
+    A failed download yields body None and the exception instead of stopping
+    the others.
+    """
+    def download(key):
+        try:
+            return key, s3_client.get_object(Bucket=bucket, Key=key)["Body"].read(), None
+        except Exception as e:
+            return key, None, e
+
+    yield from bounded_map(download, keys, max_concurrency)
@@ -0,0 +1,99 @@
+import contextlib
+import os
+import queue
+import sqlite3
+import threading
+
+# SQLite connection pool configuration
+SQLITE_POOL_CONNECTIONS = int(os.getenv("SQLITE_POOL_CONNECTIONS", "8"))  # Connections kept open per database
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))  # Seconds to wait for a write lock
+SQLITE_CACHED_STATEMENTS = 256  # Prepared statements kept per connection
+SQLITE_MAX_VARIABLES = 500  # Parameters per IN (...) lookup, well below SQLite's limit
+
+
+class SQLitePool:
+    """A fixed set of long-lived connections to one SQLite database.
+
+    Connections are opened lazily, up to size, in WAL mode so readers never
+    wait for a writer. Each keeps its own cache of prepared statements, so
+    repeated queries are parsed once per connection rather than per call.
+    """
+
+    def __init__(self, db_file, size=SQLITE_POOL_CONNECTIONS):
+        self.db_file = db_file
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=SQLITE_BUSY_TIMEOUT,
+            check_same_thread=False,  # Borrowed by one thread at a time, but not always the same one
+            cached_statements=SQLITE_CACHED_STATEMENTS,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # Durable across crashes of the process in WAL mode
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a connection; the block runs in one transaction, committed on success."""
+        conn = self._acquire()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Close the idle connections."""
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_file):
+    """Return the shared pool for db_file, creating it on first use."""
+    key = os.path.abspath(db_file)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = SQLitePool(db_file)
+        return _pools[key]
+
+
+def close_pools():
+    """Close every pooled connection."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+
+
+def batched(items, batch_size=SQLITE_MAX_VARIABLES):
+    """Split items into consecutive lists small enough for one IN (...) query."""
+    items = list(items)
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
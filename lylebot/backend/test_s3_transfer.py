@@ -0,0 +1,187 @@
+"""Tests for the s3_transfer helpers.
+
+Uploads go through a real boto3 client whose requests are answered by a
+botocore Stubber, so boto3's managed transfer runs with the project's
+TransferConfig: files of at least one part are sent as multipart uploads
+with the configured part size and no more parts in flight than the
+configured concurrency. Listing, downloads and deletes run against an
+in-memory stand-in with more keys than one S3 page or delete request holds.
+"""
+import io
+import os
+import threading
+import time
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from s3_transfer import S3_DELETE_BATCH, delete_keys, get_objects, iter_keys, upload_fileobj
+
+PART_SIZE = 5 * 1024 * 1024  # The smallest part S3, and so boto3, allows
+CONCURRENCY = 3
+PART_LATENCY = 0.05  # Seconds each stubbed part upload takes, so uploads overlap
+PAGE_SIZE = 1000  # Keys per list_objects_v2 page, as in S3
+KEYS = 2500
+
+
+class StubbedS3:
+    """A real boto3 S3 client that records calls instead of sending them."""
+
+    def __init__(self):
+        self.client = boto3.client("s3", region_name="us-east-1", aws_access_key_id="test",
+                                   aws_secret_access_key="test")
+        self.stubber = Stubber(self.client)
+        self.calls = []
+        self.parts = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.client.meta.events.register("before-parameter-build.s3.*", self._record)
+
+    def _record(self, params, model, **kwargs):
+        with self._lock:
+            self.calls.append(model.name)
+        if model.name != "UploadPart":
+            return
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(PART_LATENCY)
+            body = params["Body"].read()
+            params["Body"].seek(0)
+            with self._lock:
+                self.parts[params["PartNumber"]] = body
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def expect_multipart(self, parts):
+        self.stubber.add_response("create_multipart_upload", {"UploadId": "upload-1"})
+        for number in range(1, parts + 1):
+            self.stubber.add_response("upload_part", {"ETag": f'"etag-{number}"'})
+        self.stubber.add_response("complete_multipart_upload", {})
+
+    def expect_put(self):
+        self.stubber.add_response("put_object", {})
+
+
+@pytest.fixture
+def s3():
+    stubbed = StubbedS3()
+    with stubbed.stubber:
+        yield stubbed
+        stubbed.stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def spooled(tmp_path):
+    """Write data to a file and return it opened for reading, like an ingestion spool."""
+    files = []
+
+    def spool(data):
+        path = tmp_path / f"spool-{len(files)}"
+        path.write_bytes(data)
+        files.append(open(path, "rb"))
+        return files[-1]
+
+    yield spool
+    for file in files:
+        file.close()
+
+
+@pytest.mark.parametrize("size", [PART_SIZE, 6 * PART_SIZE + 123])
+def test_large_file_is_uploaded_in_parallel_parts(s3, spooled, size):
+    data = os.urandom(size)
+    parts = -(-size // PART_SIZE)
+    s3.expect_multipart(parts)
+
+    upload_fileobj(s3.client, spooled(data), "bucket", "key", PART_SIZE, CONCURRENCY, ContentType="application/pdf")
+
+    assert s3.calls[0] == "CreateMultipartUpload" and s3.calls[-1] == "CompleteMultipartUpload"
+    assert "PutObject" not in s3.calls
+    assert sorted(s3.parts) == list(range(1, parts + 1))
+    assert all(len(s3.parts[number]) == PART_SIZE for number in range(1, parts))
+    assert b"".join(s3.parts[number] for number in sorted(s3.parts)) == data
+    assert s3.max_in_flight <= CONCURRENCY
+    if parts > CONCURRENCY:
+        assert s3.max_in_flight > 1
+
+
+@pytest.mark.parametrize("size", [0, 1000, PART_SIZE - 1])
+def test_small_file_is_uploaded_in_one_request(s3, spooled, size):
+    s3.expect_put()
+    upload_fileobj(s3.client, spooled(os.urandom(size)), "bucket", "key", PART_SIZE, CONCURRENCY)
+    assert s3.calls == ["PutObject"]
+
+
+def test_failed_part_aborts_the_upload(s3, spooled):
+    s3.stubber.add_response("create_multipart_upload", {"UploadId": "upload-1"})
+    s3.stubber.add_client_error("upload_part", service_error_code="InternalError", http_status_code=500)
+    s3.stubber.add_response("abort_multipart_upload", {})
+
+    with pytest.raises(Exception):
+        upload_fileobj(s3.client, spooled(os.urandom(2 * PART_SIZE)), "bucket", "key", PART_SIZE, 1)
+    assert "AbortMultipartUpload" in s3.calls
+    assert "CompleteMultipartUpload" not in s3.calls
+
+
+class InMemoryS3:
+    """Thread-safe fake of the boto3 S3 calls the listing, download and delete helpers make."""
+
+    def __init__(self):
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise KeyError(f"NoSuchKey: {Key}")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def delete_objects(self, Bucket, Delete):
+        assert len(Delete["Objects"]) <= S3_DELETE_BATCH, "delete_objects accepts at most 1000 keys"
+        with self._lock:
+            for item in Delete["Objects"]:
+                self.objects.pop((Bucket, item["Key"]), None)
+        return {}
+
+    def get_paginator(self, operation):
+        assert operation == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket, Prefix=""):
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        for start in range(0, len(keys), PAGE_SIZE):
+            yield {"Contents": [{"Key": key} for key in keys[start:start + PAGE_SIZE]]}
+
+
+@pytest.fixture
+def bucket():
+    s3 = InMemoryS3()
+    for i in range(KEYS):
+        s3.put_object(Bucket="bucket", Key=f"chat_logs/{i:05}.txt", Body=str(i).encode())
+    s3.put_object(Bucket="bucket", Key="docs/other.txt", Body=b"other")
+    return s3
+
+
+def test_listing_follows_every_page(bucket):
+    assert list(iter_keys(bucket, "bucket", "chat_logs/")) == [f"chat_logs/{i:05}.txt" for i in range(KEYS)]
+
+
+def test_downloads_keep_order_and_report_missing_keys(bucket):
+    keys = list(iter_keys(bucket, "bucket", "chat_logs/")) + ["chat_logs/missing.txt"]
+    downloads = list(get_objects(bucket, "bucket", keys))
+
+    assert [key for key, _, _ in downloads] == keys
+    assert all(body == str(i).encode() for i, (_, body, _) in enumerate(downloads[:-1]))
+    assert downloads[-1][1] is None and downloads[-1][2] is not None
+
+
+def test_deletes_run_in_batches(bucket):
+    deleted, errors = delete_keys(bucket, "bucket", iter_keys(bucket, "bucket", "chat_logs/"))
+    assert deleted == KEYS and not errors
+    assert list(bucket.objects) == [("bucket", "docs/other.txt")]
@@ -0,0 +1,36 @@
+import threading
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character-based estimate
+    tiktoken = None
+
+TOKEN_ENCODING = "o200k_base"  # Tokenizer used by gpt-4o
+CHARS_PER_TOKEN = 4  # Rough average for English text
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """Return the tiktoken encoding, or None if it cannot be loaded."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    _encoding = tiktoken.get_encoding(TOKEN_ENCODING) if tiktoken else None
+                except Exception:
+                    # The encoding file is downloaded on first use and may be unreachable
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text):
+    """Count the tokens in text, estimating from its length when tiktoken is unavailable."""
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
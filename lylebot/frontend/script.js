@@ -107,22 +107,26 @@ document.getElementById("chatForm").addEventListener("submit", async (e) => {
     const botMessage = addChatMessage("", "bot", true);
 
     try {
-        const response = await fetch("http://localhost:5000/chat/", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ query: userInput.value }),
-        });
-
-        const result = await response.json();
+        const query = userInput.value;
         userInput.value = ""; // Clear input field
 
-        // Populate bot message with Markdown
-        botMessage.innerHTML = marked.parse(result.response);
-
+        let responseText = "";
+        let sources = [];
+        await streamChat(query, (event, data) => {
+            if (event === "token") {
+                // Re-render the Markdown as tokens arrive
+                responseText += data.token;
+                botMessage.innerHTML = marked.parse(responseText);
+            } else if (event === "done") {
+                sources = data.sources;
+            } else if (event === "error") {
+                throw new Error(data.detail);
+            }
+        });
 
         // Handle referenced sources (render PDF if applicable)
-        if (result.sources && result.sources.length > 0) {
-            const primarySource = result.sources[0];
+        if (sources && sources.length > 0) {
+            const primarySource = sources[0];
 
             // Fetch the primary source's download URL
             const downloadResponse = await fetch(`http://localhost:5000/download/${primarySource.doc_id}`);
@@ -138,6 +142,47 @@ document.getElementById("chatForm").addEventListener("submit", async (e) => {
 });
 
 
+/**
+ * Send a chat query to the streaming endpoint and dispatch its Server-Sent Events.
+ * @param {string} query - The user's question.
+ * @param {function(string, object)} onEvent - Called with each event name and parsed payload.
+ */
+async function streamChat(query, onEvent) {
+    const response = await fetch("http://localhost:5000/chat/stream/", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ query }),
+    });
+    if (!response.ok) {
+        throw new Error(`Chat request failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = "message";
+            let data = "";
+            rawEvent.split("\n").forEach(line => {
+                if (line.startsWith("event: ")) event = line.slice(7);
+                else if (line.startsWith("data: ")) data += line.slice(6);
+            });
+            onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
 /**
  * Render a PDF in an iframe.
  * Clears previous content in the container before rendering the new PDF.
@@ -254,7 +299,7 @@ document.getElementById("uploadForm")?.addEventListener("submit", async function
 
         if (response.ok) {
             const result = await response.json();
-            document.getElementById("uploadStatus").innerHTML = `<p>File uploaded successfully! Document ID: ${result.doc_id}</p>`;
+            document.getElementById("uploadStatus").innerHTML = `<p>File queued for processing! Document ID: ${result.doc_id}</p>`;
         } else {
             const error = await response.json();
             document.getElementById("uploadStatus").innerHTML = `<p>Error: ${error.message}</p>`;
@@ -0,0 +1,80 @@
+"""Recall and latency benchmark for the approximate vector store.
+
+Builds an exact LocalVectorStore and an IVFPQVectorStore over the same
+synthetic clustered vectors, then reports recall@k of the approximate store
+against exact search, and the query latency of both, for several nprobe and
+rerank settings.
+
+Usage: python ann_benchmark.py [vectors] [dimension]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+# Make the repo-level shared package importable when run from this directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from shared.vector_store import LocalVectorStore
+from shared.ann_store import IVFPQVectorStore
+
+TOP_K = 10
+QUERIES = 200
+CLUSTERS = 500  # Topics in the synthetic corpus
+LATENT_DIMENSION = 32  # Directions in which vectors of one topic differ
+INSERT_BATCH = 10000
+SETTINGS = [  # (nprobe, rerank)
+    (4, 0), (16, 0), (4, 100), (8, 100), (16, 100), (32, 100), (64, 200),
+]
+
+
+def synthetic_vectors(rng, centers, basis, count):
+    """Sample vectors around random topic centers that vary mostly along a few latent directions, like text embeddings."""
+    labels = rng.integers(0, len(centers), count)
+    latent = rng.normal(size=(count, basis.shape[0]))
+    noise = 0.1 * rng.normal(size=(count, basis.shape[1]))
+    return (centers[labels] + latent @ basis + noise).astype(np.float32)
+
+
+def timed_queries(store, queries, **kwargs):
+    """Return the ids returned for every query and the mean latency in milliseconds."""
+    results = []
+    started = time.perf_counter()
+    for query in queries:
+        results.append([match["id"] for match in store.query(query, top_k=TOP_K, **kwargs)["matches"]])
+    return results, 1000 * (time.perf_counter() - started) / len(queries)
+
+
+def main(count, dimension):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(CLUSTERS, dimension))
+    basis = rng.normal(size=(LATENT_DIMENSION, dimension)) / np.sqrt(LATENT_DIMENSION)
+    exact = LocalVectorStore()
+    approximate = IVFPQVectorStore()
+
+    started = time.perf_counter()
+    for start in range(0, count, INSERT_BATCH):
+        vectors = synthetic_vectors(rng, centers, basis, min(INSERT_BATCH, count - start))
+        batch = [(str(start + i), vector) for i, vector in enumerate(vectors)]
+        exact.upsert(batch)
+        approximate.upsert(batch)
+    approximate.train()
+    stats = approximate.describe_index_stats()
+    print(f"Inserted {count} vectors of dimension {dimension} in {time.perf_counter() - started:.1f}s "
+          f"({stats['lists']} lists, {stats['pq_subvectors']} bytes per code)")
+
+    queries = synthetic_vectors(rng, centers, basis, QUERIES)
+    truth, exact_ms = timed_queries(exact, queries)
+    print(f"Exact search: {exact_ms:.2f} ms/query")
+    print(f"{'nprobe':>6} {'rerank':>6} {'recall@' + str(TOP_K):>10} {'ms/query':>9} {'speedup':>8}")
+    for nprobe, rerank in SETTINGS:
+        found, ann_ms = timed_queries(approximate, queries, nprobe=nprobe, rerank=rerank)
+        recall = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(truth, found)])
+        print(f"{nprobe:>6} {rerank:>6} {recall:>10.3f} {ann_ms:>9.2f} {exact_ms / ann_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 384,
+    )
@@ -0,0 +1,321 @@
+import os
+import threading
+import numpy as np
+from shared.vector_store import LocalVectorStore, matches_filter, top_rows
+
+# Approximate index configuration
+ANN_NLIST = int(os.getenv("ANN_NLIST", "1024"))  # Coarse clusters (inverted lists)
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))  # Lists scanned per query; higher is slower but more accurate
+ANN_PQ_SUBVECTORS = int(os.getenv("ANN_PQ_SUBVECTORS", "16"))  # Bytes per compressed vector
+ANN_RERANK = int(os.getenv("ANN_RERANK", "100"))  # Candidates re-scored exactly; 0 uses compressed scores only
+ANN_MIN_VECTORS = int(os.getenv("ANN_MIN_VECTORS", "10000"))  # Smaller stores use exact search
+ANN_TRAIN_SAMPLE = int(os.getenv("ANN_TRAIN_SAMPLE", "100000"))  # Vectors used to train the quantizers
+ANN_RETRAIN_GROWTH = float(os.getenv("ANN_RETRAIN_GROWTH", "4"))  # Retrain once the store grows this much
+ANN_KMEANS_ITERATIONS = 10
+MIN_POINTS_PER_LIST = 39  # Fewer training points per cluster gives poor centroids
+PQ_CENTROIDS = 256  # One byte per subvector code
+ASSIGN_BATCH = 65536  # Rows assigned to centroids per matrix product
+
+
+def nearest_centroids(data, centroids, inner_product=False):
+    """Return the index of the closest centroid for every row of data."""
+    labels = np.empty(len(data), dtype=np.int32)
+    half_norms = 0 if inner_product else 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    for start in range(0, len(data), ASSIGN_BATCH):
+        # argmax of x.c - |c|^2/2 is the nearest centroid in L2
+        scores = data[start:start + ASSIGN_BATCH] @ centroids.T - half_norms
+        labels[start:start + ASSIGN_BATCH] = np.argmax(scores, axis=1)
+    return labels
+
+
+def kmeans(data, k, iterations=ANN_KMEANS_ITERATIONS, spherical=False, seed=0):
+    """Cluster the rows of data into k centroids with Lloyd's algorithm.
+
+    With spherical, centroids are kept unit length and points are assigned by
+    inner product, which matches cosine similarity on normalized vectors.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        labels = nearest_centroids(data, centroids, inner_product=spherical)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        filled = counts > 0
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        centroids[filled] = np.add.reduceat(data[order], starts, axis=0) / counts[filled, None]
+        # Reseed empty clusters from random points
+        empty = int((~filled).sum())
+        if empty:
+            centroids[~filled] = data[rng.choice(len(data), empty, replace=False)]
+        if spherical:
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            centroids /= np.where(norms == 0, 1, norms)
+    return centroids
+
+
+def encode(vectors, centroids, codebooks):
+    """Return the coarse list and PQ codes of every row of vectors."""
+    assign = nearest_centroids(vectors, centroids, inner_product=True)
+    residuals = vectors - centroids[assign]
+    sub_dimension = vectors.shape[1] // len(codebooks)
+    codes = np.empty((len(vectors), len(codebooks)), dtype=np.uint8)
+    for part, codebook in enumerate(codebooks):
+        codes[:, part] = nearest_centroids(residuals[:, part * sub_dimension:(part + 1) * sub_dimension], codebook)
+    return assign, codes
+
+
+class IVFPQVectorStore(LocalVectorStore):
+    """Approximate vector store using an inverted file with product quantization.
+
+    Vectors are clustered into nlist coarse lists and each residual is
+    compressed to pq_subvectors one-byte codes. A query scans only the nprobe
+    closest lists using compressed scores, then re-scores the best rerank
+    candidates exactly against the memory-mapped full vectors. Inserts and
+    deletes update the lists incrementally. The quantizers are trained on the
+    maintenance thread once the store holds min_vectors vectors, and retrained
+    there as it grows; until the first training finishes queries fall back to
+    exact search.
+    """
+
+    def __init__(self, path=None, dimension=None, nlist=ANN_NLIST, nprobe=ANN_NPROBE,
+                 pq_subvectors=ANN_PQ_SUBVECTORS, rerank=ANN_RERANK, min_vectors=ANN_MIN_VECTORS):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_subvectors = pq_subvectors
+        self.rerank = rerank
+        self.min_vectors = min_vectors
+        self._centroids = None
+        self._codebooks = None
+        self._trained_count = 0
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._codes = np.zeros((0, pq_subvectors), dtype=np.uint8)
+        # Inverted lists: rows of list i are _list_rows[i][:_list_sizes[i]]; _slots[row] is
+        # the row's position in its list, or -1 while it is in none
+        self._list_rows = []
+        self._list_sizes = np.zeros(0, dtype=np.int64)
+        self._slots = np.zeros(0, dtype=np.int64)
+        self._train_lock = threading.Lock()  # One training at a time
+        self._dirty = None  # Rows written while a training runs; None when none is running
+        super().__init__(path, dimension=dimension)
+
+    @property
+    def trained(self):
+        return self._centroids is not None
+
+    def _restore_index(self, state):
+        self._centroids = state["centroids"]
+        self._codebooks = state["codebooks"]
+        self._trained_count = int(state["trained_count"])
+        self._assign = state["assign"]
+        self._codes = state["codes"]
+        self.pq_subvectors = self._codebooks.shape[0]
+        self._rebuild_lists()
+
+    def _index_state(self):
+        if not self.trained:
+            return None
+        count = len(self._ids)
+        return {
+            "centroids": self._centroids,
+            "codebooks": self._codebooks,
+            "trained_count": self._trained_count,
+            "assign": self._assign[:count].copy(),
+            "codes": self._codes[:count].copy(),
+        }
+
+    def _rebuild_lists(self):
+        count = len(self._ids)
+        assign = self._assign[:count]
+        order = np.argsort(assign, kind="stable")
+        sizes = np.bincount(assign, minlength=len(self._centroids))
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        self._list_rows = [part.copy() for part in np.split(order, np.cumsum(sizes)[:-1])]
+        self._list_sizes = sizes.astype(np.int64)
+        self._slots = np.full(len(self._assign), -1, dtype=np.int64)
+        self._slots[order] = np.arange(count) - starts[assign[order]]
+
+    def _list_add(self, list_id, row):
+        size = self._list_sizes[list_id]
+        rows = self._list_rows[list_id]
+        if size == len(rows):
+            grown = np.empty(max(16, 2 * len(rows)), dtype=np.int64)
+            grown[:size] = rows
+            rows = self._list_rows[list_id] = grown
+        rows[size] = row
+        self._slots[row] = size
+        self._list_sizes[list_id] = size + 1
+
+    def _list_remove(self, list_id, row):
+        """Remove row from its list by moving the list's last entry into its slot."""
+        size = self._list_sizes[list_id] - 1
+        rows = self._list_rows[list_id]
+        moved = rows[size]
+        rows[self._slots[row]] = moved
+        self._slots[moved] = self._slots[row]
+        self._slots[row] = -1
+        self._list_sizes[list_id] = size
+
+    def _reserve_codes(self, count):
+        if count <= len(self._assign):
+            return
+        capacity = max(count, 2 * len(self._assign), 16)
+        assign = np.zeros(capacity, dtype=np.int32)
+        assign[:len(self._assign)] = self._assign
+        codes = np.zeros((capacity, self.pq_subvectors), dtype=np.uint8)
+        codes[:len(self._codes)] = self._codes
+        slots = np.full(capacity, -1, dtype=np.int64)
+        slots[:len(self._slots)] = self._slots
+        self._assign, self._codes, self._slots = assign, codes, slots
+
+    def _wants_training(self):
+        count = len(self._ids)
+        if not self.trained:
+            return count >= self.min_vectors
+        return count >= ANN_RETRAIN_GROWTH * self._trained_count
+
+    def _needs_maintenance(self):
+        return super()._needs_maintenance() or (self._dirty is None and self._wants_training())
+
+    def _maintain(self):
+        if self._wants_training():
+            self.train()
+        super()._maintain()
+
+    def train(self, sample_size=ANN_TRAIN_SAMPLE):
+        """(Re)train the coarse and product quantizers and re-encode every vector.
+
+        Only sampling and swapping in the result hold the store lock, so
+        queries and writes carry on with the previous quantizers, or exact
+        search, meanwhile. Rows written during training are recorded and
+        encoded again with the new quantizers before the swap.
+        """
+        with self._train_lock:
+            with self._lock:
+                count = len(self._ids)
+                if count == 0:
+                    return
+                if self.dimension % self.pq_subvectors:
+                    raise ValueError(f"Dimension {self.dimension} is not divisible by {self.pq_subvectors} PQ subvectors.")
+                rng = np.random.default_rng(0)
+                sample_rows = np.sort(rng.choice(count, min(count, sample_size), replace=False))
+                sample = np.array(self._matrix[sample_rows], dtype=np.float32)
+                matrix = self._matrix
+                self._dirty = set()
+
+            nlist = max(1, min(self.nlist, len(sample) // MIN_POINTS_PER_LIST))
+            centroids = kmeans(sample, nlist, spherical=True)
+            residuals = sample - centroids[nearest_centroids(sample, centroids, inner_product=True)]
+            sub_dimension = self.dimension // self.pq_subvectors
+            ksub = min(PQ_CENTROIDS, len(sample))
+            codebooks = np.stack([
+                kmeans(residuals[:, part * sub_dimension:(part + 1) * sub_dimension], ksub, seed=part)
+                for part in range(self.pq_subvectors)
+            ])
+
+            # Encoded without the lock: any row changed meanwhile is in _dirty and encoded again below
+            assign = np.zeros(count, dtype=np.int32)
+            codes = np.zeros((count, self.pq_subvectors), dtype=np.uint8)
+            for start in range(0, count, ASSIGN_BATCH):
+                end = min(start + ASSIGN_BATCH, count)
+                assign[start:end], codes[start:end] = encode(
+                    np.asarray(matrix[start:end], dtype=np.float32), centroids, codebooks
+                )
+
+            with self._lock:
+                if self._dirty is None:
+                    return  # Every vector was deleted while training
+                current = len(self._ids)
+                stale = sorted(row for row in self._dirty if row < min(count, current))
+                stale = np.asarray(stale + list(range(count, current)), dtype=np.int64)
+                self._dirty = None
+                self._centroids, self._codebooks = centroids, codebooks
+                self._trained_count = current
+                self._assign = np.zeros(0, dtype=np.int32)
+                self._codes = np.zeros((0, self.pq_subvectors), dtype=np.uint8)
+                self._slots = np.zeros(0, dtype=np.int64)
+                self._reserve_codes(current)
+                kept = min(count, current)
+                self._assign[:kept], self._codes[:kept] = assign[:kept], codes[:kept]
+                if len(stale):
+                    self._encode(stale)
+                self._rebuild_lists()
+
+    def _encode(self, rows):
+        """Assign rows to their coarse list and store their PQ codes."""
+        vectors = np.asarray(self._matrix[rows], dtype=np.float32)
+        self._assign[rows], self._codes[rows] = encode(vectors, self._centroids, self._codebooks)
+
+    def _index_rows(self, rows):
+        if self._dirty is not None:
+            self._dirty.update(rows.tolist())
+        if not self.trained:
+            return
+
+        rows = np.unique(rows)
+        self._reserve_codes(len(self._ids))
+        previous = self._assign[rows].copy()
+        self._encode(rows)
+        for row, old_list, new_list in zip(rows.tolist(), previous.tolist(), self._assign[rows].tolist()):
+            if self._slots[row] >= 0:
+                self._list_remove(old_list, row)
+            self._list_add(new_list, row)
+
+    def _unindex_row(self, row, last):
+        if self._dirty is not None:
+            self._dirty.add(row)
+        if not self.trained:
+            return
+        self._list_remove(self._assign[row], row)
+        if row != last:
+            # The last row moves into row's slot; it keeps its list, code and list position
+            moved_list = self._assign[last]
+            self._list_rows[moved_list][self._slots[last]] = row
+            self._slots[row] = self._slots[last]
+            self._slots[last] = -1
+            self._assign[row] = moved_list
+            self._codes[row] = self._codes[last]
+
+    def _clear_index(self):
+        self._centroids = None
+        self._codebooks = None
+        self._trained_count = 0
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._codes = np.zeros((0, self.pq_subvectors), dtype=np.uint8)
+        self._list_rows = []
+        self._list_sizes = np.zeros(0, dtype=np.int64)
+        self._slots = np.zeros(0, dtype=np.int64)
+        self._dirty = None
+
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            stats = super().describe_index_stats()
+            stats.update({"trained": self.trained, "lists": len(self._list_rows), "pq_subvectors": self.pq_subvectors})
+            return stats
+
+    def _search(self, query_vector, top_k, filter=None, nprobe=None, rerank=None, **kwargs):
+        """Return (rows, scores) of the best matches, best first.
+
+        nprobe and rerank override the store defaults for this query.
+        """
+        if not self.trained:
+            return super()._search(query_vector, top_k, filter)
+        nprobe = nprobe or self.nprobe
+        rerank = self.rerank if rerank is None else rerank
+
+        coarse = self._centroids @ query_vector
+        probe = np.argpartition(-coarse, min(nprobe, len(coarse)) - 1)[:nprobe]
+        rows = np.concatenate([self._list_rows[list_id][:self._list_sizes[list_id]] for list_id in probe])
+        if filter:
+            rows = rows[np.fromiter((matches_filter(self._metadata[row], filter) for row in rows), dtype=bool, count=len(rows))]
+        if len(rows) == 0:
+            return rows, np.zeros(0, dtype=np.float32)
+
+        # x.q = c.q + sum over subvectors of residual.q, looked up per code
+        sub_dimension = self.dimension // self.pq_subvectors
+        table = np.einsum("pkd,pd->pk", self._codebooks, query_vector.reshape(self.pq_subvectors, sub_dimension))
+        scores = coarse[self._assign[rows]] + table[np.arange(self.pq_subvectors), self._codes[rows]].sum(axis=1)
+
+        if rerank <= 0:
+            return top_rows(rows, scores, top_k)
+        rows, _ = top_rows(rows, scores, max(rerank, top_k))
+        return top_rows(rows, self._matrix[rows] @ query_vector, top_k)
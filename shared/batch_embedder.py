@@ -0,0 +1,86 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Micro-batching configuration
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "64"))  # Texts per encode call
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))  # How long a batch waits to fill up
+
+
+class BatchEmbedder:
+    """Group texts from concurrent callers into micro-batches for one encode call.
+
+    A single worker thread takes the first pending request, keeps collecting
+    requests until max_batch_size texts are waiting or max_wait_ms has passed,
+    encodes them together and hands every caller back its own vectors.
+    encode_batch receives a list of texts and returns one vector per text.
+
+    The worker starts on first use in each process, so an embedder created
+    before a fork (e.g. gunicorn --preload) still works in the workers.
+    """
+
+    def __init__(self, encode_batch, max_batch_size=EMBED_MAX_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._requests = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # Threads do not survive a fork, so a forked child starts its own worker and queue
+                self._requests = queue.Queue()
+                threading.Thread(target=self._work, args=(self._requests,), name="batch-embedder", daemon=True).start()
+                self._pid = os.getpid()
+
+    def embed(self, texts):
+        """Return one vector per text, blocking until its batch has been encoded."""
+        texts = list(texts)
+        if not texts:
+            return []
+        self._ensure_worker()
+        future = Future()
+        self._requests.put((texts, future))
+        return future.result()
+
+    def _collect(self, requests):
+        """Block for the first request, then gather more until the batch is full or the wait expires."""
+        batch = [requests.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _work(self, requests):
+        while True:
+            batch = self._collect(requests)
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                vectors = []
+                # Requests larger than a batch are encoded in max_batch_size slices
+                for start in range(0, len(texts), self.max_batch_size):
+                    vectors.extend(self.encode_batch(texts[start:start + self.max_batch_size]))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for request_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(request_texts)])
+                offset += len(request_texts)
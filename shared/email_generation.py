@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Email generation configuration
+EMAIL_MODEL = "distilgpt2"
+EMAIL_MAX_LENGTH = int(os.getenv("EMAIL_MAX_LENGTH", "150"))  # Prompt plus generated tokens
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "8"))  # Prompts generated in one forward pass
+EMAIL_CACHE_TTL = float(os.getenv("EMAIL_CACHE_TTL", "3600"))  # Seconds a generated draft is reused
+EMAIL_CACHE_ITEMS = int(os.getenv("EMAIL_CACHE_ITEMS", "1024"))
+PREFIX_CACHE_ITEMS = 32  # Prompt prefixes whose attention keys/values are kept
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries expire ttl seconds after they were stored."""
+
+    def __init__(self, ttl, max_items):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.ttl <= 0 or self.max_items <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+def legacy_cache(past_key_values):
+    """Return a model's past_key_values as one (key, value) tensor pair per layer.
+
+    Depending on the transformers version and model, the cache comes back
+    as this legacy tuple already or as a Cache object.
+    """
+    if isinstance(past_key_values, tuple):
+        return past_key_values
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return past_key_values.to_legacy_cache()
+    return tuple((layer.keys, layer.values) for layer in past_key_values.layers)
+
+
+def repeated_cache(layers, batch_size, model):
+    """Return every row of layers repeated batch_size times, in a format model accepts."""
+    repeated = tuple(
+        (keys.repeat_interleave(batch_size, dim=0), values.repeat_interleave(batch_size, dim=0))
+        for keys, values in layers
+    )
+    if not getattr(model, "_supports_cache_class", True):
+        return repeated  # e.g. GPT-2 on transformers 4.x only takes the legacy tuple
+
+    from transformers import DynamicCache
+
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(repeated)
+    return DynamicCache(repeated)
+
+
+class EmailGenerator:
+    """Batched causal LM text generation with prefix KV reuse and an output cache.
+
+    Every prompt is prefix + suffix. The prefix, typically the part of an
+    email prompt that only depends on its purpose, is run through the model
+    once and its attention keys/values are reused for every prompt in the
+    batch and for later calls with the same prefix. Suffixes are padded
+    between the prefix and themselves so all rows share the prefix cache.
+    Outputs are cached under caller-supplied keys for cache_ttl seconds.
+
+    model and tokenizer default to model_name loaded from the Hugging Face hub.
+    """
+
+    def __init__(self, model_name=EMAIL_MODEL, max_length=EMAIL_MAX_LENGTH, batch_size=EMAIL_BATCH_SIZE,
+                 cache_ttl=EMAIL_CACHE_TTL, cache_items=EMAIL_CACHE_ITEMS, do_sample=True,
+                 model=None, tokenizer=None):
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        self.torch = torch
+        self.tokenizer = tokenizer or AutoTokenizer.from_pretrained(model_name)
+        self.model = (model or AutoModelForCausalLM.from_pretrained(model_name)).eval()
+        self.pad_token_id = self.tokenizer.eos_token_id
+        self.max_length = max_length
+        self.batch_size = max(1, batch_size)
+        self.do_sample = do_sample
+        self._outputs = TTLCache(cache_ttl, cache_items)
+        self._prefixes = OrderedDict()
+        # One generation at a time; each already uses every core
+        self._lock = threading.Lock()
+
+    def generate(self, suffixes, prefix="", cache_keys=None, max_length=None):
+        """Return prefix + suffix + generated text for every suffix.
+
+        cache_keys, when given, has one hashable key per suffix; drafts
+        generated for a key within the TTL are returned without generating.
+        """
+        results = [None] * len(suffixes)
+        pending = []
+        for position, suffix in enumerate(suffixes):
+            key = cache_keys[position] if cache_keys else None
+            cached = self._outputs.get(key) if key is not None else None
+            if cached is not None:
+                results[position] = cached
+            else:
+                pending.append(position)
+
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            texts = self._generate_batch(prefix, [suffixes[position] for position in batch], max_length or self.max_length)
+            for position, text in zip(batch, texts):
+                results[position] = text
+                if cache_keys and cache_keys[position] is not None:
+                    self._outputs.put(cache_keys[position], text)
+        return results
+
+    def _prefix_cache(self, prefix_ids):
+        """Return the model's (key, value) tensors for prefix_ids, computing them on first use."""
+        key = tuple(prefix_ids)
+        cache = self._prefixes.get(key)
+        if cache is None:
+            output = self.model(self.torch.tensor([prefix_ids]), use_cache=True)
+            cache = legacy_cache(output.past_key_values)
+            self._prefixes[key] = cache
+            while len(self._prefixes) > PREFIX_CACHE_ITEMS:
+                self._prefixes.popitem(last=False)
+        self._prefixes.move_to_end(key)
+        return cache
+
+    def _generate_batch(self, prefix, suffixes, max_length):
+        torch = self.torch
+        prefix_ids = self.tokenizer(prefix)["input_ids"] if prefix else []
+        suffix_ids = [self.tokenizer(suffix)["input_ids"] or [self.pad_token_id] for suffix in suffixes]
+        longest = max(len(ids) for ids in suffix_ids)
+        # Each row gets the budget it would have alone; the batch runs for the largest
+        budgets = [max(1, max_length - len(prefix_ids) - len(ids)) for ids in suffix_ids]
+
+        # [prefix][padding][suffix]: the attention mask hides the padding and
+        # position ids follow the mask, so each suffix continues right after the prefix
+        input_ids = [prefix_ids + [self.pad_token_id] * (longest - len(ids)) + ids for ids in suffix_ids]
+        attention_mask = [[1] * len(prefix_ids) + [0] * (longest - len(ids)) + [1] * len(ids) for ids in suffix_ids]
+
+        with self._lock, torch.inference_mode():
+            kwargs = {}
+            if prefix_ids:
+                # A fresh cache per batch: generate() appends to it in place
+                kwargs["past_key_values"] = repeated_cache(self._prefix_cache(prefix_ids), len(suffixes), self.model)
+            output = self.model.generate(
+                input_ids=torch.tensor(input_ids),
+                attention_mask=torch.tensor(attention_mask),
+                max_new_tokens=max(budgets),
+                do_sample=self.do_sample,
+                pad_token_id=self.pad_token_id,
+                **kwargs,
+            )
+
+        continuations = output[:, len(prefix_ids) + longest:]
+        return [
+            prefix + suffix + self.tokenizer.decode(continuation[:budget], skip_special_tokens=True)
+            for suffix, continuation, budget in zip(suffixes, continuations, budgets)
+        ]
@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+# Cache configuration
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "embedding_cache.db"),
+)
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "10000"))
+
+
+def normalize_text(text):
+    """Normalize unicode and whitespace so trivially different strings share an entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_hash(text):
+    """Return the content hash used as the cache key for text."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Embedding cache keyed by (model name, normalized text hash).
+
+    Lookups go to an in-memory LRU first and fall back to a SQLite file that
+    stores vectors as float32 blobs. The file is trimmed by least recent use
+    once it grows past max_bytes.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_BYTES,
+                 memory_items=EMBEDDING_CACHE_MEMORY_ITEMS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._stored_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model, texts):
+        """Return cached vectors for texts, with None for every miss."""
+        keys = [text_hash(text) for text in texts]
+        results = [None] * len(keys)
+        disk_lookups = {}
+
+        with self._lock:
+            for position, key in enumerate(keys):
+                vector = self._memory.get((model, key))
+                if vector is not None:
+                    self._memory.move_to_end((model, key))
+                    results[position] = vector
+                else:
+                    disk_lookups.setdefault(key, []).append(position)
+
+            if disk_lookups:
+                now = time.time()
+                found = self._read_disk(model, list(disk_lookups))
+                for key, vector in found.items():
+                    for position in disk_lookups[key]:
+                        results[position] = vector
+                    self._remember(model, key, vector)
+                if found:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                        [(now, model, key) for key in found],
+                    )
+                    self._conn.commit()
+
+            hit_count = sum(1 for vector in results if vector is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+
+        return results
+
+    def put_many(self, model, texts, vectors):
+        """Store vectors for texts in both cache tiers."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = text_hash(text)
+                vector = [float(value) for value in vector]
+                self._remember(model, key, vector)
+                blob = array("f", vector).tobytes()
+                rows.append((model, key, blob, len(blob), now))
+
+            self._conn.executemany("""
+                INSERT OR REPLACE INTO embeddings (model, text_hash, vector, size, last_used)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+            self._conn.commit()
+            self._stored_bytes += sum(row[3] for row in rows)
+            if self._stored_bytes > self.max_bytes:
+                self._evict()
+
+    def get(self, model, text):
+        """Return the cached vector for text, or None."""
+        return self.get_many(model, [text])[0]
+
+    def put(self, model, text, vector):
+        """Store a single vector."""
+        self.put_many(model, [text], [vector])
+
+    def get_or_compute(self, model, texts, compute):
+        """Return vectors for texts, calling compute(list_of_texts) only for misses.
+
+        Duplicate texts within one call are computed once.
+        """
+        texts = list(texts)
+        results = self.get_many(model, texts)
+        missing = self._missing(texts, results)
+        if missing:
+            computed = compute(list(missing.values()))
+            self._fill(model, texts, results, missing, computed)
+        return results
+
+    async def aget_or_compute(self, model, texts, compute, run_blocking=None):
+        """Async variant of get_or_compute for coroutine compute functions.
+
+        Cache reads and writes touch SQLite, so they run through
+        run_blocking(func, *args), a thread by default, instead of on the
+        event loop.
+        """
+        run_blocking = run_blocking or asyncio.to_thread
+        texts = list(texts)
+        results = await run_blocking(self.get_many, model, texts)
+        missing = self._missing(texts, results)
+        if missing:
+            computed = await compute(list(missing.values()))
+            await run_blocking(self._fill, model, texts, results, missing, computed)
+        return results
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_items": len(self._memory),
+                "stored_bytes": self._stored_bytes,
+            }
+
+    def clear(self):
+        """Drop every cached vector."""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._stored_bytes = 0
+
+    def _missing(self, texts, results):
+        missing = OrderedDict()
+        for text, vector in zip(texts, results):
+            if vector is None:
+                missing.setdefault(text_hash(text), text)
+        return missing
+
+    def _fill(self, model, texts, results, missing, computed):
+        computed = [[float(value) for value in vector] for vector in computed]
+        self.put_many(model, list(missing.values()), computed)
+        by_key = dict(zip(missing.keys(), computed))
+        for position, text in enumerate(texts):
+            if results[position] is None:
+                results[position] = by_key[text_hash(text)]
+
+    def _read_disk(self, model, keys):
+        found = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ", ".join("?" for _ in batch)
+            rows = self._conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                [model, *batch],
+            ).fetchall()
+            for key, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[key] = vector.tolist()
+        return found
+
+    def _remember(self, model, key, vector):
+        self._memory[(model, key)] = vector
+        self._memory.move_to_end((model, key))
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        # Other processes may share the file, so re-read the real size first.
+        self._stored_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        target = int(self.max_bytes * 0.9)
+        while self._stored_bytes > target:
+            rows = self._conn.execute(
+                "SELECT model, text_hash, size FROM embeddings ORDER BY last_used LIMIT 500"
+            ).fetchall()
+            if not rows:
+                break
+            self._conn.executemany(
+                "DELETE FROM embeddings WHERE model = ? AND text_hash = ?",
+                [(model, key) for model, key, _ in rows],
+            )
+            for model, key, size in rows:
+                self._memory.pop((model, key), None)
+                self._stored_bytes -= size
+        self._conn.commit()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Return the process-wide embedding cache, creating it on first use."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = EmbeddingCache()
+    return _default_cache
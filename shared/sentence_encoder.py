@@ -0,0 +1,140 @@
+import inspect
+import os
+import re
+import numpy as np
+
+# Sentence encoder configuration
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # "torch" or "onnx"
+ONNX_MODEL_DIR = os.getenv(
+    "ONNX_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "onnx_models"),
+)
+ONNX_MAX_SEQ_LENGTH = int(os.getenv("ONNX_MAX_SEQ_LENGTH", "256"))  # Matches all-MiniLM-L6-v2
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 lets ONNX Runtime use every core
+ONNX_OPSET = 14
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+
+
+def model_dir(model_name):
+    """Directory holding the exported ONNX files for model_name."""
+    return os.path.join(ONNX_MODEL_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+
+
+def export_quantized_model(model_name, output_dir=None):
+    """Export a Hugging Face encoder to ONNX and quantize its weights to int8.
+
+    Writes model.onnx, model.int8.onnx and the tokenizer files to output_dir
+    and returns the path of the quantized model.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    output_dir = output_dir or model_dir(model_name)
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    class TokenEmbeddings(torch.nn.Module):
+        """Expose only the token embeddings so the traced graph has a single output."""
+
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)[0]
+
+    sample = tokenizer(["An example sentence to trace the model."], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = os.path.join(output_dir, FP32_FILE)
+    # Newer torch defaults to the dynamo exporter; keep the TorchScript one used by the pinned version
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+            opset_version=ONNX_OPSET,
+            **legacy,
+        )
+
+    int8_path = os.path.join(output_dir, INT8_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(output_dir)
+    return int8_path
+
+
+class OnnxSentenceEncoder:
+    """Sentence embeddings from an int8 ONNX export, run with ONNX Runtime on CPU.
+
+    Mirrors SentenceTransformer.encode for all-MiniLM-L6-v2: token embeddings
+    are mean-pooled over the attention mask and L2-normalized. Texts are
+    sorted by length before batching so each batch pads as little as possible.
+    """
+
+    def __init__(self, model_name, quantized=True, max_length=ONNX_MAX_SEQ_LENGTH, threads=ONNX_THREADS):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        directory = model_dir(model_name)
+        path = os.path.join(directory, INT8_FILE if quantized else FP32_FILE)
+        if not os.path.exists(path):
+            export_quantized_model(model_name, directory)
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        self.max_length = max_length
+
+    def encode(self, sentences, batch_size=32, convert_to_tensor=False, **kwargs):
+        """Return a float32 array of normalized embeddings, one row per sentence."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        embeddings = np.zeros((len(texts), 0), dtype=np.float32)
+
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            inputs = self.tokenizer(
+                [texts[row] for row in rows],
+                padding=True, truncation=True, max_length=self.max_length, return_tensors="np",
+            )
+            feed = {name: value.astype(np.int64) for name, value in inputs.items() if name in self.input_names}
+            hidden = self.session.run(None, feed)[0]
+
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            if embeddings.shape[1] == 0:
+                embeddings = np.zeros((len(texts), pooled.shape[1]), dtype=np.float32)
+            embeddings[rows] = pooled
+
+        return embeddings[0] if single else embeddings
+
+
+def load_sentence_encoder(model_name, backend=None):
+    """Return an object with a SentenceTransformer-style encode() for the configured backend."""
+    backend = backend or EMBEDDING_BACKEND
+    if backend == "onnx":
+        return OnnxSentenceEncoder(model_name)
+    if backend != "torch":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
+
+
+def encoder_cache_name(model_name, backend=None):
+    """Name that vectors from this backend are cached under, so int8 and fp32 vectors never mix."""
+    backend = backend or EMBEDDING_BACKEND
+    return model_name if backend == "torch" else f"{model_name}:{backend}-int8"
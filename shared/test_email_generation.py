@@ -0,0 +1,52 @@
+"""Batched, prefix-cached generation with a tiny randomly initialized GPT-2."""
+import os
+import sys
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+# Make the repo-level shared package importable when run from this directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from shared.email_generation import EmailGenerator
+
+VOCAB = "\0abcdefghijklmnopqrstuvwxyz .,:'\n"  # "\0" doubles as end of text and padding
+
+
+class CharTokenizer:
+    """One token per character, so prompts tokenize the same whole or in pieces."""
+
+    eos_token_id = 0
+
+    def __call__(self, text):
+        return {"input_ids": [VOCAB.index(char) for char in text]}
+
+    def decode(self, ids, skip_special_tokens=False):
+        return "".join(VOCAB[i] for i in ids if not (skip_special_tokens and i == self.eos_token_id))
+
+
+@pytest.fixture
+def generator():
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(
+        vocab_size=len(VOCAB), n_positions=128, n_embd=32, n_layer=2, n_head=2,
+        bos_token_id=0, eos_token_id=0,
+    )
+    model = transformers.GPT2LMHeadModel(config)
+    return EmailGenerator(max_length=60, batch_size=8, cache_ttl=0, do_sample=False,
+                          model=model, tokenizer=CharTokenizer())
+
+
+def test_batched_generation_matches_one_prompt_at_a_time(generator):
+    prefix = "write an email to invite "
+    suffixes = ["ann", "the marketing team", "bob to lunch"]
+
+    batched = generator.generate(suffixes, prefix=prefix)
+    alone = [generator.generate([suffix], prefix=prefix)[0] for suffix in suffixes]
+    uncached = [generator.generate([prefix + suffix])[0] for suffix in suffixes]
+
+    assert batched == alone == uncached
+    for suffix, text in zip(suffixes, batched):
+        assert text.startswith(prefix + suffix)
+        assert len(text) == generator.max_length  # Every row gets its own full budget
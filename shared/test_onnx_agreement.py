@@ -0,0 +1,111 @@
+"""Agreement check for the quantized ONNX sentence encoder.
+
+Encodes the same texts with the PyTorch SentenceTransformer and with the
+int8 ONNX export and fails if any text's cosine similarity between the two
+falls below ONNX_AGREEMENT_MIN_COSINE. A tiny randomly initialized BERT
+built on the spot exercises export, quantization and pooling without
+network access; ONNX_AGREEMENT_MODEL is checked too when it can be
+downloaded. Only a missing onnxruntime skips the module; any other missing
+package it needs is a broken install and fails.
+
+Usage: python -m pytest -s shared/test_onnx_agreement.py
+"""
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")  # The ONNX backend is optional
+import onnx  # noqa: F401 -- quantize_dynamic needs it; onnxruntime does not install it
+import sentence_transformers  # noqa: F401
+import torch
+from transformers import BertConfig, BertModel, BertTokenizer
+
+# Make the repo-level shared package importable when run from this directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from shared import sentence_encoder
+
+MODEL_NAME = os.getenv("ONNX_AGREEMENT_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+MIN_COSINE = float(os.getenv("ONNX_AGREEMENT_MIN_COSINE", "0.98"))
+CONTACTS_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "flask_js", "backend", "instance", "mydatabase.db")
+CONTACT_SAMPLE = 500
+
+SAMPLE_TEXTS = [
+    "Invite the marketing team to the product launch next Thursday.",
+    "Follow up with the client about the overdue invoice.",
+    "Schedule a call with someone who works on machine learning infrastructure.",
+    "Looking for a contact at a logistics company in Rotterdam.",
+    "Thank you for your help with the conference last week!",
+    "quarterly budget review",
+    "a",
+    "The mitochondria is the powerhouse of the cell, and this sentence is long enough to need many tokens "
+    "so that padding and truncation behave the same way in both implementations of the encoder.",
+]
+
+
+def sample_texts():
+    """Fixed sentences plus contact texts from the local database when it exists."""
+    texts = list(SAMPLE_TEXTS)
+    if os.path.exists(CONTACTS_DB):
+        conn = sqlite3.connect(f"file:{CONTACTS_DB}?mode=ro", uri=True)
+        rows = conn.execute('SELECT "firstName", "lastName", email FROM contact LIMIT ?', (CONTACT_SAMPLE,)).fetchall()
+        conn.close()
+        texts.extend(" ".join(row) for row in rows)
+    return texts
+
+
+def timed_encode(encoder, texts):
+    started = time.perf_counter()
+    vectors = np.asarray(encoder.encode(texts, convert_to_tensor=False), dtype=np.float32)
+    return vectors, time.perf_counter() - started
+
+
+def build_tiny_model(directory):
+    """Save a two-layer BERT with random weights and a small word-level vocabulary to directory."""
+    words = sorted({word.strip(".,!?:'").lower() for text in SAMPLE_TEXTS for word in text.split()} - {""})
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words + list("abcdefghijklmnopqrstuvwxyz0123456789.,!?@")
+    os.makedirs(directory)
+    vocab_file = os.path.join(directory, "vocab.txt")
+    with open(vocab_file, "w") as f:
+        f.write("\n".join(vocab))
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=64, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=128, max_position_embeddings=128)
+    BertModel(config).save_pretrained(directory)
+    BertTokenizer(vocab_file).save_pretrained(directory)
+
+
+@pytest.fixture(params=["tiny", MODEL_NAME])
+def model_name(request, tmp_path, monkeypatch):
+    if request.param != "tiny":
+        return request.param
+    monkeypatch.setattr(sentence_encoder, "ONNX_MODEL_DIR", str(tmp_path / "onnx"))
+    build_tiny_model(str(tmp_path / "tiny"))
+    return str(tmp_path / "tiny")
+
+
+def load_encoder(model_name, backend):
+    try:
+        return sentence_encoder.load_sentence_encoder(model_name, backend)
+    except OSError as e:  # Not cached locally and no network to download it
+        pytest.skip(f"{model_name} is unavailable: {e}")
+
+
+def test_onnx_matches_torch(model_name):
+    texts = sample_texts()
+    reference, torch_seconds = timed_encode(load_encoder(model_name, "torch"), texts)
+    quantized, onnx_seconds = timed_encode(load_encoder(model_name, "onnx"), texts)
+
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+    quantized /= np.linalg.norm(quantized, axis=1, keepdims=True)
+    cosine = np.einsum("ij,ij->i", reference, quantized)
+
+    print(f"\nCosine agreement over {len(texts)} texts: mean {cosine.mean():.4f}, min {cosine.min():.4f}")
+    print(f"PyTorch fp32: {1000 * torch_seconds / len(texts):.2f} ms/text")
+    print(f"ONNX int8:    {1000 * onnx_seconds / len(texts):.2f} ms/text ({torch_seconds / onnx_seconds:.1f}x)")
+
+    failures = [f"{score:.4f}  {text[:80]!r}" for text, score in zip(texts, cosine) if score < MIN_COSINE]
+    assert not failures, f"{len(failures)} texts below cosine {MIN_COSINE}:\n" + "\n".join(failures)
@@ -0,0 +1,499 @@
+import base64
+import json
+import logging
+import os
+import re
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; the single-writer lock is skipped there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Vector store configuration
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone")  # "pinecone", "local" or "ann"
+VECTOR_STORE_DIR = os.getenv(
+    "VECTOR_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "vector_store"),
+)
+VECTOR_STORE_COMPACT_RATIO = float(os.getenv("VECTOR_STORE_COMPACT_RATIO", "1.0"))  # Log size, relative to the snapshot, that triggers a new snapshot
+VECTOR_STORE_COMPACT_MIN_MB = float(os.getenv("VECTOR_STORE_COMPACT_MIN_MB", "16"))  # Smaller logs never trigger one
+
+STORE_FILES = {"vectors": "npy", "index": "json", "search": "npz", "log": "jsonl"}  # Per-generation files and their extensions
+GENERATION_FILE = re.compile(r"^(vectors|index|search|log)-(\d+)\.\w+$")
+
+
+class VectorStore:
+    """Interface shared by every vector store backend.
+
+    Method names, arguments and return shapes follow the Pinecone index API so
+    a Pinecone index and a local store are interchangeable at call sites.
+    """
+
+    def upsert(self, vectors, **kwargs):
+        """Insert or overwrite (id, values[, metadata]) tuples or {"id", "values", "metadata"} dicts."""
+        raise NotImplementedError
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=False, include_values=False, **kwargs):
+        """Return {"matches": [{"id", "score", ...}]} for the top_k most similar vectors."""
+        raise NotImplementedError
+
+    def fetch(self, ids, **kwargs):
+        """Return {"vectors": {id: {"id", "values", "metadata"}}} for the ids that exist."""
+        raise NotImplementedError
+
+    def delete(self, ids=None, delete_all=False, filter=None, **kwargs):
+        """Delete vectors by id, by metadata filter, or all of them."""
+        raise NotImplementedError
+
+    def describe_index_stats(self, **kwargs):
+        """Return {"dimension", "total_vector_count"}."""
+        raise NotImplementedError
+
+
+def parse_vector(vector):
+    """Normalize an upsert entry to (id, values, metadata)."""
+    if isinstance(vector, dict):
+        return str(vector["id"]), vector["values"], vector.get("metadata") or {}
+    vector_id, values, *rest = vector
+    return str(vector_id), values, (rest[0] if rest else None) or {}
+
+
+def matches_filter(metadata, condition):
+    """Evaluate a Pinecone-style metadata filter against one metadata dict."""
+    for key, expected in condition.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, part) for part in expected):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, part) for part in expected):
+                return False
+        elif isinstance(expected, dict):
+            value = metadata.get(key)
+            for operator, operand in expected.items():
+                if not compare(value, operator, operand):
+                    return False
+        elif metadata.get(key) != expected:
+            return False
+    return True
+
+
+def compare(value, operator, operand):
+    """Apply a single filter operator."""
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if value is None:
+        return False
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    if operator == "$lt":
+        return value < operand
+    if operator == "$lte":
+        return value <= operand
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+
+def top_rows(rows, scores, top_k):
+    """Return the top_k (rows, scores) by descending score, dropping -inf scores."""
+    k = min(top_k, len(rows))
+    if k <= 0:
+        return rows[:0], scores[:0]
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    top = top[scores[top] > -np.inf]
+    return rows[top], scores[top]
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store using cosine similarity over a float32 matrix.
+
+    Vectors are kept L2-normalized in one contiguous matrix so a query is a
+    single matrix-vector product followed by an argpartition top-k.
+
+    On disk a store is a snapshot generation (vectors-N.npy, memory-mapped on
+    load, and index-N.json with ids and metadata) plus append-only logs of the
+    writes made since. A write only appends to the log, so its cost does not
+    grow with the store. Once the log outgrows the snapshot, a background
+    thread writes the next generation and points manifest.json at it with a
+    single rename, so a crash at any point leaves one complete generation and
+    the logs to replay over it.
+
+    Only one process may write to a store: the first write takes an exclusive
+    lock on the directory and a write from a second process raises
+    RuntimeError. Processes do not see each other's writes, so services that
+    write to a local store run as a single worker. With path None the store
+    is kept in memory only.
+    """
+
+    def __init__(self, path=None, dimension=None):
+        self.path = path
+        self.dimension = dimension
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, dimension or 0), dtype=np.float32)
+        self._ids = []
+        self._metadata = []
+        self._rows = {}
+        self._generation = 0  # Snapshot generation on disk; logs from this generation on are replayed over it
+        self._snapshot_bytes = 0
+        self._log = None
+        self._log_generation = 0
+        self._log_bytes = 0
+        self._writer_pid = None
+        self._lock_file = None
+        self._save_lock = threading.Lock()  # One snapshot at a time
+        self._maintenance = threading.Event()
+        self._worker = None
+        if path is not None:
+            self._load()
+            if self._needs_maintenance():
+                self._schedule_maintenance()
+
+    def _file(self, kind, generation):
+        return os.path.join(self.path, f"{kind}-{generation}.{STORE_FILES[kind]}")
+
+    def _generations(self, kind):
+        """Return the generations of kind files on disk, oldest first."""
+        if not os.path.isdir(self.path):
+            return []
+        generations = []
+        for name in os.listdir(self.path):
+            match = GENERATION_FILE.match(name)
+            if match and match.group(1) == kind:
+                generations.append(int(match.group(2)))
+        return sorted(generations)
+
+    def _load(self):
+        manifest = os.path.join(self.path, "manifest.json")
+        if os.path.exists(manifest):
+            with open(manifest, encoding="utf-8") as manifest_file:
+                self._generation = json.load(manifest_file)["generation"]
+            with open(self._file("index", self._generation), encoding="utf-8") as index_file:
+                state = json.load(index_file)
+            self.dimension = state["dimension"]
+            self._ids = state["ids"]
+            self._metadata = state["metadata"]
+            self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+            # Copy-on-write mapping: pages are read lazily and writes stay in memory
+            self._matrix = np.load(self._file("vectors", self._generation), mmap_mode="c")
+            self._snapshot_bytes = self._matrix.nbytes
+            search_file = self._file("search", self._generation)
+            if os.path.exists(search_file):
+                with np.load(search_file) as search:
+                    self._restore_index({name: search[name] for name in search.files})
+
+        for generation in self._generations("log"):
+            if generation >= self._generation:
+                log_file = self._file("log", generation)
+                self._replay(log_file)
+                self._log_bytes += os.path.getsize(log_file)
+
+    def _replay(self, log_file):
+        """Apply the writes recorded in one log."""
+        with open(log_file, encoding="utf-8") as log:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # A write cut short by a crash; it was never acknowledged
+                if record["op"] == "upsert":
+                    values = np.frombuffer(base64.b64decode(record["values"]), dtype=np.float32)
+                    self._write_rows(record["ids"], values.reshape(len(record["ids"]), -1), record["metadata"])
+                elif record["op"] == "delete":
+                    self._delete_rows(record["ids"])
+                elif record["op"] == "clear":
+                    self._clear()
+
+    def _restore_index(self, state):
+        """Load the search structure persisted beside the vectors."""
+
+    def _index_state(self):
+        """Return a copy of the search structure as arrays to persist, or None."""
+        return None
+
+    def _index_rows(self, rows):
+        """Add or refresh rows that were just written to the matrix."""
+
+    def _unindex_row(self, row, last):
+        """Drop row from the search structure before the last row moves into its slot."""
+
+    def _clear_index(self):
+        """Forget the search structure after every vector was deleted."""
+
+    def _open_writer(self):
+        """Take the store's writer lock and open a fresh log, once per process."""
+        if self.path is None or self._writer_pid == os.getpid():
+            return
+        os.makedirs(self.path, exist_ok=True)
+        lock_file = open(os.path.join(self.path, "lock"), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                raise RuntimeError(f"Vector store {self.path} is already being written by another process.")
+        self._lock_file = lock_file
+        # A new log per writer, so nothing is appended after a line a crash left unfinished
+        self._log_generation = max(self._generations("log") + [self._generation]) + 1
+        self._log = open(self._file("log", self._log_generation), "a", encoding="utf-8")
+        self._writer_pid = os.getpid()
+
+    def close(self):
+        """Close the log and release the writer lock; a later write takes them again."""
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+            self._writer_pid = None
+
+    def _append(self, record):
+        """Record a write in the log and schedule a snapshot once the log has grown enough."""
+        if self.path is not None:
+            line = json.dumps(record) + "\n"
+            self._log.write(line)
+            self._log.flush()
+            self._log_bytes += len(line)
+        if self._needs_maintenance():
+            self._schedule_maintenance()
+
+    def _needs_maintenance(self):
+        """Whether the background thread has work to do."""
+        if self.path is None:
+            return False
+        threshold = max(VECTOR_STORE_COMPACT_MIN_MB * 1024 * 1024, VECTOR_STORE_COMPACT_RATIO * self._snapshot_bytes)
+        return self._log_bytes > threshold
+
+    def _schedule_maintenance(self):
+        # Threads do not survive a fork, so a forked child starts its own
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run_maintenance, name="vector-store", daemon=True)
+            self._worker.start()
+        self._maintenance.set()
+
+    def _run_maintenance(self):
+        while True:
+            self._maintenance.wait()
+            self._maintenance.clear()
+            try:
+                self._maintain()
+            except Exception:
+                logger.exception(f"Vector store maintenance failed for {self.path}")
+
+    def _maintain(self):
+        """Snapshot the store if the log has outgrown the last snapshot."""
+        if self._needs_maintenance():
+            self.save()
+
+    def save(self):
+        """Write the current state as the next snapshot generation and drop the files it replaces.
+
+        Only copying the state holds the store lock; writes made while the
+        snapshot is written go to a new log that is replayed over it.
+        """
+        if self.path is None:
+            return
+        with self._save_lock:
+            with self._lock:
+                self._open_writer()
+                generation = self._log_generation + 1
+                self._log.close()
+                self._log = open(self._file("log", generation), "a", encoding="utf-8")
+                self._log_generation = generation
+                self._log_bytes = 0
+                matrix = np.array(self._matrix[:len(self._ids)])
+                state = {"dimension": self.dimension, "ids": list(self._ids), "metadata": list(self._metadata)}
+                search = self._index_state()
+
+            np.save(self._file("vectors", generation), matrix)
+            with open(self._file("index", generation), "w", encoding="utf-8") as index_file:
+                json.dump(state, index_file)
+            if search is not None:
+                np.savez(self._file("search", generation), **search)
+            manifest = os.path.join(self.path, "manifest.json")
+            with open(manifest + ".tmp", "w", encoding="utf-8") as manifest_file:
+                json.dump({"generation": generation}, manifest_file)
+            os.replace(manifest + ".tmp", manifest)
+
+            with self._lock:
+                self._generation = generation
+                self._snapshot_bytes = matrix.nbytes
+            # Older logs are covered by the new snapshot; any other snapshot is stale or unfinished
+            for kind in STORE_FILES:
+                for old in self._generations(kind):
+                    stale = old < generation if kind == "log" else old != generation
+                    if stale:
+                        os.remove(self._file(kind, old))
+
+    def _reserve(self, extra):
+        """Grow the matrix so extra more rows fit, doubling capacity as needed."""
+        needed = len(self._ids) + extra
+        if needed <= self._matrix.shape[0]:
+            return
+        capacity = max(needed, 2 * self._matrix.shape[0], 16)
+        grown = np.zeros((capacity, self.dimension), dtype=np.float32)
+        grown[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = grown
+
+    def upsert(self, vectors, **kwargs):
+        entries = [parse_vector(vector) for vector in vectors]
+        if not entries:
+            return {"upserted_count": 0}
+
+        ids = [vector_id for vector_id, _, _ in entries]
+        metadata = [vector_metadata for _, _, vector_metadata in entries]
+        values = np.asarray([entry[1] for entry in entries], dtype=np.float32)
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        values /= np.where(norms == 0, 1, norms)
+        with self._lock:
+            if self.dimension is not None and values.shape[1] != self.dimension:
+                raise ValueError(f"Vector dimension {values.shape[1]} does not match index dimension {self.dimension}.")
+            self._open_writer()
+            self._write_rows(ids, values, metadata)
+            self._append({
+                "op": "upsert", "ids": ids, "metadata": metadata,
+                "values": base64.b64encode(values.tobytes()).decode("ascii"),
+            })
+        return {"upserted_count": len(entries)}
+
+    def _write_rows(self, ids, values, metadata):
+        """Insert or overwrite rows with normalized values."""
+        if self.dimension is None:
+            self.dimension = values.shape[1]
+            self._matrix = np.zeros((0, self.dimension), dtype=np.float32)
+        self._reserve(sum(1 for vector_id in ids if vector_id not in self._rows))
+        rows = []
+        for vector_id, row_values, row_metadata in zip(ids, values, metadata):
+            row = self._rows.get(vector_id)
+            if row is None:
+                row = len(self._ids)
+                self._rows[vector_id] = row
+                self._ids.append(vector_id)
+                self._metadata.append(row_metadata)
+            else:
+                self._metadata[row] = row_metadata
+            self._matrix[row] = row_values
+            rows.append(row)
+        self._index_rows(np.asarray(rows))
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=False, include_values=False, **kwargs):
+        with self._lock:
+            count = len(self._ids)
+            if count == 0:
+                return {"matches": []}
+
+            query_vector = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(query_vector)
+            if norm:
+                query_vector = query_vector / norm
+
+            matches = []
+            for row, score in zip(*self._search(query_vector, top_k, filter, **kwargs)):
+                match = {"id": self._ids[row], "score": float(score)}
+                if include_metadata:
+                    match["metadata"] = self._metadata[row]
+                if include_values:
+                    match["values"] = self._matrix[row].tolist()
+                matches.append(match)
+            return {"matches": matches}
+
+    def _search(self, query_vector, top_k, filter=None, **kwargs):
+        """Return (rows, scores) of the best matches, best first, by exact search."""
+        count = len(self._ids)
+        scores = self._matrix[:count] @ query_vector
+        if filter:
+            mask = np.fromiter((matches_filter(metadata, filter) for metadata in self._metadata), dtype=bool, count=count)
+            scores = np.where(mask, scores, -np.inf)
+        return top_rows(np.arange(count), scores, top_k)
+
+    def fetch(self, ids, **kwargs):
+        with self._lock:
+            vectors = {}
+            for vector_id in ids:
+                row = self._rows.get(str(vector_id))
+                if row is not None:
+                    vectors[self._ids[row]] = {
+                        "id": self._ids[row],
+                        "values": self._matrix[row].tolist(),
+                        "metadata": self._metadata[row],
+                    }
+            return {"vectors": vectors}
+
+    def delete(self, ids=None, delete_all=False, filter=None, **kwargs):
+        with self._lock:
+            self._open_writer()
+            if delete_all:
+                self._clear()
+                self._append({"op": "clear"})
+            else:
+                doomed = {str(vector_id) for vector_id in ids or []}
+                if filter:
+                    doomed.update(vector_id for vector_id, metadata in zip(self._ids, self._metadata)
+                                  if matches_filter(metadata, filter))
+                doomed = sorted(doomed & self._rows.keys())
+                if doomed:
+                    self._delete_rows(doomed)
+                    self._append({"op": "delete", "ids": doomed})
+        return {}
+
+    def _clear(self):
+        self._ids, self._metadata, self._rows = [], [], {}
+        self._matrix = np.zeros((0, self.dimension or 0), dtype=np.float32)
+        self._clear_index()
+
+    def _delete_rows(self, ids):
+        """Delete rows by moving the last row into each freed slot, keeping the matrix contiguous."""
+        for vector_id in ids:
+            row = self._rows.pop(vector_id)
+            last = len(self._ids) - 1
+            self._unindex_row(row, last)
+            if row != last:
+                moved_id = self._ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved_id
+                self._metadata[row] = self._metadata[last]
+                self._rows[moved_id] = row
+            self._ids.pop()
+            self._metadata.pop()
+
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            return {"dimension": self.dimension, "total_vector_count": len(self._ids)}
+
+
+def get_vector_store(index_name, dimension=None):
+    """Return the configured vector store for index_name.
+
+    VECTOR_STORE=pinecone (the default) returns the Pinecone index itself;
+    VECTOR_STORE=local returns an exact LocalVectorStore and VECTOR_STORE=ann
+    an approximate IVFPQVectorStore, both under VECTOR_STORE_DIR.
+    """
+    # Read again here because the services load their .env after importing this module
+    backend = os.getenv("VECTOR_STORE", VECTOR_STORE)
+    store_dir = os.getenv("VECTOR_STORE_DIR", VECTOR_STORE_DIR)
+    if backend == "local":
+        return LocalVectorStore(os.path.join(store_dir, index_name), dimension=dimension)
+    if backend == "ann":
+        from shared.ann_store import IVFPQVectorStore
+        return IVFPQVectorStore(os.path.join(store_dir, index_name), dimension=dimension)
+    if backend != "pinecone":
+        raise ValueError(f"Unknown vector store backend: {backend}")
+
+    from pinecone import Pinecone
+
+    api_key = os.getenv("PINECONE_API_KEY")
+    if not api_key:
+        raise ValueError("Pinecone API key is not set. Please set the PINECONE_API_KEY environment variable.")
+    return Pinecone(api_key=api_key).Index(index_name)